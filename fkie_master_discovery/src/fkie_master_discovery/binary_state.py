@@ -0,0 +1,176 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import struct
+
+MAGIC = b'FKMS'
+''' The first bytes of an encoded master state. '''
+FORMAT_VERSION = 1
+''' The version of the binary format. '''
+NONE_INDEX = 0xFFFFFFFF
+''' Marks a ``None`` value instead of a string index or process id. '''
+
+_HEADER = struct.Struct('!4sBII')  # magic, format version, count of strings, count of integers
+
+
+class _StringTable(object):
+
+    def __init__(self):
+        self.indexes = {}
+        self.strings = []
+
+    def add(self, value):
+        if value is None:
+            return NONE_INDEX
+        try:
+            return self.indexes[value]
+        except KeyError:
+            idx = len(self.strings)
+            self.indexes[value] = idx
+            self.strings.append(value)
+            return idx
+
+
+def encode_state_delta(delta):
+    '''
+    Encodes the result of :mod:`fkie_master_discovery.master_monitor.MasterMonitor.getListedMasterInfoDelta()`
+    into a compact binary format. All strings are stored only once in a string table,
+    the lists are stored as arrays of unsigned integers.
+
+    :param delta: the tuple (``version``, ``complete``, ``state``, ``nodes``, ``topics``, ``services``)
+
+    :type delta: tuple
+
+    :return: the encoded state
+
+    :rtype: bytes
+    '''
+    version, complete, state, nodes, topics, services = delta
+    table = _StringTable()
+    add = table.add
+    ints = [add(version), 1 if complete else 0]
+    for value in state[0:4]:
+        ints.append(add(value))
+    # publishers, subscribers, services
+    for entries in (state[4], state[5], state[6]):
+        ints.append(len(entries))
+        for name, node_list in entries:
+            ints.append(add(name))
+            ints.append(len(node_list))
+            ints.extend([add(node) for node in node_list])
+    # topic types
+    ints.append(len(state[7]))
+    for name, ttype in state[7]:
+        ints.append(add(name))
+        ints.append(add(ttype))
+    # nodes
+    ints.append(len(state[8]))
+    for name, uri, masteruri, pid, local in state[8]:
+        ints.extend((add(name), add(uri), add(masteruri), NONE_INDEX if pid is None else pid, 1 if local == 'local' else 0))
+    # service provider
+    ints.append(len(state[9]))
+    for name, uri, masteruri, stype, local in state[9]:
+        ints.extend((add(name), add(uri), add(masteruri), add(stype), 1 if local == 'local' else 0))
+    # names of changed entries
+    for names in (nodes, topics, services):
+        ints.append(len(names))
+        ints.extend([add(name) for name in names])
+    encoded = [s.encode('utf-8') for s in table.strings]
+    return b''.join([_HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded), len(ints)),
+                     struct.pack('!%dI' % len(encoded), *[len(s) for s in encoded]),
+                     b''.join(encoded),
+                     struct.pack('!%dI' % len(ints), *ints)])
+
+
+def decode_state_delta(data):
+    '''
+    Decodes the data created by :mod:`fkie_master_discovery.binary_state.encode_state_delta()`.
+
+    :param data: the encoded state
+
+    :type data: bytes
+
+    :return: the tuple (``version``, ``complete``, ``state``, ``nodes``, ``topics``, ``services``)
+
+    :rtype: tuple
+
+    :raise ValueError: on invalid data
+    '''
+    try:
+        magic, fmt_version, str_count, int_count = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or fmt_version != FORMAT_VERSION:
+            raise ValueError("unsupported binary state format: %s, version %d" % (magic, fmt_version))
+        offset = _HEADER.size
+        lengths = struct.unpack_from('!%dI' % str_count, data, offset)
+        offset += 4 * str_count
+        strings = []
+        for length in lengths:
+            strings.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        ints = struct.unpack_from('!%dI' % int_count, data, offset)
+    except struct.error as err:
+        raise ValueError("invalid binary state: %s" % err)
+
+    def opt(idx):
+        return None if idx == NONE_INDEX else strings[idx]
+
+    try:
+        it = iter(ints)
+        nxt = next
+        version = strings[nxt(it)]
+        complete = nxt(it) == 1
+        header = [opt(nxt(it)) for _ in range(4)]
+        lists = []
+        for _ in range(3):
+            entries = []
+            for _ in range(nxt(it)):
+                name = strings[nxt(it)]
+                entries.append((name, [strings[nxt(it)] for _ in range(nxt(it))]))
+            lists.append(entries)
+        topic_types = [(strings[nxt(it)], opt(nxt(it))) for _ in range(nxt(it))]
+        node_list = []
+        for _ in range(nxt(it)):
+            name, uri, masteruri, pid, local = nxt(it), nxt(it), nxt(it), nxt(it), nxt(it)
+            node_list.append((strings[name], opt(uri), opt(masteruri), None if pid == NONE_INDEX else pid, 'local' if local else 'remote'))
+        service_list = []
+        for _ in range(nxt(it)):
+            name, uri, masteruri, stype, local = nxt(it), nxt(it), nxt(it), nxt(it), nxt(it)
+            service_list.append((strings[name], opt(uri), opt(masteruri), opt(stype), 'local' if local else 'remote'))
+        names = []
+        for _ in range(3):
+            names.append([strings[nxt(it)] for _ in range(nxt(it))])
+    except (IndexError, StopIteration):
+        # invalid string index or too few integers
+        raise ValueError("invalid binary state: corrupted data")
+    state = tuple(header) + (lists[0], lists[1], lists[2], topic_types, node_list, service_list)
+    return (version, complete, state, names[0], names[1], names[2])
@@ -36,6 +36,8 @@ import re
 import socket
 import struct
 import sys
+import threading
+import time
 try:
     import xmlrpclib as xmlrpcclient
     from urlparse import urlparse
@@ -43,6 +45,7 @@ except ImportError:
     import xmlrpc.client as xmlrpcclient
     from urllib.parse import urlparse
 
+import roslib.message
 import roslib.names
 import rospy
 
@@ -50,6 +53,36 @@ import rospy
 EMPTY_PATTERN = re.compile('\b', re.I)
 IP4_PATTERN = re.compile(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}")
 MASTERURI = None
+HOST_ADDRESS_CACHE_TIMEOUT = 60.
+''' resolved host addresses are cached for this time in seconds (Default: ``60``) '''
+_HOST_ADDRESSES = {}  # {hostname: (address, resolve time)}
+_HOST_ADDRESSES_LOCK = threading.Lock()
+MD5SUM_UNKNOWN_TIMEOUT = 60.
+''' unknown message types are resolved again after this time in seconds (Default: ``60``) '''
+_MD5SUMS = {}  # {message type: (md5sum or None, resolve time)}
+_MD5SUMS_LOCK = threading.Lock()
+
+
+class TimeoutTransport(xmlrpcclient.Transport):
+    '''
+    XML-RPC transport with a timeout for the connection. Unlike
+    ``socket.setdefaulttimeout()`` it does not change the timeout of sockets
+    created by other threads.
+
+    Usage: ``xmlrpcclient.ServerProxy(uri, transport=TimeoutTransport(0.7))``
+    '''
+
+    def __init__(self, timeout, *args, **kwargs):
+        '''
+        :param float timeout: the timeout in seconds
+        '''
+        xmlrpcclient.Transport.__init__(self, *args, **kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        conn = xmlrpcclient.Transport.make_connection(self, host)
+        conn.timeout = self.timeout
+        return conn
 
 
 def get_hostname(url):
@@ -74,6 +107,62 @@ def get_hostname(url):
     return hostname
 
 
+def get_host_address(hostname):
+    '''
+    Resolves the hostname by ``socket.gethostbyname()``. The result is cached for
+    :mod:`fkie_master_discovery.common.HOST_ADDRESS_CACHE_TIMEOUT` seconds.
+
+    :param str hostname: the name of the host
+    :return: the IPv4 address
+    :rtype: str
+    :raise socket.gaierror: if the hostname can not be resolved
+    '''
+    now = time.time()
+    with _HOST_ADDRESSES_LOCK:
+        try:
+            address, ts = _HOST_ADDRESSES[hostname]
+            if now - ts < HOST_ADDRESS_CACHE_TIMEOUT:
+                return address
+        except KeyError:
+            pass
+    # resolve without holding the lock
+    address = socket.gethostbyname(hostname)
+    with _HOST_ADDRESSES_LOCK:
+        _HOST_ADDRESSES[hostname] = (address, now)
+    return address
+
+
+def get_message_md5sum(msg_type):
+    '''
+    Returns the md5sum of the given message type. The message class is loaded
+    only once per process. Unknown message types are resolved again after
+    :mod:`fkie_master_discovery.common.MD5SUM_UNKNOWN_TIMEOUT` seconds.
+
+    :param str msg_type: the message type, e.g. ``std_msgs/String``
+    :return: the md5sum or ``None``, if the message type is unknown
+    :rtype: str
+    '''
+    now = time.time()
+    with _MD5SUMS_LOCK:
+        try:
+            md5sum, ts = _MD5SUMS[msg_type]
+            if md5sum is not None or now - ts < MD5SUM_UNKNOWN_TIMEOUT:
+                return md5sum
+        except KeyError:
+            pass
+    # load the message class without holding the lock
+    md5sum = None
+    try:
+        msg_class = roslib.message.get_message_class(msg_type)
+        if msg_class is not None:
+            md5sum = msg_class._md5sum
+    except Exception as err:
+        rospy.logwarn("Can not load message class of %s: %s" % (msg_type, err))
+    with _MD5SUMS_LOCK:
+        _MD5SUMS[msg_type] = (md5sum, now)
+    return md5sum
+
+
 def get_port(url):
     '''
     Extracts the port from given url.
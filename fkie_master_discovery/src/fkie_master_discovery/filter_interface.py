@@ -49,10 +49,17 @@ class FilterInterface(object):
     :mod:`fkie_master_discovery.filter_interface.FilterInterface.load()` or
     :mod:`fkie_master_discovery.filter_interface.FilterInterface.from_list()`.
     Otherwise the object is invalid and the test methods return always `False`.
+    The results of the test methods are cached, since the same names are tested
+    on each update of the ROS master state.
     '''
 
+    MAX_CACHE_SIZE = 10000
+    ''' The count of cached results of the test methods. The cache is cleared if
+    it is full or the patterns are changed. (Default: ``10000``)'''
+
     def __init__(self):
         self.is_valid = False
+        self._cache = {}
         self._re_do_not_sync = EMPTY_PATTERN
         self._re_do_not_sync_from_list = EMPTY_PATTERN
         self._re_hide_nodes = EMPTY_PATTERN
@@ -102,11 +109,33 @@ class FilterInterface(object):
         else:
             self.read_do_not_sync()
         self.is_valid = True
+        self.clear_cache()
 
     def set_hide_pattern(self, re_hide_nodes=EMPTY_PATTERN, re_hide_topics=EMPTY_PATTERN, re_hide_services=EMPTY_PATTERN):
         self._re_hide_nodes = re_hide_nodes
         self._re_hide_topics = re_hide_topics
         self._re_hide_services = re_hide_services
+        self.clear_cache()
+
+    def clear_cache(self):
+        '''
+        Removes the cached results of the test methods. It is called automatically
+        if the patterns are changed by the methods of this class.
+        '''
+        self._cache = {}
+
+    def _cached(self, key, method, *args):
+        # returns the cached result for given key or calls the method and stores its result
+        cache = self._cache
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        result = bool(method(*args))
+        if len(cache) >= self.MAX_CACHE_SIZE:
+            cache.clear()
+        cache[key] = result
+        return result
 
     def read_do_not_sync(self):
         _do_not_sync = get_ros_param('do_not_sync', [])
@@ -121,6 +150,7 @@ class FilterInterface(object):
             # remove empty values
             _do_not_sync = [val for val in _do_not_sync if val]
         self._re_do_not_sync = gen_pattern(_do_not_sync, 'do_not_sync', print_info=False)
+        self.clear_cache()
 
     def update_sync_topics_pattern(self, topics=[]):
         '''
@@ -131,6 +161,7 @@ class FilterInterface(object):
         :type topics: list of strings
         '''
         self._re_sync_topics = create_pattern('sync_topics', self.__data, self.__interface_file, topics, self.__mastername)
+        self.clear_cache()
 
     def sync_remote_nodes(self):
         '''
@@ -156,6 +187,9 @@ class FilterInterface(object):
         '''
         if not self.is_valid:
             return False
+        return self._cached(('n', node), self._is_ignored_node, node)
+
+    def _is_ignored_node(self, node):
         if self._re_hide_nodes.match(node):
             return True
         if self.do_not_sync(node):
@@ -236,6 +270,9 @@ class FilterInterface(object):
         :note: If the filter object is not initialized by load() or from_list() the
               returned value is `False`
         '''
+        return self._cached(('s', node, topic, topictype), self._is_ignored_subscriber, node, topic, topictype)
+
+    def _is_ignored_subscriber(self, node, topic, topictype):
         if self._re_hide_nodes.match(node):
             return True
         if self._re_hide_topics.match(topic):
@@ -268,6 +305,9 @@ class FilterInterface(object):
         :note: If the filter object is not initialized by load() or from_list() the
               returned value is `False`
         '''
+        return self._cached(('p', node, topic, topictype), self._is_ignored_publisher, node, topic, topictype)
+
+    def _is_ignored_publisher(self, node, topic, topictype):
         if self._re_hide_nodes.match(node):
             return True
         if self._re_hide_topics.match(topic):
@@ -297,6 +337,9 @@ class FilterInterface(object):
         '''
         if not self.is_valid:
             return False
+        return self._cached(('v', node, service), self._is_ignored_service, node, service)
+
+    def _is_ignored_service(self, node, service):
         if self._re_hide_nodes.match(node):
             return True
         if self._re_hide_services.match(service):
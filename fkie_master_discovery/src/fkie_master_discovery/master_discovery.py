@@ -34,6 +34,7 @@ try:
     import queue
 except ImportError:
     import Queue as queue  # python 2 compatibility
+import array
 import errno
 import rospy
 import socket
@@ -49,9 +50,11 @@ except ImportError:
     import xmlrpc.client as xmlrpcclient
 
 from rosgraph.network import get_local_addresses, get_local_address
-from .common import get_hostname
+from .common import get_hostname, get_host_address, TimeoutTransport
+from .master_info import clear_locality_cache
 from .master_monitor import MasterMonitor, MasterConnectionException
 from .udp import DiscoverSocket, QueueReceiveItem, SEND_ERRORS
+from .worker_pool import WorkerPool
 
 
 try:  # to avoid the problems with autodoc on ros.org/wiki site
@@ -61,6 +64,58 @@ except:
     pass
 
 
+class HeartbeatBuffer(object):
+    '''
+    Ring buffer with timestamps of the received heartbeats. The timestamps are
+    appended in ascending order, so the old entries are removed from the beginning
+    of the buffer. If the buffer is full, its capacity is doubled.
+
+    :param capacity: the initial count of stored timestamps
+
+    :type capacity:  int
+    '''
+
+    __slots__ = ('_data', '_start', '_count')
+
+    def __init__(self, capacity=64):
+        self._data = array.array('d', [0.0]) * max(1, capacity)
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp):
+        capacity = len(self._data)
+        if self._count == capacity:
+            # keep the order of the timestamps while increasing the capacity
+            self._data = self._data[self._start:] + self._data[:self._start] + array.array('d', [0.0]) * capacity
+            self._start = 0
+            capacity *= 2
+        self._data[(self._start + self._count) % capacity] = timestamp
+        self._count += 1
+
+    def remove_older(self, timestamp):
+        '''
+        Removes all timestamps older than given timestamp.
+
+        :return: the count of removed timestamps
+
+        :rtype: int
+        '''
+        removed = 0
+        capacity = len(self._data)
+        while self._count > 0 and self._data[self._start] < timestamp:
+            self._start = (self._start + 1) % capacity
+            self._count -= 1
+            removed += 1
+        return removed
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+
+
 class DiscoveredMaster(object):
     '''
     The class stores all information about the remote ROS master and the all
@@ -88,15 +143,27 @@ class DiscoveredMaster(object):
     :param callback_master_state: the callback method to publish the changes of the ROS masters
 
     :type callback_master_state: `fkie_master_discovery.msg.MasterState <http://www.ros.org/doc/api/fkie_master_discovery/html/msg/MasterState.html>`_}  (Default: ``None``)
+
+    :param contact_pool: the threads used to retrieve the contact information of the remote ROS master
+
+    :type contact_pool: :mod:`fkie_master_discovery.worker_pool.WorkerPool` (Default: ``None``)
     '''
 
     MIN_HZ_FOR_QUALILTY = 0.3
 
+    CONTACT_TIMEOUT = 10.
+    ''' the timeout of the ``masterContacts()`` request in seconds '''
+
+    CONTACT_RETRY_MIN = 1.
+    CONTACT_RETRY_MAX = 60.
+    ''' the failed retrieval of the contact information is repeated after
+      ``CONTACT_RETRY_MIN`` seconds, doubled on each failure up to ``CONTACT_RETRY_MAX`` '''
+
     ERR_RESOLVE_NAME = 1
     ERR_SOCKET = 2
 
     def __init__(self, monitoruri, is_local=False, heartbeat_rate=1.,
-                 timestamp=0.0, timestamp_local=0.0, callback_master_state=None):
+                 timestamp=0.0, timestamp_local=0.0, callback_master_state=None, contact_pool=None):
         '''
         Initialize method for the DiscoveredMaster class.
 
@@ -123,8 +190,16 @@ class DiscoveredMaster(object):
         :param callback_master_state: the callback method to publish the changes of the ROS masters
 
         :type callback_master_state: `fkie_master_discovery.msg.MasterState <http://www.ros.org/doc/api/fkie_master_discovery/html/msg/MasterState.html>`_}  (Default: ``None``)
+
+        :param contact_pool: the threads used to retrieve the contact information of
+                             the remote ROS master. If ``None`` a new thread is created for each try.
+
+        :type contact_pool: :mod:`fkie_master_discovery.worker_pool.WorkerPool` (Default: ``None``)
         '''
         self.__lock = threading.RLock()
+        # protects the heartbeat and request measurements, which are updated
+        # by the receive thread without the lock of the Discoverer
+        self.__hb_lock = threading.Lock()
         self.masteruri = None
         self.mastername = None
         self.timestamp = timestamp
@@ -133,7 +208,9 @@ class DiscoveredMaster(object):
         self.monitoruri = monitoruri
         self.is_local = is_local
         self.heartbeat_rate = heartbeat_rate
-        self.heartbeats = list()
+        self.heartbeats = HeartbeatBuffer()
+        # the changes of the heartbeat rate in measurement window: [(timestamp, rate)]
+        self._rate_changes = [(time.time(), heartbeat_rate)]
         self.requests = list()
         self.last_heartbeat_ts = time.time()
         self.creation_ts = time.time()
@@ -145,16 +222,44 @@ class DiscoveredMaster(object):
         self.master_hostname = None
         self.masteruriaddr = None
         self._on_finish = False
-        # create a thread to retrieve additional information about the remote ROS master
-        self._get_into_timer = threading.Timer(0.1, self._get_info_threaded)
-        self._get_into_timer.start()
+        self._contact_pool = contact_pool
+        self._contact_pending = False
+        self._contact_failures = 0
+        self._ts_next_contact = 0.
+        # retrieve additional information about the remote ROS master
+        self.request_contact_info()
 
     def finish(self):
         self._on_finish = True
-        try:
-            self._get_into_timer.cancel()
-        except Exception:
-            pass
+
+    def request_contact_info(self, current_time=None):
+        '''
+        Starts the retrieval of the contact information of the remote ROS master, if
+        it is not known yet, no retrieval is running and the backoff time after the
+        last failed retrieval is elapsed. It is called periodically by the Discoverer.
+
+        :param current_time: the current time, ``None`` to use ``time.time()``
+
+        :type current_time:  float
+
+        :return: ``True`` if the retrieval was started
+
+        :rtype: bool
+        '''
+        if self._on_finish or self.mastername is not None or self._contact_pending:
+            return False
+        if current_time is None:
+            current_time = time.time()
+        if current_time < self._ts_next_contact:
+            return False
+        self._contact_pending = True
+        if self._contact_pool is not None:
+            self._contact_pool.submit(self._retrieve_masterinfo)
+        else:
+            thread = threading.Thread(target=self._retrieve_masterinfo)
+            thread.setDaemon(True)
+            thread.start()
+        return True
 
     def add_heartbeat(self, timestamp, timestamp_local, rate):
         '''
@@ -179,35 +284,40 @@ class DiscoveredMaster(object):
 
         :rtype: bool
         '''
-        result = False
+        changed = False
         cur_time = time.time()
-        self.last_heartbeat_ts = cur_time
-        self.ts_last_request = 0
-        self.requests = list()
-        # publish new master state, if the timestamp is changed
-        if (self.timestamp != timestamp or not self.online or self.timestamp_local != timestamp_local):
-            self.timestamp = timestamp
-            self.timestamp_local = timestamp_local
-            if self.masteruri is not None:
-                # set the state to 'online'
-                self.online = True
-                if self.callback_master_state is not None:
-                    self.callback_master_state(MasterState(MasterState.STATE_CHANGED,
-                                                           ROSMaster(str(self.mastername),
-                                                                     self.masteruri,
-                                                                     rospy.Time(self.timestamp),
-                                                                     rospy.Time(self.timestamp_local),
-                                                                     self.online,
-                                                                     self.discoverername,
-                                                                     self.monitoruri)))
-                    result = True
-        if rate >= DiscoveredMaster.MIN_HZ_FOR_QUALILTY:
-            # reset the list, if the heartbeat is changed
-            if self.heartbeat_rate != rate:
-                self.heartbeat_rate = rate
-                self.heartbeats = list()
-            self.heartbeats.append(cur_time)
-        return result
+        with self.__hb_lock:
+            self.last_heartbeat_ts = cur_time
+            self.ts_last_request = 0
+            if self.requests:
+                self.requests = list()
+            # publish new master state, if the timestamp is changed
+            if (self.timestamp != timestamp or not self.online or self.timestamp_local != timestamp_local):
+                self.timestamp = timestamp
+                self.timestamp_local = timestamp_local
+                if self.masteruri is not None:
+                    # set the state to 'online'
+                    self.online = True
+                    changed = True
+            if rate >= DiscoveredMaster.MIN_HZ_FOR_QUALILTY:
+                # remember the change of the heartbeat rate, e.g. by adaptive heartbeat
+                # of the remote discoverer, to calculate the count of expected heartbeats
+                if self.heartbeat_rate != rate:
+                    self.heartbeat_rate = rate
+                    self._rate_changes.append((cur_time, rate))
+                self.heartbeats.append(cur_time)
+        # the callback is called without holding the lock
+        if changed and self.callback_master_state is not None:
+            self.callback_master_state(MasterState(MasterState.STATE_CHANGED,
+                                                   ROSMaster(str(self.mastername),
+                                                             self.masteruri,
+                                                             rospy.Time(timestamp),
+                                                             rospy.Time(timestamp_local),
+                                                             True,
+                                                             self.discoverername,
+                                                             self.monitoruri)))
+            return True
+        return False
 
     def add_request(self, timestamp):
         '''
@@ -218,8 +328,9 @@ class DiscoveredMaster(object):
 
         :type timestamp:  float
         '''
-        self.ts_last_request = timestamp
-        self.requests.append(timestamp)
+        with self.__hb_lock:
+            self.ts_last_request = timestamp
+            self.requests.append(timestamp)
         rospy.logdebug("Unanswered requests [%d] for %s: %s" % (len(self.requests), str(self.masteruri), str(self.requests)))
 
     def requests_count(self):
@@ -237,22 +348,43 @@ class DiscoveredMaster(object):
 
         :rtype: int
         '''
-        do_remove = True
-        # remove the requests
-        while do_remove:
-            if len(self.requests) > 0 and self.requests[0] < timestamp:
-                del self.requests[0]
-            else:
-                do_remove = False
-        do_remove = True
-        removed = 0
-        while do_remove:
-            if len(self.heartbeats) > 0 and self.heartbeats[0] < timestamp:
-                del self.heartbeats[0]
-                removed = removed + 1
-            else:
-                do_remove = False
-        return removed
+        with self.__hb_lock:
+            do_remove = True
+            # remove the requests
+            while do_remove:
+                if len(self.requests) > 0 and self.requests[0] < timestamp:
+                    del self.requests[0]
+                else:
+                    do_remove = False
+            # keep the last rate change before the timestamp
+            while len(self._rate_changes) > 1 and self._rate_changes[1][0] <= timestamp:
+                del self._rate_changes[0]
+            return self.heartbeats.remove_older(timestamp)
+
+    def expected_heartbeats(self, ts_from, ts_to):
+        '''
+        Calculates the count of heartbeats expected in given time range. The changes
+        of the heartbeat rate are considered.
+
+        :param ts_from: the start of the time range
+
+        :type ts_from:  float
+
+        :param ts_to: the end of the time range
+
+        :type ts_to:  float
+
+        :rtype: float
+        '''
+        result = 0.
+        with self.__hb_lock:
+            changes = list(self._rate_changes)
+        for idx, (ts, rate) in enumerate(changes):
+            start = max(ts, ts_from)
+            end = changes[idx + 1][0] if idx + 1 < len(changes) else ts_to
+            if end > start and rate >= self.MIN_HZ_FOR_QUALILTY:
+                result += rate * (end - start)
+        return result
 
     def set_offline(self):
         '''
@@ -292,7 +424,7 @@ class DiscoveredMaster(object):
             # calculate the quality for online masters only
             if self.online:
                 beats_count = len(self.heartbeats)
-                expected_count = int(self.heartbeat_rate * measurement_duration + len(self.requests))
+                expected_count = int(self.expected_heartbeats(ts_oldest, current_time) + len(self.requests))
                 if expected_count > 0:
                     quality = float(beats_count) / float(expected_count) * 100.0
                     if quality > 100.0:
@@ -323,39 +455,42 @@ class DiscoveredMaster(object):
         except:
             pass
 
-    def __start_get_info_timer(self, timetosleep):
-        self._get_into_timer = threading.Timer(timetosleep, self._get_info_threaded)
-        self._get_into_timer.start()
-
-    def _get_info_threaded(self):
-        thread = threading.Thread(target=self._retrieve_masterinfo)
-        thread.setDaemon(True)
-        thread.start()
-
     def _retrieve_masterinfo(self):
         '''
         Connects to the remote RPC server of the discoverer node and gets the
         information about the Master URI, name of the service, and other. The
-        ``getMasterInfo()`` method will be used. On problems the connection will be
-        reestablished until the information will be get successful.
+        ``getMasterInfo()`` method will be used. On problems the retrieval will be
+        repeated by :mod:`fkie_master_discovery.master_discovery.DiscoveredMaster.request_contact_info()`
+        after an exponential increasing time until the information will be get successful.
         '''
+        timetosleep = 0
+        try:
+            self._retrieve_masterinfo_once()
+        finally:
+            if self.mastername is None:
+                timetosleep = min(self.CONTACT_RETRY_MAX, self.CONTACT_RETRY_MIN * (2 ** self._contact_failures))
+                if self._contact_failures < 16:
+                    self._contact_failures += 1
+            else:
+                self._contact_failures = 0
+            self._ts_next_contact = max(self._ts_next_contact, time.time() + timetosleep)
+            self._contact_pending = False
+
+    def _retrieve_masterinfo_once(self):
         if self.monitoruri is not None and not self._on_finish:
-            timetosleep = 5.
             if not rospy.is_shutdown() and self.mastername is None:
                 try:
                     rospy.logdebug("Get additional connection info from %s" % self.monitoruri)
-                    remote_monitor = xmlrpcclient.ServerProxy(self.monitoruri)
-                    socket.setdefaulttimeout(10)
+                    remote_monitor = xmlrpcclient.ServerProxy(self.monitoruri, transport=TimeoutTransport(self.CONTACT_TIMEOUT))
                     timestamp, masteruri, mastername, nodename, monitoruri = remote_monitor.masterContacts()
                     self._del_error(self.ERR_SOCKET)
                     rospy.logdebug("Got [%s, %s, %s, %s] from %s" % (timestamp, masteruri, mastername, nodename, monitoruri))
-                    timetosleep = 0
                 except socket.error as errobj:
                     msg = "can't retrieve connection information using XMLRPC from [%s], socket error: %s" % (self.monitoruri, str(errobj))
                     rospy.logwarn(msg)
                     self._add_error(self.ERR_SOCKET, msg)
                     if errobj.errno in [errno.EHOSTUNREACH]:
-                        timetosleep = 30
+                        self._ts_next_contact = time.time() + 30
                 except:
                     msg = "can't retrieve connection information using XMLRPC from [%s]: %s" % (self.monitoruri, traceback.format_exc())
                     rospy.logwarn(msg)
@@ -371,7 +506,7 @@ class DiscoveredMaster(object):
                         # resolve the masteruri. Print an error if not reachable
                         try:
                             self.master_hostname = get_hostname(self.masteruri)
-                            self.masteruriaddr = socket.gethostbyname(self.master_hostname)
+                            self.masteruriaddr = get_host_address(self.master_hostname)
                             self._del_error(self.ERR_RESOLVE_NAME)
                         except socket.gaierror:
                             msg = "Master discovered with not known hostname ROS_MASTER_URI:='%s'. Fix your network settings!" % str(self.masteruri)
@@ -393,7 +528,6 @@ class DiscoveredMaster(object):
                                                                                  self.online,
                                                                                  self.discoverername,
                                                                                  self.monitoruri)))
-                                timetosleep = 0
                             else:
                                 msg = "calback is None, should not happen...remove master %s" % self.monitoruri
                                 rospy.logwarn(msg)
@@ -402,10 +536,6 @@ class DiscoveredMaster(object):
                         msg = "Got timestamp=0 from %s, retry... " % self.monitoruri
                         rospy.logwarn(msg)
                         self._add_error(self.ERR_SOCKET, msg)
-                finally:
-                    socket.setdefaulttimeout(None)
-                if not self._on_finish and timetosleep > 0:
-                    self.__start_get_info_timer(timetosleep)
 
 
 class Discoverer(object):
@@ -473,6 +603,12 @@ class Discoverer(object):
   '''
     HEARTBEAT_FMT = 'cBBiiHii'
     ''' packet format description, see: http://docs.python.org/library/struct.html '''
+
+    HEARTBEAT_STRUCT = struct.Struct(HEARTBEAT_FMT)
+    ''' the compiled ``HEARTBEAT_FMT`` '''
+
+    HEADER_STRUCT = struct.Struct('cB')
+    ''' the first character and the version of the heartbeat message '''
     HEARTBEAT_HZ = 0.02
     ''' the send rate of the heartbeat packets in hz. Zero disables the heartbeats. (Default: 0.02 Hz)
       Only values between 0.1 and 25.5 are used to detemine the link quality.
@@ -484,6 +620,16 @@ class Discoverer(object):
       (Default: 5 sec are used to determine the link qaulity)'''
     TIMEOUT_FACTOR = 10
     ''' the timeout is defined by calculated measurement duration multiplied by `TIMEOUT_FAKTOR`. '''
+    ADAPTIVE_HEARTBEAT = False
+    ''' adapts the send rate of the heartbeats to the count of discovered masters and
+      to the link quality. `HEARTBEAT_HZ` is used as maximal rate. (Default: False)
+  '''
+    ADAPTIVE_HEARTBEAT_LIMIT = 50.
+    ''' the maximal sum of the heartbeat rates of all discovered masters in Hz, used by
+      adaptive heartbeat. Each master sends with `ADAPTIVE_HEARTBEAT_LIMIT` / count of masters. (Default: 50 Hz)'''
+    ADAPTIVE_HEARTBEAT_QUALITY = 80.
+    ''' if the average link quality is below this value the adaptive heartbeat rate
+      will be halved, otherwise increased by 10% of `HEARTBEAT_HZ`. (Default: 80 %)'''
     ROSMASTER_HZ = 1
     ''' the test rate of ROS master state in Hz (Default: 1 Hz). '''
     REMOVE_AFTER = 300
@@ -508,6 +654,9 @@ class Discoverer(object):
 
     NETPACKET_SIZE = 68
 
+    CONTACT_THREADS = 5
+    ''' the count of threads used to retrieve the contact information of new discovered masters '''
+
     def __init__(self, mcast_port, mcast_group, monitor_port, rpc_addr=''):
         '''
         Initialize method for the Discoverer class
@@ -530,6 +679,8 @@ class Discoverer(object):
         self.__lock = threading.RLock()
         # the list with all ROS master neighbors
         self.masters = dict()  # (ip, DiscoveredMaster)
+        # threads to retrieve the contact information of new masters
+        self._contact_pool = WorkerPool(self.CONTACT_THREADS, 'contact')
         # this parameter stores the state of the remote nodes. If the state is changed
         # the cache for contacts of remote nodes will be cleared.
         self._changed = False
@@ -538,6 +689,9 @@ class Discoverer(object):
         self.HEARTBEAT_HZ = rospy.get_param('~heartbeat_hz', Discoverer.HEARTBEAT_HZ)
         self.MEASUREMENT_INTERVALS = rospy.get_param('~measurement_intervals', Discoverer.MEASUREMENT_INTERVALS)
         self.TIMEOUT_FACTOR = rospy.get_param('~timeout_factor', Discoverer.TIMEOUT_FACTOR)
+        self.ADAPTIVE_HEARTBEAT = rospy.get_param('~adaptive_heartbeat', Discoverer.ADAPTIVE_HEARTBEAT)
+        self.ADAPTIVE_HEARTBEAT_LIMIT = rospy.get_param('~adaptive_heartbeat_limit', Discoverer.ADAPTIVE_HEARTBEAT_LIMIT)
+        self.ADAPTIVE_HEARTBEAT_QUALITY = rospy.get_param('~adaptive_heartbeat_quality', Discoverer.ADAPTIVE_HEARTBEAT_QUALITY)
         self.REMOVE_AFTER = rospy.get_param('~remove_after', Discoverer.REMOVE_AFTER)
         self.ACTIVE_REQUEST_AFTER = rospy.get_param('~active_request_after', Discoverer.ACTIVE_REQUEST_AFTER)
         if self.ACTIVE_REQUEST_AFTER <= 0:
@@ -572,6 +726,15 @@ class Discoverer(object):
             self.HEARTBEAT_HZ = 25.5
         else:
             rospy.loginfo("Heart beat [Hz]: %s" % (self.HEARTBEAT_HZ))
+        if self.ADAPTIVE_HEARTBEAT:
+            if self.HEARTBEAT_HZ < DiscoveredMaster.MIN_HZ_FOR_QUALILTY:
+                rospy.logwarn("Adaptive heart beat disabled, heart beat [Hz]: %s is less than %s" % (self.HEARTBEAT_HZ, DiscoveredMaster.MIN_HZ_FOR_QUALILTY))
+                self.ADAPTIVE_HEARTBEAT = False
+            else:
+                rospy.loginfo("Adaptive heart beat, limit for all masters [Hz]: %s" % self.ADAPTIVE_HEARTBEAT_LIMIT)
+        # the current send rate of the heartbeats, changed by adaptive heartbeat
+        self.current_heartbeat_hz = self.HEARTBEAT_HZ
+        self._ts_heartbeat_adapted = time.time()
         rospy.loginfo("Active request after [sec]: %s" % self.ACTIVE_REQUEST_AFTER)
         rospy.loginfo("Remove after [sec]: %s" % self.REMOVE_AFTER)
         if self.REMOVE_AFTER <= self.ACTIVE_REQUEST_AFTER:
@@ -612,9 +775,14 @@ class Discoverer(object):
         # set the callback to finish all running threads
         rospy.on_shutdown(self.on_shutdown)
         self._recv_tread = threading.Thread(target=self._recv_loop_from_queue)
+        # the heartbeats of known masters are handled in the receive thread, all other
+        # messages (new master, LEAVE, requests) are handled in a separate thread
+        self._slow_path_queue = queue.Queue()
+        self._slow_path_thread = threading.Thread(target=self._recv_loop_slow_path)
 
     def start(self):
         self._recv_tread.start()
+        self._slow_path_thread.start()
         self._timer_ros_changes.start()
         self._timer_stats.start()
         self._timer_heartbeat.start()
@@ -631,6 +799,8 @@ class Discoverer(object):
         # create discovery socket
         # if multicast messages are disabled only unicast socket is created
         # unicast socket is also created if ~interface is defined
+        # the local interfaces can be changed on reconnect
+        clear_locality_cache()
         self.socket = DiscoverSocket(self.mcast_port, self.mcast_group, send_mcast=self._send_mcast, listen_mcast=self._listen_mcast)
         if self._send_mcast or self._listen_mcast:
             if not self.socket.hasEnabledMulticastIface() and doexit_on_error:
@@ -669,9 +839,10 @@ class Discoverer(object):
                                                                    master.discoverername,
                                                                    master.monitoruri)))
                 master.finish()
+            self._contact_pool.shutdown()
             # send notification that the master is going off
-            msg = struct.pack(Discoverer.HEARTBEAT_FMT, b'R', Discoverer.VERSION,
-                              int(self.HEARTBEAT_HZ * 10), -1, -1,
+            msg = Discoverer.HEARTBEAT_STRUCT.pack(b'R', Discoverer.VERSION,
+                              int(round(self.current_heartbeat_hz * 10)), -1, -1,
                               self.master_monitor.rpcport, -1, -1)
             self._publish_current_state(msg=msg)
             time.sleep(0.2)
@@ -714,7 +885,7 @@ class Discoverer(object):
                     self._request_state()
             if timer and not self.do_finish:
                 if (self.HEARTBEAT_HZ > 0. or self._init_notifications < self.INIT_NOTIFICATION_COUNT):
-                    sleeptime = 1.0 / self.HEARTBEAT_HZ if self.HEARTBEAT_HZ > 0. else 1.0
+                    sleeptime = 1.0 / self.current_heartbeat_hz if self.current_heartbeat_hz > 0. else 1.0
                     rospy.logdebug("Set timer to send heartbeat in %.2f sec" % sleeptime)
                     self._timer_heartbeat = threading.Timer(sleeptime, self.send_heartbeat)
                     self._timer_heartbeat.start()
@@ -773,8 +944,8 @@ class Discoverer(object):
         if not self.master_monitor.getCurrentState() is None:
             t = self.master_monitor.getCurrentState().timestamp
             local_t = self.master_monitor.getCurrentState().timestamp_local
-            return struct.pack(Discoverer.HEARTBEAT_FMT, b'R', Discoverer.VERSION,
-                               int(self.HEARTBEAT_HZ * 10),
+            return Discoverer.HEARTBEAT_STRUCT.pack(b'R', Discoverer.VERSION,
+                               int(round(self.current_heartbeat_hz * 10)),
                                int(t), int((t - (int(t))) * 1000000000),
                                self.master_monitor.rpcport,
                                int(local_t), int((local_t - (int(local_t))) * 1000000000))
@@ -782,8 +953,8 @@ class Discoverer(object):
 
     def _create_request_update_msg(self):
         version = Discoverer.VERSION if Discoverer.VERSION > 2 else 3
-        msg = struct.pack(Discoverer.HEARTBEAT_FMT, b'R', version,
-                          int(self.HEARTBEAT_HZ * 10), 0, 0,
+        msg = Discoverer.HEARTBEAT_STRUCT.pack(b'R', version,
+                          int(round(self.current_heartbeat_hz * 10)), 0, 0,
                           self.master_monitor.rpcport, 0, 0)
         return msg
 
@@ -835,6 +1006,8 @@ class Discoverer(object):
             current_time = time.time()
             to_remove = []
             multi_address = []
+            unicast_addresses = []
+            unicast_masters = []
             for (k, v) in self.masters.items():
                 ts_since_last_hb = current_time - v.last_heartbeat_ts
                 ts_since_last_request = current_time - max(v.ts_last_request, v.last_heartbeat_ts)
@@ -860,7 +1033,11 @@ class Discoverer(object):
                         # one unicast address
                         multi_address.append(v)
                     else:
-                        self._request_state(k[0][0], [v])
+                        unicast_addresses.append(k[0][0])
+                        unicast_masters.append(v)
+            # send all unicast requests as one item to the send queue
+            if unicast_masters:
+                self._request_state(unicast_addresses, unicast_masters)
             if multi_address:
                 self._request_state(masters=multi_address)
             for r in to_remove:
@@ -876,83 +1053,116 @@ class Discoverer(object):
             except queue.Empty:
                 pass
 
+    def _recv_loop_slow_path(self):
+        while not self.do_finish:
+            try:
+                msg_tuple, address, via = self._slow_path_queue.get(timeout=1)
+                self._handle_msg(msg_tuple, address, via)
+            except queue.Empty:
+                pass
+
     def recv_udp_msg(self, msg, address, via):
         '''
-        This method handles the received udp messages.
+        This method handles the received udp messages. The heartbeats of known
+        masters are processed without the lock of the Discoverer. All other messages
+        are forwarded to the slow path thread.
         '''
         if not rospy.is_shutdown() and not self.do_finish:
-            with self.__lock:
-                self._check_timejump()
-                try:
-                    if len(msg) == 0:
+            current_time = time.time()
+            if self._last_datetime > current_time:
+                with self.__lock:
+                    self._check_timejump()
+            else:
+                self._last_datetime = current_time
+            try:
+                if len(msg) == 0:
+                    return
+                (version, msg_tuple) = self.msg2masterState(msg, address)
+                if (version in [2, 3]):
+                    (firstc, version, rate, secs, nsecs, monitor_port, secs_l, nsecs_l) = msg_tuple
+                    if firstc != b'R':
+                        # ignore the message. it does not start with 'R'
                         return
-                    (version, msg_tuple) = self.msg2masterState(msg, address)
-                    if (version in [2, 3]):
-                        add_to_list = False
-                        (firstc, version, rate, secs, nsecs, monitor_port, secs_l, nsecs_l) = msg_tuple
-                        if firstc != b'R':
-                            # ignore the message. it does not start with 'R'
-                            return
-                        master_key = (address, monitor_port)
-                        if version >= 3 and secs == 0 and nsecs == 0:
-                            # is it a request to update the state
-                            # send the current master state to the sender address
-                            # TODO: add a filter, if multicast messages are disabled?
-                            if self.master_monitor.getCurrentState() is not None:
-                                if via == QueueReceiveItem.MULTICAST:
-                                    rospy.logdebug("Received a multicast request for a state update from %s" % address[0])
-                                    self._ts_received_mcast_request = time.time()
-                                    if self._send_mcast:
-                                        self._publish_current_state()
-                                    self._publish_current_state(address[0])
-                                elif via in [QueueReceiveItem.LOOPBACK, QueueReceiveItem.UNICAST]:
-                                    rospy.logdebug("Received a request for a state update from %s" % (address[0]))
-                                    self._publish_current_state(address[0])
-                            add_to_list = master_key not in self.masters
-                        elif secs == -1 or secs_l == -1:
-                            # remove master if sec and nsec are -1
-                            rospy.logdebug("Received a LEAVE heartbeat from %s via %s socket" % (master_key[0], via))
-                            if master_key in self.masters:
-                                master = self.masters[master_key]
-                                if master.mastername is not None:
-                                    # the contact info of the master is valied, publish the change
-                                    state_remove = MasterState(MasterState.STATE_REMOVED,
-                                                               ROSMaster(str(master.mastername),
-                                                                         master.masteruri,
-                                                                         rospy.Time(master.timestamp),
-                                                                         rospy.Time(master.timestamp_local),
-                                                                         False,
-                                                                         master.discoverername,
-                                                                         master.monitoruri))
-                                    master.finish()
-                                    self.publish_masterstate(state_remove)
-                                rospy.loginfo("Remove master discovery: http://%s:%s, with ROS_MASTER_URI=%s" % (address[0], monitor_port, master.masteruri))
-                                self._rem_address(address[0])
-                                del self.masters[master_key]
-                        elif master_key in self.masters:
-                            # update the timestamp of existing master
-                            rospy.logdebug("Received a heartbeat from %s via %s socket" % (master_key[0], via))
-                            changed = self.masters[master_key].add_heartbeat(float(secs) + float(nsecs) / 1000000000.0, float(secs_l) + float(nsecs_l) / 1000000000.0, float(rate) / 10.0,)
-                            if not self._changed:
-                                self._changed = changed
-                        else:
-                            rospy.logdebug("Received a NEW heartbeat from %s via %s socket" % (master_key[0], via))
-                            # or create a new master
-                            add_to_list = True
-                        if add_to_list:
-                            rospy.loginfo("Detected master discovery: http://%s:%s" % (address[0], monitor_port))
-                            self._add_address(address[0])
-                            is_local = address[0].startswith('127.') or address[0] in get_local_addresses()
-                            self.masters[master_key] = DiscoveredMaster(monitoruri=''.join(['http://', address[0], ':', str(monitor_port)]),
-                                                                        is_local=is_local,
-                                                                        heartbeat_rate=float(rate) / 10.0,
-                                                                        timestamp=float(secs) + float(nsecs) / 1000000000.0,
-                                                                        timestamp_local=float(secs_l) + float(nsecs_l) / 1000000000.0,
-                                                                        callback_master_state=self.publish_masterstate)
-                            if via == QueueReceiveItem.LOOPBACK:
-                                self._publish_current_state(address[0])
-                except Exception as e:
-                    rospy.logwarn("Error while decode message: %s", str(e))
+                    master = self.masters.get((address, monitor_port), None)
+                    is_request = version >= 3 and secs == 0 and nsecs == 0
+                    if master is not None and not is_request and secs != -1 and secs_l != -1:
+                        # update the timestamp of existing master
+                        if master.add_heartbeat(secs + nsecs / 1000000000.0, secs_l + nsecs_l / 1000000000.0, rate / 10.0):
+                            self._changed = True
+                    else:
+                        self._slow_path_queue.put((msg_tuple, address, via))
+            except Exception as e:
+                rospy.logwarn("Error while decode message: %s", str(e))
+
+    def _handle_msg(self, msg_tuple, address, via):
+        '''
+        Handles the requests, LEAVE messages and heartbeats of new masters.
+        '''
+        with self.__lock:
+            try:
+                add_to_list = False
+                (firstc, version, rate, secs, nsecs, monitor_port, secs_l, nsecs_l) = msg_tuple
+                master_key = (address, monitor_port)
+                if version >= 3 and secs == 0 and nsecs == 0:
+                    # is it a request to update the state
+                    # send the current master state to the sender address
+                    # TODO: add a filter, if multicast messages are disabled?
+                    if self.master_monitor.getCurrentState() is not None:
+                        if via == QueueReceiveItem.MULTICAST:
+                            rospy.logdebug("Received a multicast request for a state update from %s" % address[0])
+                            self._ts_received_mcast_request = time.time()
+                            if self._send_mcast:
+                                self._publish_current_state()
+                            self._publish_current_state(address[0])
+                        elif via in [QueueReceiveItem.LOOPBACK, QueueReceiveItem.UNICAST]:
+                            rospy.logdebug("Received a request for a state update from %s" % (address[0]))
+                            self._publish_current_state(address[0])
+                    add_to_list = master_key not in self.masters
+                elif secs == -1 or secs_l == -1:
+                    # remove master if sec and nsec are -1
+                    rospy.logdebug("Received a LEAVE heartbeat from %s via %s socket" % (master_key[0], via))
+                    if master_key in self.masters:
+                        master = self.masters[master_key]
+                        if master.mastername is not None:
+                            # the contact info of the master is valied, publish the change
+                            state_remove = MasterState(MasterState.STATE_REMOVED,
+                                                       ROSMaster(str(master.mastername),
+                                                                 master.masteruri,
+                                                                 rospy.Time(master.timestamp),
+                                                                 rospy.Time(master.timestamp_local),
+                                                                 False,
+                                                                 master.discoverername,
+                                                                 master.monitoruri))
+                            master.finish()
+                            self.publish_masterstate(state_remove)
+                        rospy.loginfo("Remove master discovery: http://%s:%s, with ROS_MASTER_URI=%s" % (address[0], monitor_port, master.masteruri))
+                        self._rem_address(address[0])
+                        del self.masters[master_key]
+                elif master_key in self.masters:
+                    # update the timestamp of existing master
+                    rospy.logdebug("Received a heartbeat from %s via %s socket" % (master_key[0], via))
+                    changed = self.masters[master_key].add_heartbeat(float(secs) + float(nsecs) / 1000000000.0, float(secs_l) + float(nsecs_l) / 1000000000.0, float(rate) / 10.0,)
+                    if not self._changed:
+                        self._changed = changed
+                else:
+                    rospy.logdebug("Received a NEW heartbeat from %s via %s socket" % (master_key[0], via))
+                    # or create a new master
+                    add_to_list = True
+                if add_to_list:
+                    rospy.loginfo("Detected master discovery: http://%s:%s" % (address[0], monitor_port))
+                    self._add_address(address[0])
+                    is_local = address[0].startswith('127.') or address[0] in get_local_addresses()
+                    self.masters[master_key] = DiscoveredMaster(monitoruri=''.join(['http://', address[0], ':', str(monitor_port)]),
+                                                                is_local=is_local,
+                                                                heartbeat_rate=float(rate) / 10.0,
+                                                                timestamp=float(secs) + float(nsecs) / 1000000000.0,
+                                                                timestamp_local=float(secs_l) + float(nsecs_l) / 1000000000.0,
+                                                                callback_master_state=self.publish_masterstate,
+                                                                contact_pool=self._contact_pool)
+                    if via == QueueReceiveItem.LOOPBACK:
+                        self._publish_current_state(address[0])
+            except Exception as e:
+                rospy.logwarn("Error while handle message: %s", str(e))
 
     def _check_timejump(self):
         if self._last_datetime > time.time():
@@ -989,13 +1199,12 @@ class Discoverer(object):
         :rtype: (``unsigned char``, tuple corresponding to :mod:`fkie_master_discovery.master_discovery.Discoverer.HEARTBEAT_FMT`)
         '''
         if len(msg) > 2:
-            (r,) = struct.unpack('c', msg[0:1])
-            (version,) = struct.unpack('B', msg[1:2])
+            (r, version) = cls.HEADER_STRUCT.unpack_from(msg)
             if (version in [Discoverer.VERSION, 2, 3]):
                 if (r == b'R'):
-                    struct_size = struct.calcsize(Discoverer.HEARTBEAT_FMT)
+                    struct_size = cls.HEARTBEAT_STRUCT.size
                     if len(msg) == struct_size:
-                        return (version, struct.unpack(Discoverer.HEARTBEAT_FMT, msg))
+                        return (version, cls.HEARTBEAT_STRUCT.unpack(msg))
                     else:
                         raise Exception("wrong message size; expected %d, got %d from %s" % (struct_size, len(msg), address))
                 else:
@@ -1017,12 +1226,20 @@ class Discoverer(object):
         result = LinkStatesStamped()
         result.header.stamp = rospy.Time.from_sec(time.time())
         with self.__lock:
+            qualities = []
+            current_time = time.time()
             for (_, v) in self.masters.items():
+                # retry the retrieval of the contact information
+                v.request_contact_info(current_time)
                 quality = v.get_quality(self.MEASUREMENT_INTERVALS, self.TIMEOUT_FACTOR)
                 if not (v.mastername is None) and v.online:
                     result.links.append(LinkState(v.mastername, quality, rospy.Time.from_sec(v.last_heartbeat_ts)))
+                    if quality >= 0 and not v.is_local:
+                        qualities.append(quality)
                 if v.is_local:
                     result.header.frame_id = v.mastername
+            if self.ADAPTIVE_HEARTBEAT:
+                self._adapt_heartbeat_rate(qualities)
         # publish the results
         self.publish_stats(result)
         try:
@@ -1032,6 +1249,36 @@ class Discoverer(object):
         except:
             pass
 
+    def _adapt_heartbeat_rate(self, qualities):
+        '''
+        Changes the send rate of the heartbeats (AIMD). The rate is halved if the average
+        link quality is below `ADAPTIVE_HEARTBEAT_QUALITY`, otherwise increased by 10% of
+        `HEARTBEAT_HZ`. The rate is limited by `HEARTBEAT_HZ` and the share of this master
+        of `ADAPTIVE_HEARTBEAT_LIMIT`. The rate is changed once per measurement interval,
+        so the link qualities are measured with the last rate.
+
+        :param qualities: the link qualities of the remote masters
+
+        :type qualities:  list of float
+        '''
+        current_time = time.time()
+        if current_time - self._ts_heartbeat_adapted < self.MEASUREMENT_INTERVALS:
+            return
+        self._ts_heartbeat_adapted = current_time
+        min_hz = DiscoveredMaster.MIN_HZ_FOR_QUALILTY
+        max_hz = self.ADAPTIVE_HEARTBEAT_LIMIT / max(1, len(self.masters))
+        max_hz = max(min_hz, min(self.HEARTBEAT_HZ, max_hz))
+        hz = self.current_heartbeat_hz
+        if qualities and sum(qualities) / len(qualities) < self.ADAPTIVE_HEARTBEAT_QUALITY:
+            hz = hz / 2.0
+        else:
+            hz = hz + max(0.1, self.HEARTBEAT_HZ / 10.0)
+        # the rate is sent with a resolution of 0.1 Hz
+        hz = round(max(min_hz, min(max_hz, hz)), 1)
+        if hz != self.current_heartbeat_hz:
+            rospy.logdebug("Change heart beat [Hz]: %.1f -> %.1f" % (self.current_heartbeat_hz, hz))
+            self.current_heartbeat_hz = hz
+
     def publish_masterstate(self, master_state):
         '''
         Publishes the given state to the ROS network. This method is thread safe.
@@ -1127,10 +1374,15 @@ class Discoverer(object):
         '''
         with self.__lock:
             try:
+                addresses = []
+                masters = []
                 for (k, v) in self.masters.items():
                     if v.mastername is not None:
                         # send an active unicast request
-                        self._request_state(k[0][0], [v])
+                        addresses.append(k[0][0])
+                        masters.append(v)
+                if masters:
+                    self._request_state(addresses, masters)
                 if self._listen_mcast:
                     self._request_state()
 #        self._send_current_state()
@@ -31,6 +31,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import socket
+import sys
 try:
     import cStringIO as io  # python 2 compatibility
 except ImportError:
@@ -39,7 +40,100 @@ import roslib
 import rospy
 
 from .common import get_hostname
-from .filter_interface import FilterInterface
+
+try:
+    _intern = intern  # python 2 compatibility
+except NameError:
+    _intern = sys.intern
+
+INDEX_THRESHOLD = 16
+''' lists of names with more entries get an additional set to test for existing names '''
+LOCALITY_CACHE_SIZE = 10000
+''' the maximal count of cached locality decisions, the cache is cleared if it is full '''
+
+DIGEST_MASK = (1 << 64) - 1
+''' the structural digests of the master states are limited to 64 bit '''
+
+_LOCALITY = {}  # {(masteruri, uri): same host}
+
+
+def intern_name(name):
+    '''
+    Interns the given string, so equal names of nodes, topics, services and types
+    share the same string object in all :mod:`fkie_master_discovery.master_info.MasterInfo`
+    instances.
+
+    :param name: the name to intern
+
+    :type name: str
+
+    :return: the interned name or the given object, if it can not be interned (e.g. ``None``).
+    '''
+    try:
+        return _intern(name)
+    except TypeError:
+        return name
+
+
+def _unique_names(names):
+    # returns the list with interned names without duplicates in the given order
+    seen = set()
+    result = []
+    for name in names:
+        name = intern_name(name)
+        if name not in seen:
+            seen.add(name)
+            result.append(name)
+    return result
+
+
+def clear_locality_cache():
+    '''
+    Removes all cached locality decisions of nodes and services. Should be called
+    if the local network interfaces are changed. Already created
+    :mod:`fkie_master_discovery.master_info.NodeInfo` and
+    :mod:`fkie_master_discovery.master_info.ServiceInfo` objects keep their locality
+    until their URIs are set again.
+    '''
+    _LOCALITY.clear()
+
+
+def _same_host(masteruri, uri):
+    # compares the hostnames of both URIs, the result is cached in _LOCALITY
+    key = (masteruri, uri)
+    try:
+        return _LOCALITY[key]
+    except KeyError:
+        pass
+    try:
+        result = get_hostname(masteruri) == get_hostname(uri)
+    except Exception:
+        result = False
+    if len(_LOCALITY) >= LOCALITY_CACHE_SIZE:
+        _LOCALITY.clear()
+    _LOCALITY[key] = result
+    return result
+
+
+def _is_local(masteruri, org_masteruri, uri):
+    # the node or service runs on the host of the ROS master, where it is registered
+    return masteruri == org_masteruri and _same_host(masteruri, uri)
+
+
+def _add_unique(items, index, name):
+    # appends the name to the list if it is not already in. Returns the set of the names,
+    # which is created for lists with more than INDEX_THRESHOLD entries or None.
+    if index is None:
+        if name in items:
+            return None
+        items.append(name)
+        if len(items) > INDEX_THRESHOLD:
+            return set(items)
+        return None
+    if name not in index:
+        index.add(name)
+        items.append(name)
+    return index
 
 
 class NodeInfo(object):
@@ -57,6 +151,10 @@ class NodeInfo(object):
     :type masteruri: str
     '''
 
+    __slots__ = ('__name', '__masteruri', '__org_masteruri', '__uri', '__pid', '__local', '__local_master',
+                 '_publishedTopics', '_subscribedTopics', '_services',
+                 '_publishedTopicsIndex', '_subscribedTopicsIndex', '_servicesIndex', '_digest')
+
     def __init__(self, name, masteruri):
         '''
         Creates a new NodeInfo for a node with given name.
@@ -71,17 +169,20 @@ class NodeInfo(object):
 
         :type masteruri: str
         '''
-        self.__name = name
-        self.__masteruri = masteruri
-        self.__org_masteruri = masteruri
+        self.__name = intern_name(name)
+        self.__masteruri = intern_name(masteruri)
+        self.__org_masteruri = self.__masteruri
         self.__uri = None
-        self.pid = None
-        '''the process id of the node. Invalid id has a ``None`` value'''
+        self.__pid = None
         self.__local = False
         self.__local_master = True
         self._publishedTopics = []
         self._subscribedTopics = []
         self._services = []
+        self._publishedTopicsIndex = None
+        self._subscribedTopicsIndex = None
+        self._servicesIndex = None
+        self._digest = None
 
     def __repr__(self):
         return "<NodeInfo name=%s, uri=%s, masteruri=%s, is_local=%s, pub_topics=%d, sub_topics=%d>" % (self.name, self.uri, self.masteruri, self.isLocal, len(self.publishedTopics), len(self.subscribedTopics))
@@ -109,8 +210,9 @@ class NodeInfo(object):
         '''
         Sets the URI of the RPC API of the node.
         '''
-        self.__uri = uri
-        self.__local = NodeInfo.local_(self.__masteruri, self.__org_masteruri, self.__uri)
+        self.__uri = intern_name(uri)
+        self.__local = _is_local(self.__masteruri, self.__org_masteruri, self.__uri)
+        self._digest = None
 
     @property
     def masteruri(self):
@@ -126,9 +228,27 @@ class NodeInfo(object):
         '''
         Sets the ROS master URI.
         '''
-        self.__org_masteruri = uri
-        self.__local = NodeInfo.local_(self.__masteruri, self.__org_masteruri, self.__uri)
+        self.__org_masteruri = intern_name(uri)
+        self.__local = _is_local(self.__masteruri, self.__org_masteruri, self.__uri)
         self.__local_master = (self.__masteruri == self.__org_masteruri)
+        self._digest = None
+
+    @property
+    def pid(self):
+        '''
+        :return: the process id of the node. Invalid id has a ``None`` value.
+
+        :rtype: int
+        '''
+        return self.__pid
+
+    @pid.setter
+    def pid(self, pid):
+        '''
+        Sets the process id of the node.
+        '''
+        self.__pid = pid
+        self._digest = None
 
     @property
     def isLocal(self):
@@ -166,14 +286,12 @@ class NodeInfo(object):
 
         :type name: str
         '''
-        try:
-            if isinstance(name, list):
-                del self._publishedTopics
-                self._publishedTopics = name
-            else:
-                self._publishedTopics.index(name)
-        except ValueError:
-            self._publishedTopics.append(name)
+        if isinstance(name, list):
+            self._publishedTopics = [intern_name(n) for n in name]
+            self._publishedTopicsIndex = None
+        else:
+            self._publishedTopicsIndex = _add_unique(self._publishedTopics, self._publishedTopicsIndex, intern_name(name))
+        self._digest = None
 
 #  @publishedTopics.deleter
 #  def publishedTopics(self):
@@ -197,14 +315,12 @@ class NodeInfo(object):
 
         :type name: str
         '''
-        try:
-            if isinstance(name, list):
-                del self._subscribedTopics
-                self._subscribedTopics = name
-            else:
-                self._subscribedTopics.index(name)
-        except ValueError:
-            self._subscribedTopics.append(name)
+        if isinstance(name, list):
+            self._subscribedTopics = [intern_name(n) for n in name]
+            self._subscribedTopicsIndex = None
+        else:
+            self._subscribedTopicsIndex = _add_unique(self._subscribedTopics, self._subscribedTopicsIndex, intern_name(name))
+        self._digest = None
 
 #  @subscribedTopics.deleter
 #  def subscribedTopics(self):
@@ -228,14 +344,12 @@ class NodeInfo(object):
 
         :type name: str
         '''
-        try:
-            if isinstance(name, list):
-                del self._services
-                self._services = name
-            else:
-                self._services.index(name)
-        except ValueError:
-            self._services.append(name)
+        if isinstance(name, list):
+            self._services = [intern_name(n) for n in name]
+            self._servicesIndex = None
+        else:
+            self._servicesIndex = _add_unique(self._services, self._servicesIndex, intern_name(name))
+        self._digest = None
 
 #  @services.deleter
 #  def services(self):
@@ -251,14 +365,33 @@ class NodeInfo(object):
         if new_masteruri is None:
             new_masteruri = self.masteruri
         result = NodeInfo(self.name, new_masteruri)
-        result.uri = str(self.uri) if self.uri is not None else None
-        result.masteruri = self.masteruri
+        result._set_uris(self.uri, self.masteruri)
         result.pid = self.pid
         result._publishedTopics = list(self._publishedTopics)
         result._subscribedTopics = list(self._subscribedTopics)
         result._services = list(self._services)
         return result
 
+    def _set_uris(self, uri, org_masteruri):
+        # sets the URI and the origin ROS master URI at once, the locality is determined only once
+        self.__uri = intern_name(uri)
+        self.__org_masteruri = intern_name(org_masteruri)
+        self.__local_master = (self.__masteruri == self.__org_masteruri)
+        self.__local = _is_local(self.__masteruri, self.__org_masteruri, self.__uri)
+        self._digest = None
+
+    def digest(self):
+        '''
+        :return: the structural digest of the node. It will be computed again only
+                 after the node was changed.
+
+        :rtype: int
+        '''
+        if self._digest is None:
+            self._digest = hash((self.__name, self.__uri, self.__pid, self.__org_masteruri, self.__local, self.__local_master,
+                                 frozenset(self._publishedTopics), frozenset(self._subscribedTopics), frozenset(self._services)))
+        return self._digest
+
     @staticmethod
     def local_(masteruri, org_masteruri, uri):
         '''
@@ -278,14 +411,7 @@ class NodeInfo(object):
 
         :rtype: bool
         '''
-        result = False
-        try:
-            om = get_hostname(masteruri)
-            on = get_hostname(uri)
-            result = (om == on) and (masteruri == org_masteruri)
-        except:
-            pass
-        return result
+        return _is_local(masteruri, org_masteruri, uri)
 
 
 class TopicInfo(object):
@@ -297,6 +423,9 @@ class TopicInfo(object):
     :type name: str
     '''
 
+    __slots__ = ('__name', '__type', '_publisherNodes', '_subscriberNodes',
+                 '_publisherNodesIndex', '_subscriberNodesIndex')
+
     def __init__(self, name):
         '''
         Creates a new TopicInfo for a topic with given name.
@@ -305,11 +434,12 @@ class TopicInfo(object):
 
         :type name: str
         '''
-        self.__name = name
-        self.type = None
-        '''the type of the topic. (Default: ``None``)'''
+        self.__name = intern_name(name)
+        self.__type = None
         self._publisherNodes = []
         self._subscriberNodes = []
+        self._publisherNodesIndex = None
+        self._subscriberNodesIndex = None
 
     @property
     def name(self):
@@ -320,6 +450,19 @@ class TopicInfo(object):
         '''
         return self.__name
 
+    @property
+    def type(self):
+        '''
+        :return: the type of the topic. (Default: ``None``)
+
+        :rtype: str
+        '''
+        return self.__type
+
+    @type.setter
+    def type(self, topic_type):
+        self.__type = intern_name(topic_type)
+
     @property
     def publisherNodes(self):
         '''
@@ -334,14 +477,11 @@ class TopicInfo(object):
         '''
         Append a new publishing node to this topic.
         '''
-        try:
-            if isinstance(name, list):
-                del self._publisherNodes
-                self._publisherNodes = name
-            else:
-                self._publisherNodes.index(name)
-        except ValueError:
-            self._publisherNodes.append(name)
+        if isinstance(name, list):
+            self._publisherNodes = [intern_name(n) for n in name]
+            self._publisherNodesIndex = None
+        else:
+            self._publisherNodesIndex = _add_unique(self._publisherNodes, self._publisherNodesIndex, intern_name(name))
 
 #  @publisherNodes.deleter
 #  def publisherNodes(self):
@@ -361,14 +501,11 @@ class TopicInfo(object):
         '''
         Append a new subscribing node to this topic.
         '''
-        try:
-            if isinstance(name, list):
-                del self._subscriberNodes
-                self._subscriberNodes = name
-            else:
-                self._subscriberNodes.index(name)
-        except ValueError:
-            self._subscriberNodes.append(name)
+        if isinstance(name, list):
+            self._subscriberNodes = [intern_name(n) for n in name]
+            self._subscriberNodesIndex = None
+        else:
+            self._subscriberNodesIndex = _add_unique(self._subscriberNodes, self._subscriberNodesIndex, intern_name(name))
 
 #  @subscriberNodes.deleter
 #  def subscriberNodes(self):
@@ -402,6 +539,9 @@ class ServiceInfo(object):
     :type masteruri: str
     '''
 
+    __slots__ = ('__name', '__masteruri', '__org_masteruri', '__uri', '__local', '__local_master',
+                 '__type', '__service_class', 'args', '_serviceProvider', '_serviceProviderIndex', '_digest')
+
     def __init__(self, name, masteruri):
         '''
         Creates a new instance of the ServiceInfo.
@@ -416,17 +556,18 @@ class ServiceInfo(object):
 
         :type masteruri: str
         '''
-        self.__name = name
-        self.__masteruri = masteruri
-        self.__org_masteruri = masteruri
+        self.__name = intern_name(name)
+        self.__masteruri = intern_name(masteruri)
+        self.__org_masteruri = self.__masteruri
         self.__uri = None
         self.__local = False
         self.__local_master = True
-        self.type = None
-        '''the type of the service. (Default: ``None``)'''
+        self.__type = None
         self.__service_class = None
         self.args = None
         self._serviceProvider = []
+        self._serviceProviderIndex = None
+        self._digest = None
 
     @property
     def name(self):
@@ -456,8 +597,9 @@ class ServiceInfo(object):
 
         :type uri: str
         '''
-        self.__uri = uri
-        self.__local = NodeInfo.local_(self.__masteruri, self.__org_masteruri, self.__uri)
+        self.__uri = intern_name(uri)
+        self.__local = _is_local(self.__masteruri, self.__org_masteruri, self.__uri)
+        self._digest = None
 
     @property
     def masteruri(self):
@@ -478,9 +620,10 @@ class ServiceInfo(object):
 
         :type uri: str
         '''
-        self.__org_masteruri = uri
+        self.__org_masteruri = intern_name(uri)
         self.__local_master = (self.__masteruri == self.__org_masteruri)
-        self.__local = NodeInfo.local_(self.__masteruri, self.__org_masteruri, self.__uri)
+        self.__local = _is_local(self.__masteruri, self.__org_masteruri, self.__uri)
+        self._digest = None
 
     @property
     def isLocal(self):
@@ -501,6 +644,19 @@ class ServiceInfo(object):
         '''
         return self.__local_master
 
+    @property
+    def type(self):
+        '''
+        :return: the type of the service. (Default: ``None``)
+
+        :rtype: str
+        '''
+        return self.__type
+
+    @type.setter
+    def type(self, service_type):
+        self.__type = intern_name(service_type)
+
     @property
     def serviceProvider(self):
         '''
@@ -519,14 +675,12 @@ class ServiceInfo(object):
 
         :type name: str
         '''
-        try:
-            self._serviceProvider.index(name)
-        except ValueError:
-            self._serviceProvider.append(name)
+        self._serviceProviderIndex = _add_unique(self._serviceProvider, self._serviceProviderIndex, intern_name(name))
 
     @serviceProvider.deleter
     def serviceProvider(self):
         del self._serviceProvider
+        self._serviceProviderIndex = None
 
     def get_service_class(self, allow_get_type=False):
         '''
@@ -603,13 +757,32 @@ class ServiceInfo(object):
         if new_masteruri is None:
             new_masteruri = self.masteruri
         result = ServiceInfo(self.name, new_masteruri)
-        result.uri = self.uri
-        result.masteruri = self.masteruri
+        result._set_uris(self.uri, self.masteruri)
         result.type = self.type
         result.args = self.args
         result._serviceProvider = list(self.serviceProvider)
         return result
 
+    def _set_uris(self, uri, org_masteruri):
+        # sets the URI and the origin ROS master URI at once, the locality is determined only once
+        self.__uri = intern_name(uri)
+        self.__org_masteruri = intern_name(org_masteruri)
+        self.__local_master = (self.__masteruri == self.__org_masteruri)
+        self.__local = _is_local(self.__masteruri, self.__org_masteruri, self.__uri)
+        self._digest = None
+
+    def digest(self):
+        '''
+        :return: the structural digest of the service. It will be computed again only
+                 after the URIs of the service were changed. The type and the providers
+                 of the service are not part of the digest.
+
+        :rtype: int
+        '''
+        if self._digest is None:
+            self._digest = hash((self.__name, self.__uri, self.__org_masteruri, self.__local, self.__local_master))
+        return self._digest
+
 
 class MasterInfo(object):
     '''
@@ -650,7 +823,10 @@ class MasterInfo(object):
         self.__timestamp = 0
         self.__timestamp_local = 0
         self.check_ts = 0
-        '''the last time, when the state of the ROS master retrieved'''
+        '''the last time, when the state of the ROS master retrieved. The state published by
+        :mod:`fkie_master_discovery.master_monitor.MasterMonitor` is shared by all readers and not
+        changed after it was published, so its ``check_ts`` is the time of the last check with
+        changes, not of the last check.'''
 
     @staticmethod
     def from_list(l):
@@ -670,49 +846,78 @@ class MasterInfo(object):
         result = MasterInfo(l[2], l[3])
         result.timestamp = float(l[0])
         result.timestamp_local = float(l[1])
-        publishers = l[4]
-        subscribers = l[5]
-        services = l[6]
-        topicTypes = l[7]
-        nodes = l[8]
-        serviceProvider = l[9]
+        # fill the dictionaries directly, the lists of each node are collected first
+        masteruri = result.masteruri
+        nodelist = result.__nodelist
+        topiclist = result.__topiclist
+        servicelist = result.__servicelist
+        node_refs = {}  # {node name: ([published topics], [subscribed topics], [services])}
+
+        def get_refs(name):
+            try:
+                return node_refs[name]
+            except KeyError:
+                name = intern_name(name)
+                if name not in nodelist:
+                    nodelist[name] = NodeInfo(name, masteruri)
+                refs = node_refs[name] = ([], [], [])
+                return refs
+
+        def get_topic(name):
+            try:
+                return topiclist[name]
+            except KeyError:
+                topic = TopicInfo(name)
+                topiclist[topic.name] = topic
+                return topic
+
+        def get_service(name):
+            try:
+                return servicelist[name]
+            except KeyError:
+                service = ServiceInfo(name, masteruri)
+                servicelist[service.name] = service
+                return service
         # set the publishers
-        for pub, nodelist in publishers:
-            result.topics = pub
-            for n in nodelist:
-                result.nodes = n
-                result.getNode(n).publishedTopics = pub
-                result.getTopic(pub).publisherNodes = n
+        for pub, nodes in l[4]:
+            topic = get_topic(pub)
+            topic._publisherNodes = _unique_names(topic._publisherNodes + list(nodes))
+            topic._publisherNodesIndex = None
+            for n in topic._publisherNodes:
+                get_refs(n)[0].append(topic.name)
         # set the subscribers
-        for sub, nodelist in subscribers:
-            result.topics = sub
-            for n in nodelist:
-                result.nodes = n
-                result.getNode(n).subscribedTopics = sub
-                result.getTopic(sub).subscriberNodes = n
+        for sub, nodes in l[5]:
+            topic = get_topic(sub)
+            topic._subscriberNodes = _unique_names(topic._subscriberNodes + list(nodes))
+            topic._subscriberNodesIndex = None
+            for n in topic._subscriberNodes:
+                get_refs(n)[1].append(topic.name)
         # set the services
-        for s, provider in services:
-            result.services = s
-            for n in provider:
-                result.nodes = n
-                result.getNode(n).services = s
-                result.getService(s).serviceProvider = n
+        for srv, provider in l[6]:
+            service = get_service(srv)
+            service._serviceProvider = _unique_names(service._serviceProvider + list(provider))
+            service._serviceProviderIndex = None
+            for n in service._serviceProvider:
+                get_refs(n)[2].append(service.name)
+        for name, (pubs, subs, srvs) in node_refs.items():
+            node = nodelist[name]
+            node._publishedTopics = _unique_names(pubs)
+            node._subscribedTopics = _unique_names(subs)
+            node._services = _unique_names(srvs)
         # set the topic types
-        for topic, ttype in topicTypes:
-            result.topics = topic
-            result.getTopic(topic).type = ttype
+        for topic, ttype in l[7]:
+            get_topic(topic).type = ttype
         # set the node informations
-        for nodename, uri, masteruri, pid, _local in nodes:
-            result.nodes = nodename
-            result.getNode(nodename).uri = uri
-            result.getNode(nodename).masteruri = masteruri
-            result.getNode(nodename).pid = pid
+        for nodename, uri, org_masteruri, pid, _local in l[8]:
+            get_refs(nodename)
+            node = nodelist[nodename]
+            node._set_uris(uri, org_masteruri)
+            node.pid = pid
         # set the service informations
-        for servicename, uri, masteruri, stype, _local in serviceProvider:
-            result.services = servicename
-            result.getService(servicename).uri = uri
-            result.getService(servicename).masteruri = masteruri
-            result.getService(servicename).type = stype
+        for servicename, uri, org_masteruri, stype, _local in l[9]:
+            service = get_service(servicename)
+            service._set_uris(uri, org_masteruri)
+            service.type = stype
         return result
 
     @property
@@ -972,10 +1177,48 @@ class MasterInfo(object):
             return None
         return self.__servicelist.get(name, None)
 
+    def digest(self):
+        '''
+        Returns the structural digest of this master state. It combines the digests of
+        all nodes and services and the names of all topics. The digests of nodes and
+        services are cached by these objects, so only the changed items are hashed
+        again. Equal digests are treated as equal states (hash collision possible).
+        The digest is only valid inside of the current process.
+
+        :rtype: int
+        '''
+        return self._digest(False)
+
+    def local_digest(self):
+        '''
+        Returns the structural digest of all nodes and services, which are running on
+        the host of the ROS master or which are registered on this ROS master.
+        See :mod:`fkie_master_discovery.master_info.MasterInfo.digest()`.
+
+        :rtype: int
+        '''
+        return self._digest(True)
+
+    def _digest(self, local_only):
+        # the sum does not depend on the order of the items
+        result = hash(self.__masteruri)
+        for node in self.__nodelist.values():
+            if not local_only or node.isLocal or node.isLocalMaster:
+                result += node.digest()
+        for service in self.__servicelist.values():
+            if not local_only or service.isLocal or service.isLocalMaster:
+                result += service.digest()
+        if not local_only:
+            for name in self.__topiclist:
+                result += hash(name)
+        return result & DIGEST_MASK
+
     def __eq__(self, other):
         '''
         Compares the master state with other master state. The timestamp will not be
-        compared.
+        compared. The items are compared only if the digests of the master states differ.
+        Since the type and the providers of services are not part of the digest, a change
+        of only these fields is not detected.
 
         :param other: the another MasterInfo instance.
 
@@ -993,6 +1236,8 @@ class MasterInfo(object):
             return False
         if (self.masteruri != other.masteruri):
             return False
+        if self.digest() == other.digest():
+            return True
         if (set(self.node_uris) ^ set(other.node_uris)):
             return False
 #    if (set(self.node_names) ^ set(other.node_names)):
@@ -1029,7 +1274,8 @@ class MasterInfo(object):
     def has_local_changes(self, other):
         '''
         Compares the master state with other master state. The timestamp will not be
-        compared.
+        compared. The items are compared only if the local digests of the master states differ.
+        A change of only the type or the providers of a service is not detected.
 
         :param other: the another ``MasterInfo`` instance.
 
@@ -1047,6 +1293,8 @@ class MasterInfo(object):
             return True
         if (self.masteruri != other.masteruri):
             return True
+        if self.local_digest() == other.local_digest():
+            return False
         # test for nodes
         node_names = list((set(self.node_names) | set(other.node_names)))
         for name in node_names:
@@ -1144,9 +1392,62 @@ class MasterInfo(object):
                  ``[ [str,str,str,int,str] ]``,
                  ``[ [str,str,str,str,str] ])``
         '''
+        # without filter the test of each node is skipped, the empty filter ignores nothing
+        return self._listed_state(filter_interface, self.topics.items(), self.services.items())
+
+    def listedStateDelta(self, nodes, topics, services, filter_interface=None):
+        '''
+        Returns a extended ROS Master State which contains only the given nodes,
+        topics and services. The nodes referenced by the returned topics and
+        services are added, too.
+
+        :param nodes: the names of changed nodes.
+
+        :type nodes: set of strings
+
+        :param topics: the names of changed topics.
+
+        :type topics: set of strings
+
+        :param services: the names of changed services.
+
+        :type services: set of strings
+
+        :param filter_interface: The filter used to filter the nodes, topics or serivces out.
+
+        :type filter_interface: FilterInterface
+
+        :return: ROS Master State in the same format as returned by
+                 :mod:`fkie_master_discovery.master_info.MasterInfo.listedState()`
+        '''
         iffilter = filter_interface
+        topic_items = [(name, self.__topiclist[name]) for name in topics if name in self.__topiclist]
+        service_items = [(name, self.__servicelist[name]) for name in services if name in self.__servicelist]
+        # changed nodes are only listed, if they are referenced by not filtered topics or services
+        changed_nodes = set()
+        for name in nodes:
+            node = self.__nodelist.get(name, None)
+            if node is not None and self._is_listed_node(node, iffilter):
+                changed_nodes.add(name)
+        return self._listed_state(iffilter, topic_items, service_items, changed_nodes)
+
+    def _is_listed_node(self, node, iffilter):
         if iffilter is None:
-            iffilter = FilterInterface.from_list()
+            return bool(node.publishedTopics or node.subscribedTopics or node.services)
+        for topic in node.publishedTopics:
+            ttype = self.__topiclist[topic].type if topic in self.__topiclist else None
+            if not iffilter.is_ignored_publisher(node.name, topic, ttype):
+                return True
+        for topic in node.subscribedTopics:
+            ttype = self.__topiclist[topic].type if topic in self.__topiclist else None
+            if not iffilter.is_ignored_subscriber(node.name, topic, ttype):
+                return True
+        for service in node.services:
+            if not iffilter.is_ignored_service(node.name, service):
+                return True
+        return False
+
+    def _listed_state(self, iffilter, topic_items, service_items, nodes_to_add=None):
         stamp = '%.9f' % self.timestamp
         stamp_local = '%.9f' % self.timestamp_local
         publishers = []
@@ -1155,46 +1456,153 @@ class MasterInfo(object):
         topicTypes = []
         nodes = []
         serviceProvider = []
-        added_nodes = []
-        nodes_last_check = set()
+        nodes_last_check = set(nodes_to_add) if nodes_to_add is not None else set()
 
         # filter the topics
-        for name, topic in self.topics.items():
-            pn = []
-            for n in topic.publisherNodes:
-                if not iffilter.is_ignored_publisher(n, name, topic.type):
-                    pn.append(n)
-                    nodes_last_check.add(n)
+        for name, topic in topic_items:
+            if iffilter is None:
+                pn = list(topic._publisherNodes)
+                sn = list(topic._subscriberNodes)
+                nodes_last_check.update(pn)
+                nodes_last_check.update(sn)
+            else:
+                pn = []
+                for n in topic._publisherNodes:
+                    if not iffilter.is_ignored_publisher(n, name, topic.type):
+                        pn.append(n)
+                        nodes_last_check.add(n)
+                sn = []
+                for n in topic._subscriberNodes:
+                    if not iffilter.is_ignored_subscriber(n, name, topic.type):
+                        sn.append(n)
+                        nodes_last_check.add(n)
             if pn:
                 publishers.append((name, pn))
-            sn = []
-            for n in topic.subscriberNodes:
-                if not iffilter.is_ignored_subscriber(n, name, topic.type):
-                    sn.append(n)
-                    nodes_last_check.add(n)
             if sn:
                 subscribers.append((name, sn))
             if pn or sn:
                 topicTypes.append((name, topic.type))
 
         # filter the services
-        for name, service in self.services.items():
-            srv_prov = []
-            for sp in service.serviceProvider:
-                if not iffilter.is_ignored_service(sp, name):
-                    srv_prov.append(sp)
-                    nodes_last_check.add(sp)
+        for name, service in service_items:
+            if iffilter is None:
+                srv_prov = list(service.serviceProvider)
+                nodes_last_check.update(srv_prov)
+            else:
+                srv_prov = []
+                for sp in service.serviceProvider:
+                    if not iffilter.is_ignored_service(sp, name):
+                        srv_prov.append(sp)
+                        nodes_last_check.add(sp)
             if srv_prov:
                 services.append((name, srv_prov))
                 serviceProvider.append((name, service.uri, str(service.masteruri), service.type if service.type is not None else '', 'local' if service.isLocal else 'remote'))
 
         # creates the nodes list
-        for name, node in self.nodes.items():
+        if nodes_to_add is None:
+            node_items = self.__nodelist.items()
+        else:
+            node_items = [(name, self.__nodelist[name]) for name in nodes_last_check if name in self.__nodelist]
+        for name, node in node_items:
             if name in nodes_last_check:
                 nodes.append((name, node.uri, str(node.masteruri), node.pid, 'local' if node.isLocal else 'remote'))
 
         return (stamp, stamp_local, self.masteruri, self.mastername, publishers, subscribers, services, topicTypes, nodes, serviceProvider)
 
+    def changed_names(self, other):
+        '''
+        Compares this master state with other master state and returns the names
+        of all nodes, topics and services, which are listed in
+        :mod:`fkie_master_discovery.master_info.MasterInfo.listedState()`
+        with other values, are added or removed.
+
+        :param other: the previous ``MasterInfo`` instance.
+
+        :type other: :mod:`fkie_master_discovery.master_info.MasterInfo` or ``None``
+
+        :return: a tuple with sets of changed names (nodes, topics, services)
+
+        :rtype: (set(str), set(str), set(str))
+        '''
+        if other is None:
+            return (set(self.__nodelist.keys()), set(self.__topiclist.keys()), set(self.__servicelist.keys()))
+        nodes = set(self.__nodelist.keys()) ^ set(other.nodes.keys())
+        for name, n1 in self.__nodelist.items():
+            n2 = other.nodes.get(name, None)
+            if n2 is not None:
+                if n1.uri != n2.uri or n1.masteruri != n2.masteruri or n1.pid != n2.pid or n1.isLocal != n2.isLocal:
+                    nodes.add(name)
+        topics = set(self.__topiclist.keys()) ^ set(other.topics.keys())
+        for name, t1 in self.__topiclist.items():
+            t2 = other.topics.get(name, None)
+            if t2 is not None:
+                if t1.type != t2.type or set(t1._publisherNodes) ^ set(t2._publisherNodes) or set(t1._subscriberNodes) ^ set(t2._subscriberNodes):
+                    topics.add(name)
+        services = set(self.__servicelist.keys()) ^ set(other.services.keys())
+        for name, s1 in self.__servicelist.items():
+            s2 = other.services.get(name, None)
+            if s2 is not None:
+                if s1.uri != s2.uri or s1.masteruri != s2.masteruri or s1.type != s2.type or s1.isLocal != s2.isLocal:
+                    services.add(name)
+                elif set(s1.serviceProvider) ^ set(s2.serviceProvider):
+                    services.add(name)
+        return (nodes, topics, services)
+
+    @staticmethod
+    def merge_listed_state(state, delta, nodes, topics, services):
+        '''
+        Applies the changes returned by ``masterInfoDelta()`` RPC method to a
+        state returned by :mod:`fkie_master_discovery.master_info.MasterInfo.listedState()`.
+
+        :param state: the last known listed state.
+
+        :type state: tuple
+
+        :param delta: the listed state with changed entries only.
+
+        :type delta: tuple
+
+        :param nodes: the names of changed or removed nodes. The entries for these nodes
+                      are removed from ``state`` before the entries of ``delta`` are added.
+
+        :type nodes: list of strings
+
+        :param topics: the names of changed or removed topics.
+
+        :type topics: list of strings
+
+        :param services: the names of changed or removed services.
+
+        :type services: list of strings
+
+        :return: the new listed state
+
+        :rtype: tuple, see :mod:`fkie_master_discovery.master_info.MasterInfo.listedState()`
+        '''
+        nodes = set(nodes)
+        topics = set(topics)
+        services = set(services)
+        publishers = dict((name, pn) for name, pn in state[4] if name not in topics)
+        publishers.update((name, pn) for name, pn in delta[4])
+        subscribers = dict((name, sn) for name, sn in state[5] if name not in topics)
+        subscribers.update((name, sn) for name, sn in delta[5])
+        srvs = dict((name, sp) for name, sp in state[6] if name not in services)
+        srvs.update((name, sp) for name, sp in delta[6])
+        topic_types = dict((name, ttype) for name, ttype in state[7] if name not in topics)
+        topic_types.update((name, ttype) for name, ttype in delta[7])
+        node_infos = dict((entry[0], entry) for entry in state[8] if entry[0] not in nodes)
+        node_infos.update((entry[0], entry) for entry in delta[8])
+        service_infos = dict((entry[0], entry) for entry in state[9] if entry[0] not in services)
+        service_infos.update((entry[0], entry) for entry in delta[9])
+        # remove nodes which are no longer referenced by topics or services
+        referenced = set()
+        for node_list in list(publishers.values()) + list(subscribers.values()) + list(srvs.values()):
+            referenced.update(node_list)
+        node_list = [entry for name, entry in node_infos.items() if name in referenced]
+        return (delta[0], delta[1], delta[2], delta[3],
+                list(publishers.items()), list(subscribers.items()), list(srvs.items()),
+                list(topic_types.items()), node_list, list(service_infos.values()))
+
 #  def __str__(self):
 #    return str(self.listedState())
 
@@ -1236,10 +1644,10 @@ class MasterInfo(object):
                     own_topic.type = other_topic.type
                 if set(own_topic._publisherNodes) ^ set(other_topic.publisherNodes):
                     topics_changed.add(t)
-                    own_topic._publisherNodes = other_topic.publisherNodes
+                    own_topic.publisherNodes = other_topic.publisherNodes
                 if set(own_topic._subscriberNodes) ^ set(other_topic.subscriberNodes):
                     topics_changed.add(t)
-                    own_topic._subscriberNodes = other_topic.subscriberNodes
+                    own_topic.subscriberNodes = other_topic.subscriberNodes
             topics_added = other_topics_set - own_topics_set
             for t in topics_added:
                 self.__topiclist[t] = other.__topiclist[t]
@@ -1287,13 +1695,13 @@ class MasterInfo(object):
                     # update subscriptions of nodes
                     if set(own_node._publishedTopics) ^ set(other_node.publishedTopics):
                         nodes_changed.add(n)
-                        own_node._publishedTopics = other_node.publishedTopics
+                        own_node.publishedTopics = list(other_node.publishedTopics)
                     if set(own_node._subscribedTopics) ^ set(other_node.subscribedTopics):
                         nodes_changed.add(n)
-                        own_node._subscribedTopics = other_node.subscribedTopics
+                        own_node.subscribedTopics = list(other_node.subscribedTopics)
                     if set(own_node._services) ^ set(other_node.services):
                         nodes_changed.add(n)
-                        own_node._services = other_node.services
+                        own_node.services = list(other_node.services)
         # add new nodes
         nodes_added = set()
         if local_info:
@@ -1346,6 +1754,7 @@ class MasterInfo(object):
                     if set(own_srv._serviceProvider) ^ set(other_srv.serviceProvider):
                         services_changed.add(s)
                         own_srv._serviceProvider = other_srv.serviceProvider
+                        own_srv._serviceProviderIndex = None
         # add new services
         srvs_added = set()
         if local_info:
@@ -41,10 +41,10 @@ try:
     from urlparse import urlparse  # python 2 compatibility
 except ImportError:
     from urllib.parse import urlparse
+from collections import deque
 from datetime import datetime
 import getpass
 import roslib.network
-import roslib.message
 import rospy
 import socket
 import subprocess
@@ -58,11 +58,14 @@ except ImportError:
     import xmlrpc.client as xmlrpcclient
 
 from . import interface_finder
+from .binary_state import encode_state_delta
 
 from .common import masteruri_from_ros, get_hostname
-from .common import gen_pattern
+from .common import gen_pattern, get_message_md5sum, get_ros_param, TimeoutTransport
 from .filter_interface import FilterInterface
 from .master_info import MasterInfo
+from .state_subscription import StateSubscriptionServer
+from .worker_pool import WorkerPool
 
 
 try:  # to avoid the problems with autodoc on ros.org/wiki site
@@ -86,6 +89,26 @@ def _succeed(args):
     return val
 
 
+class _StateSnapshot(object):
+    '''
+    The published ROS master state with its version and the journal of the changes.
+    A snapshot will not be changed after it was published, the monitor replaces the
+    whole snapshot on each change. So the RPC methods read the state without locks.
+    Only the listed states are created on demand and cached in the snapshot.
+    '''
+
+    __slots__ = ('master_state', 'version', 'journal_base', 'journal', 'listed_states')
+
+    def __init__(self, master_state=None, version=0, journal_base=0, journal=()):
+        self.master_state = master_state
+        self.version = version
+        self.journal_base = journal_base
+        # tuple of (version, (changed nodes, changed topics, changed services))
+        self.journal = journal
+        # listed states of the master state: {filter fingerprint: listed state}
+        self.listed_states = {}
+
+
 class RPCThreading(ThreadingMixIn, SimpleXMLRPCServer):
     # When inheriting from ThreadingMixIn for threaded connection behavior, you should explicitly
     # declare how you want your threads to behave on an abrupt shutdown. The ThreadingMixIn class
@@ -135,14 +158,30 @@ class MasterMonitor(object):
           :mod:`fkie_master_discovery.master_monitor.MasterMonitor.updateState()`
 
     :RPC Methods:
-        :mod:`fkie_master_discovery.master_monitor.MasterMonitor.getListedMasterInfo()` or
+        :mod:`fkie_master_discovery.master_monitor.MasterMonitor.getListedMasterInfo()`,
+        :mod:`fkie_master_discovery.master_monitor.MasterMonitor.getListedMasterInfoDelta()`,
+        :mod:`fkie_master_discovery.master_monitor.MasterMonitor.getListedMasterInfoBinary()` or
         :mod:`fkie_master_discovery.master_monitor.MasterMonitor.getMasterContacts()` as RPC:
-        ``masterInfo()`` and ``masterContacts()``
+        ``masterInfo()``, ``masterInfoDelta()``, ``masterInfoBinary()`` and ``masterContacts()``
+    - the changes of the ROS master state are pushed to the subscribers connected to the port
+      returned by ``masterStateSubscription()``, see :mod:`fkie_master_discovery.state_subscription`
     '''
 
     MAX_PING_SEC = 10.0
     ''' The time to update the node URI, ID or service URI (Default: ``10.0``)'''
 
+    PROBE_THREADS = 10
+    ''' The count of threads used to get the PID of the nodes and the type of the
+    services in parallel. It can be changed by ``~probe_threads`` parameter. (Default: ``10``)'''
+
+    MAX_JOURNAL_SIZE = 100
+    ''' The count of state changes stored to answer the ``masterInfoDelta()`` requests.
+    Older versions get the complete state. (Default: ``100``)'''
+
+    MAX_LISTED_STATE_CACHE = 64
+    ''' The count of different filters, for which the listed state of the current
+    ROS master state is cached. (Default: ``64``)'''
+
     INTERVAL_UPDATE_LAUNCH_URIS = 15.0
 
     def __init__(self, rpcport=11611, do_retry=True, ipv6=False, rpc_addr=''):
@@ -162,7 +201,6 @@ class MasterMonitor(object):
 
         :type ipv6: bool
         '''
-        self._state_access_lock = threading.RLock()
         self._create_access_lock = threading.RLock()
         self._lock = threading.RLock()
         self.__masteruri = masteruri_from_ros()
@@ -171,14 +209,30 @@ class MasterMonitor(object):
         self.__mastername = None
         self.__cached_nodes = dict()
         self.__cached_services = dict()
+        # the last replies of getTopicTypes() and getSystemState() used to create the master state
+        self.__last_master_reply = None
+        self.__last_full_update_ts = 0
+        self.__last_check_ts = 0
+        self.PROBE_THREADS = rospy.get_param('~probe_threads', MasterMonitor.PROBE_THREADS)
+        self._probe_pool = WorkerPool(self.PROBE_THREADS, 'probe')
         self.ros_node_name = str(rospy.get_name())
         if rospy.has_param('~name'):
             self.__mastername = rospy.get_param('~name')
         self.__mastername = self.getMastername()
         rospy.set_param('/mastername', self.__mastername)
 
-        self.__master_state = None
-        '''the current state of the ROS master'''
+        self.__snapshot = _StateSnapshot()
+        '''the current state of the ROS master, replaced on each change'''
+        # journal with names of changed nodes, topics and services for each state version
+        self.__journal_id = '%.6f' % time.time()
+        self.__journal = deque(maxlen=self.MAX_JOURNAL_SIZE)
+        # filter objects with cached results: {filter fingerprint: FilterInterface}
+        self.__filter_cache = {}
+        # the value of the `do_not_sync` parameter read by the cached filters
+        self.__do_not_sync = None
+        # notifies the subscribers about the new state version
+        self.__state_changed = threading.Condition()
+        self._subscription_server = None
         self.rpcport = rpcport
         '''the port number of the RPC server'''
 
@@ -198,16 +252,25 @@ class MasterMonitor(object):
                 self.rpcServer.register_introspection_functions()
                 self.rpcServer.register_function(self.getListedMasterInfo, 'masterInfo')
                 self.rpcServer.register_function(self.getListedMasterInfoFiltered, 'masterInfoFiltered')
+                self.rpcServer.register_function(self.getListedMasterInfoDelta, 'masterInfoDelta')
+                self.rpcServer.register_function(self.getListedMasterInfoBinary, 'masterInfoBinary')
                 self.rpcServer.register_function(self.getMasterContacts, 'masterContacts')
                 self.rpcServer.register_function(self.getMasterErrors, 'masterErrors')
                 self.rpcServer.register_function(self.getCurrentTime, 'getCurrentTime')
                 self.rpcServer.register_function(self.setTime, 'setTime')
                 self.rpcServer.register_function(self.getTopicsMd5sum, 'getTopicsMd5sum')
                 self.rpcServer.register_function(self.getUser, 'getUser')
+                self.rpcServer.register_function(self.getStateSubscriptionPort, 'masterStateSubscription')
                 self._rpcThread = threading.Thread(target=self.rpcServer.serve_forever)
                 self._rpcThread.setDaemon(True)
                 self._rpcThread.start()
                 self.ready = True
+                try:
+                    self._subscription_server = StateSubscriptionServer((rpc_addr, 0), self, ipv6)
+                    self._subscription_server.start()
+                    rospy.loginfo("Start state subscription server at %s", self._subscription_server.server_address)
+                except Exception as err:
+                    rospy.logwarn("Error while start state subscription server, only polling is available: %s" % err)
             except socket.error as e:
                 if not do_retry:
                     raise Exception("Error while start RPC-XML server on port %d: %s\nIs a Node Manager already running?" % (rpcport, e))
@@ -268,6 +331,12 @@ class MasterMonitor(object):
                     self._master.unsubscribeParam(self.ros_node_name, rospy.get_node_uri(), '/roslaunch/uris')
                 except Exception as e:
                     rospy.logwarn("Error while unsubscribe from `/roslaunch/uris`: %s" % e)
+            if self._subscription_server is not None:
+                self._subscription_server.stop()
+                self._subscription_server = None
+                with self.__state_changed:
+                    self.__state_changed.notify_all()
+            self._probe_pool.shutdown()
             rospy.loginfo("shutdown own RPC server")
             self.rpcServer.shutdown()
             del self.rpcServer.socket
@@ -301,10 +370,14 @@ class MasterMonitor(object):
                     self._timer_update_launch_uris = threading.Timer(self.INTERVAL_UPDATE_LAUNCH_URIS, self._update_launch_uris)
                     self._timer_update_launch_uris.start()
 
-    def _getNodePid(self, nodes):
+    def _getNodePid(self, master_state, nodename, uri):
         '''
-        Gets process id of the node.
-        This method blocks until the info is retrieved or socket timeout is reached (0.7 seconds).
+        Gets process id of the node and stores it in given master state.
+        This method blocks until the info is retrieved or timeout is reached (0.7 seconds).
+
+        :param master_state: the master state to update
+
+        :type master_state: :mod:`fkie_master_discovery.master_info.MasterInfo`
 
         :param nodename: the name of the node
 
@@ -314,42 +387,49 @@ class MasterMonitor(object):
 
         :type uri: str
         '''
-        for (nodename, uri) in nodes.items():
-            if uri is not None:
-                pid = None
+        if uri is None:
+            return
+        with self._lock:
+            if nodename in self.__cached_nodes:
+                if time.time() - self.__cached_nodes[nodename][2] < self.MAX_PING_SEC:
+                    return
+        pid = None
+        try:
+            node = xmlrpcclient.ServerProxy(uri, transport=TimeoutTransport(0.7))
+            pid = _succeed(node.getPid(self.ros_node_name))
+        except (Exception, socket.error) as e:
+            with self._lock:
+                self._limited_log(nodename, "can't get PID: %s" % str(e), level=rospy.DEBUG)
+            try:
+                master = xmlrpcclient.ServerProxy(self.getMasteruri(), transport=TimeoutTransport(5))
+                code, message, new_uri = master.lookupNode(self.ros_node_name, nodename)
+            except (Exception, socket.error) as err:
+                code, message, new_uri = -1, str(err), None
+            with self._lock:
+                node_info = master_state.getNode(nodename)
+                if node_info is not None:
+                    node_info.uri = None if (code == -1) else new_uri
+                if code == -1:
+                    self._limited_log(nodename, "can't update contact information. ROS master responds with: %s" % message)
                 try:
-                    with self._lock:
-                        if nodename in self.__cached_nodes:
-                            if time.time() - self.__cached_nodes[nodename][2] < self.MAX_PING_SEC:
-                                return
-                    socket.setdefaulttimeout(0.7)
-                    node = xmlrpcclient.ServerProxy(uri)
-                    pid = _succeed(node.getPid(self.ros_node_name))
-                except (Exception, socket.error) as e:
-                    with self._lock:
-                        self._limited_log(nodename, "can't get PID: %s" % str(e), level=rospy.DEBUG)
-                    master = xmlrpcclient.ServerProxy(self.getMasteruri())
-                    code, message, new_uri = master.lookupNode(self.ros_node_name, nodename)
-                    with self._lock:
-                        self.__new_master_state.getNode(nodename).uri = None if (code == -1) else new_uri
-                        if code == -1:
-                            self._limited_log(nodename, "can't update contact information. ROS master responds with: %s" % message)
-                        try:
-                            del self.__cached_nodes[nodename]
-                        except:
-                            pass
-                else:
-                    with self._lock:
-                        self.__new_master_state.getNode(nodename).pid = pid
-                        self.__cached_nodes[nodename] = (uri, pid, time.time())
-#          print "_getNodePid _lock RET", threading.current_thread()
-                finally:
-                    socket.setdefaulttimeout(None)
+                    del self.__cached_nodes[nodename]
+                except:
+                    pass
+        else:
+            with self._lock:
+                node_info = master_state.getNode(nodename)
+                if node_info is not None:
+                    node_info.pid = pid
+                self.__cached_nodes[nodename] = (uri, pid, time.time())
 
-    def _getServiceInfo(self, services):
+    def _getServiceInfo(self, master_state, service, uri):
         '''
-        Gets service info through the RPC interface of the service.
-        This method blocks until the info is retrieved or socket timeout is reached (0.5 seconds).
+        Gets service info through the RPC interface of the service and stores it in given master state.
+        This method blocks until the info is retrieved or timeout is reached (0.5 seconds).
+
+        :param master_state: the master state to update
+
+        :type master_state: :mod:`fkie_master_discovery.master_info.MasterInfo`
 
         :param service: the name of the service
 
@@ -359,50 +439,51 @@ class MasterMonitor(object):
 
         :type uri: str
         '''
-        for (service, uri) in services.items():
+        with self._lock:
+            if service in self.__cached_services:
+                if time.time() - self.__cached_services[service][2] < self.MAX_PING_SEC:
+                    return
+        if uri is None:
+            return
+        dest_addr = dest_port = None
+        try:
+            dest_addr, dest_port = rospy.parse_rosrpc_uri(uri)
+        except:
+            return
+#      raise ROSServiceException("service [%s] has an invalid RPC URI [%s]"%(service, uri))
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            # connect to service and probe it to get the headers
+            s.settimeout(0.5)
+            s.connect((dest_addr, dest_port))
+            header = {'probe': '1', 'md5sum': '*',
+                      'callerid': self.ros_node_name, 'service': service}
+            roslib.network.write_ros_handshake_header(s, header)
+            buf = io.StringIO() if sys.version_info < (3, 0) else io.BytesIO()
+            stype = roslib.network.read_ros_handshake_header(s, buf, 2048)
+            with self._lock:
+                service_info = master_state.getService(service)
+                if service_info is not None:
+                    service_info.type = stype['type']
+                self.__cached_services[service] = (uri, stype['type'], time.time())
+        except socket.error:
             with self._lock:
-                if service in self.__cached_services:
-                    if time.time() - self.__cached_services[service][2] < self.MAX_PING_SEC:
-                        return
-            if uri is not None:
-                dest_addr = dest_port = None
                 try:
-                    dest_addr, dest_port = rospy.parse_rosrpc_uri(uri)
+                    del self.__cached_services[service]
                 except:
-                    continue
-        #      raise ROSServiceException("service [%s] has an invalid RPC URI [%s]"%(service, uri))
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    pass
+#      raise ROSServiceIOException("Unable to communicate with service [%s], address [%s]"%(service, uri))
+        except:
+            with self._lock:
+                self._limited_log(service, "can't get service type: %s" % traceback.format_exc(), level=rospy.DEBUG)
+            with self._lock:
                 try:
-                    # connect to service and probe it to get the headers
-                    s.settimeout(0.5)
-                    s.connect((dest_addr, dest_port))
-                    header = {'probe': '1', 'md5sum': '*',
-                              'callerid': self.ros_node_name, 'service': service}
-                    roslib.network.write_ros_handshake_header(s, header)
-                    buf = io.StringIO() if sys.version_info < (3, 0) else io.BytesIO()
-                    stype = roslib.network.read_ros_handshake_header(s, buf, 2048)
-                    with self._lock:
-                        self.__new_master_state.getService(service).type = stype['type']
-                        self.__cached_services[service] = (uri, stype['type'], time.time())
-                except socket.error:
-                    with self._lock:
-                        try:
-                            del self.__cached_services[service]
-                        except:
-                            pass
-        #      raise ROSServiceIOException("Unable to communicate with service [%s], address [%s]"%(service, uri))
+                    del self.__cached_services[service]
                 except:
-                    with self._lock:
-                        self._limited_log(service, "can't get service type: %s" % traceback.format_exc(), level=rospy.DEBUG)
-                    with self._lock:
-                        try:
-                            del self.__cached_services[service]
-                        except:
-                            pass
                     pass
-                finally:
-                    if s is not None:
-                        s.close()
+        finally:
+            if s is not None:
+                s.close()
 
     def getListedMasterInfo(self):
         '''
@@ -412,10 +493,10 @@ class MasterMonitor(object):
         '''
         t = str(time.time())
         result = (t, t, self.getMasteruri(), str(self.getMastername()), [], [], [], [], [], [])
-        if not (self.__master_state is None):
+        snapshot = self.__snapshot
+        if snapshot.master_state is not None:
             try:
-                with self._state_access_lock:
-                    result = self.__master_state.listedState()
+                result = self._get_listed_state(snapshot, None)
             except:
                 print(traceback.format_exc())
         return result
@@ -428,24 +509,198 @@ class MasterMonitor(object):
         '''
         t = str(time.time())
         result = (t, t, self.getMasteruri(), str(self.getMastername()), [], [], [], [], [], [])
-        if not (self.__master_state is None):
+        snapshot = self.__snapshot
+        if snapshot.master_state is not None:
+            try:
+                result = self._get_listed_state(snapshot, filter_list)
+            except:
+                print(traceback.format_exc())
+        return result
+
+    def getListedMasterInfoDelta(self, since_version, filter_list=None):
+        '''
+        The RPC method called by XML-RPC server to request only the changes of the
+        ROS Master State since given version. If the version is not known or too old,
+        the complete state is returned.
+
+        :param since_version: the version returned by the last call of this method
+                              or an empty string to get the complete state.
+
+        :type since_version: str
+
+        :param filter_list: the filter as returned by
+                            :mod:`fkie_master_discovery.filter_interface.FilterInterface.to_list()`.
+                            Each change of the filter requires a complete state.
+
+        :type filter_list: list or ``None``
+
+        :return: (``version``, ``complete``, ``state``, ``nodes``, ``topics``, ``services``)
+
+                   - ``version`` of the returned state, used for the next request
+
+                   - ``complete`` is ``True`` if ``state`` contains the complete state
+
+                   - ``state`` a listed state, see :mod:`fkie_master_discovery.master_info.MasterInfo.listedState()`.
+                     If ``complete`` is ``False`` it contains only changed nodes, topics and services.
+
+                   - ``nodes``, ``topics``, ``services``: names of changed or removed entries.
+                     Use :mod:`fkie_master_discovery.master_info.MasterInfo.merge_listed_state()`
+                     to apply the changes.
+
+        :rtype: (str, bool, tuple, [str], [str], [str])
+        '''
+        t = str(time.time())
+        result = ('', True, (t, t, self.getMasteruri(), str(self.getMastername()), [], [], [], [], [], []), [], [], [])
+        snapshot = self.__snapshot
+        if snapshot.master_state is not None:
             try:
-                with self._state_access_lock:
-                    fi = FilterInterface.from_list(filter_list)
-                    fi.set_hide_pattern(self._re_hide_nodes, self._re_hide_topics, self._re_hide_services)
-                    result = self.__master_state.listedState(fi)
+                version = '%s:%d' % (self.__journal_id, snapshot.version)
+                since = self._parse_state_version(since_version)
+                if since is None or since < snapshot.journal_base or since > snapshot.version:
+                    result = (version, True, self._get_listed_state(snapshot, filter_list), [], [], [])
+                else:
+                    fi = self._get_filter(filter_list)
+                    nodes = set()
+                    topics = set()
+                    services = set()
+                    for entry_version, (cnodes, ctopics, cservices) in snapshot.journal:
+                        if entry_version > since:
+                            nodes.update(cnodes)
+                            topics.update(ctopics)
+                            services.update(cservices)
+                    state = snapshot.master_state.listedStateDelta(nodes, topics, services, fi)
+                    result = (version, False, state, list(nodes), list(topics), list(services))
             except:
                 print(traceback.format_exc())
         return result
 
+    def getListedMasterInfoBinary(self, since_version, filter_list=None):
+        '''
+        The same as :mod:`fkie_master_discovery.master_monitor.MasterMonitor.getListedMasterInfoDelta()`,
+        but the result is encoded by :mod:`fkie_master_discovery.binary_state.encode_state_delta()`.
+        The XML-RPC response contains only one base64 value, which is much faster
+        to parse than the nested lists.
+
+        :return: the encoded state, use :mod:`fkie_master_discovery.binary_state.decode_state_delta()`
+                 to get the result of ``masterInfoDelta()``.
+
+        :rtype: ``xmlrpclib.Binary``
+        '''
+        return xmlrpcclient.Binary(encode_state_delta(self.getListedMasterInfoDelta(since_version, filter_list)))
+
+    def getStateSubscriptionPort(self):
+        '''
+        The RPC method called by XML-RPC server to get the port of the state subscription
+        server. The subscribers receive the changes as soon as they are detected,
+        see :mod:`fkie_master_discovery.state_subscription`.
+
+        :return: the port or ``0`` if the subscription server is not running.
+
+        :rtype: int
+        '''
+        if self._subscription_server is None:
+            return 0
+        return self._subscription_server.port
+
+    def wait_state_change(self, version, timeout):
+        '''
+        Blocks until the version of the master state differs from given version or
+        the timeout is reached.
+
+        :param version: the last known version number, ``None`` returns immediately
+
+        :type version: int or ``None``
+
+        :param timeout: the maximal time to wait in seconds
+
+        :type timeout: float
+
+        :return: the current version number
+
+        :rtype: int
+        '''
+        with self.__state_changed:
+            if version is not None and version == self.__snapshot.version:
+                self.__state_changed.wait(timeout)
+            return self.__snapshot.version
+
+    def _get_listed_state(self, snapshot, filter_list):
+        # returns the cached listed state of the snapshot for given filter. Concurrent
+        # readers can create the same listed state twice, but they do not block each other.
+        key = None if filter_list is None else tuple(filter_list)
+        try:
+            return snapshot.listed_states[key]
+        except KeyError:
+            pass
+        result = snapshot.master_state.listedState(self._get_filter(filter_list))
+        if len(snapshot.listed_states) >= self.MAX_LISTED_STATE_CACHE:
+            snapshot.listed_states.clear()
+        snapshot.listed_states[key] = result
+        return result
+
+    def _get_filter(self, filter_list):
+        # returns the filter object for given filter list.
+        # The filter objects are kept over state changes to reuse their cached results.
+        if filter_list is None:
+            return None
+        key = tuple(filter_list)
+        try:
+            return self.__filter_cache[key]
+        except KeyError:
+            pass
+        fi = FilterInterface.from_list(filter_list)
+        if fi is None:
+            # do not cache the failure, the request is answered with an error
+            raise ValueError("invalid filter list: %s" % str(filter_list))
+        fi.set_hide_pattern(self._re_hide_nodes, self._re_hide_topics, self._re_hide_services)
+        if len(self.__filter_cache) >= self.MAX_LISTED_STATE_CACHE:
+            self.__filter_cache.clear()
+        self.__filter_cache[key] = fi
+        return fi
+
+    def _check_do_not_sync(self):
+        # the filters read the `do_not_sync` parameter only on creation. If it was
+        # changed, the cached filters are replaced by new ones on next request.
+        do_not_sync = get_ros_param('do_not_sync', [])
+        if do_not_sync != self.__do_not_sync:
+            self.__do_not_sync = do_not_sync
+            self.__filter_cache.clear()
+
+    def _parse_state_version(self, version):
+        try:
+            journal_id, _, number = version.rpartition(':')
+            if journal_id == self.__journal_id:
+                return int(number)
+        except Exception:
+            pass
+        return None
+
+    def _publish_state(self, new_state):
+        # stores the names of changed nodes, topics and services for the new version and
+        # replaces the current snapshot, must be called with locked `_create_access_lock`
+        old = self.__snapshot
+        version = old.version + 1
+        journal_base = old.journal_base
+        if old.master_state is None:
+            self.__journal.clear()
+            journal_base = version
+        else:
+            if len(self.__journal) == self.__journal.maxlen:
+                # the oldest entry will be dropped
+                journal_base = self.__journal[0][0]
+            self.__journal.append((version, new_state.changed_names(old.master_state)))
+        snapshot = _StateSnapshot(new_state, version, journal_base, tuple(self.__journal))
+        with self.__state_changed:
+            self.__snapshot = snapshot
+            self.__state_changed.notify_all()
+
     def getCurrentState(self):
         '''
-        :return: The current ROS Master State
+        :return: The current ROS Master State. It must not be changed.
 
         :rtype: :mod:`fkie_master_discovery.master_info.MasterInfo` or ``None``
         '''
-        with self._state_access_lock:
-            return self.__master_state
+        return self.__snapshot.master_state
 
     def updateState(self, clear_cache=False):
         '''
@@ -461,28 +716,42 @@ class MasterMonitor(object):
         :rtype: :mod:`fkie_master_discovery.master_info.MasterInfo`
 
         :raise: ``MasterConnectionException``, if not complete information was get from the ROS master.
+
+        .. note:: If the replies of ``getTopicTypes()`` and ``getSystemState()`` are equal to the
+                  last replies, the last created state is returned without lookup of nodes and services.
+                  The state is created completely after :mod:`fkie_master_discovery.master_monitor.MasterMonitor.MAX_PING_SEC`
+                  to detect restarted nodes.
         '''
         with self._create_access_lock:
             now = time.time()
-            threads = []
+            self.__last_check_ts = now
+            probes = []
             try:
                 self._lock.acquire(True)
                 if clear_cache:
                     self.__cached_nodes = dict()
                     self.__cached_services = dict()
                 socket.setdefaulttimeout(5)
-                self.__new_master_state = master_state = MasterInfo(self.getMasteruri(), self.getMastername())
                 # update master state
                 master = self._master
                 # master = xmlrpclib.ServerProxy(self.getMasteruri())
                 # get topic types
                 code, message, topicTypes = master.getTopicTypes(self.ros_node_name)
+                # get system state
+                code, message, state = master.getSystemState(self.ros_node_name)
+                master_reply = (topicTypes, state)
+                if (not clear_cache and self.__new_master_state is not None and
+                        now - self.__last_full_update_ts < self.MAX_PING_SEC and
+                        master_reply == self.__last_master_reply):
+                    # nothing changed, skip the creation of a new master state
+                    return self.__new_master_state
+                self.__last_master_reply = master_reply
+                self.__last_full_update_ts = now
+                self.__new_master_state = master_state = MasterInfo(self.getMasteruri(), self.getMastername())
                 # convert topicType list to the dict
                 topicTypesDict = {}
                 for topic, type in topicTypes:
                     topicTypesDict[topic] = type
-                # get system state
-                code, message, state = master.getSystemState(self.ros_node_name)
 
                 # add published topics
                 for t, l in state[0]:
@@ -534,11 +803,11 @@ class MasterMonitor(object):
                             with self._lock:
                                 self._limited_log(service.name, "can't get contact information. ROS master responds with: %s" % msg)
                 except:
+                    self.__last_master_reply = None
                     traceback.print_exc()
                 if services:
-                    pidThread = threading.Thread(target=self._getServiceInfo, args=((services,)))
-                    pidThread.start()
-                    threads.append(pidThread)
+                    # get the type of the services
+                    probes.append(self._probe_pool.start_batch([(self._getServiceInfo, (master_state, name, uri)) for name, uri in services.items()]))
 
                 # get additional node information
                 nodes = dict()
@@ -568,16 +837,16 @@ class MasterMonitor(object):
                             with self._lock:
                                 self._limited_log(node.name, "can't get contact information. ROS master responds with: %s" % msg)
                 except:
+                    self.__last_master_reply = None
                     traceback.print_exc()
 
                 if nodes:
                     # get process id of the nodes
-                    pidThread = threading.Thread(target=self._getNodePid, args=((nodes,)))
-                    pidThread.start()
-                    threads.append(pidThread)
+                    probes.append(self._probe_pool.start_batch([(self._getNodePid, (master_state, name, uri)) for name, uri in nodes.items()]))
 
                 master_state.timestamp = now
             except socket.error as e:
+                self.__last_master_reply = None
                 if isinstance(e, tuple):
                     (errn, msg) = e
                     if errn not in [100, 101, 102]:
@@ -586,18 +855,16 @@ class MasterMonitor(object):
                 else:
                     raise MasterConnectionException(traceback.format_exc(1))
             except:
+                self.__last_master_reply = None
                 formatted_lines = traceback.format_exc().splitlines()
                 raise MasterConnectionException(formatted_lines[-1])
             finally:
                 self._lock.release()
                 socket.setdefaulttimeout(None)
 
-            # wait for all threads are finished
-            while threads:
-                th = threads.pop()
-                if th.is_alive():
-                    th.join()
-                del th
+            # wait for all probes are finished, each probe is limited by a timeout
+            for batch in probes:
+                batch.wait()
             if time.time() - self._last_clearup_ts > 300:
                 self._last_clearup_ts = time.time()
                 self._clearup_cached_logs()
@@ -734,9 +1001,9 @@ class MasterMonitor(object):
         :rtype: (str, str, str, str, str)
         '''
         t = 0
-        if self.__master_state is not None:
-            with self._state_access_lock:
-                t = self.__master_state.timestamp
+        master_state = self.__snapshot.master_state
+        if master_state is not None:
+            t = master_state.timestamp
         return ('%.9f' % t, str(self.getMasteruri()), str(self.getMastername()), self.ros_node_name, roslib.network.create_local_xmlrpc_uri(self.rpcport))
 
     def getMasterErrors(self):
@@ -789,11 +1056,11 @@ class MasterMonitor(object):
         '''
         topic_list = []
         for ttype in topic_types:
-            try:
-                entry = (ttype, roslib.message.get_message_class(ttype)._md5sum)
-                topic_list.append(entry)
-            except Exception as err:
-                rospy.logwarn(err)
+            md5sum = get_message_md5sum(ttype)
+            if md5sum is not None:
+                topic_list.append((ttype, md5sum))
+            else:
+                rospy.logwarn("Unknown message type: %s" % ttype)
         return topic_list
 
     def getUser(self):
@@ -825,29 +1092,30 @@ class MasterMonitor(object):
         s = self.updateState(clear_cache)
         with self._create_access_lock:
             do_update = False
-            with self._state_access_lock:
-                if s != self.__master_state:
-                    do_update = True
-                if self.__master_state is not None and s.timestamp < self.__master_state.timestamp:
-                    do_update = True
-                    result = True
-                    timejump_msg = "Timejump into past detected! Restart all ROS nodes, includes master_discovery, please!"
-                    rospy.logwarn(timejump_msg)
-                    if timejump_msg not in self._master_errors:
-                        self._master_errors.append(timejump_msg)
-                    self._exit_timer = threading.Timer(5.0, self._timejump_exit)
-                    self._exit_timer.start()
+            current = self.__snapshot.master_state
+            if s is not current and s != current:
+                do_update = True
+            if current is not None and s.timestamp < current.timestamp:
+                do_update = True
+                result = True
+                timejump_msg = "Timejump into past detected! Restart all ROS nodes, includes master_discovery, please!"
+                rospy.logwarn(timejump_msg)
+                if timejump_msg not in self._master_errors:
+                    self._master_errors.append(timejump_msg)
+                self._exit_timer = threading.Timer(5.0, self._timejump_exit)
+                self._exit_timer.start()
             if do_update:
                 self.updateSyncInfo()
-                with self._state_access_lock:
-                    # test for local changes
-                    ts_local = self.__new_master_state.timestamp_local
-                    if self.__master_state is not None and not self.__master_state.has_local_changes(s):
-                        ts_local = self.__master_state.timestamp_local
-                    self.__master_state = self.__new_master_state
-                    self.__master_state.timestamp_local = ts_local
-                    result = True
-            self.__master_state.check_ts = self.__new_master_state.timestamp
+                # test for local changes
+                ts_local = self.__new_master_state.timestamp_local
+                if current is not None and not current.has_local_changes(s):
+                    ts_local = current.timestamp_local
+                # the new state is complete before it will be published
+                self.__new_master_state.timestamp_local = ts_local
+                self.__new_master_state.check_ts = self.__last_check_ts
+                self._check_do_not_sync()
+                self._publish_state(self.__new_master_state)
+                result = True
             return result
 
     def _timejump_exit(self):
@@ -858,10 +1126,11 @@ class MasterMonitor(object):
         '''
         Sets the master state to ``None``.
         '''
-        with self._state_access_lock:
-            if self.__master_state is not None:
-                del self.__master_state
-            self.__master_state = None
+        with self._create_access_lock:
+            version = self.__snapshot.version
+            self.__journal.clear()
+            self.__snapshot = _StateSnapshot(None, version, version)
+            self.__filter_cache.clear()
 
     def update_master_errors(self, error_list):
         self._master_errors = list(error_list)
@@ -0,0 +1,221 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import threading
+try:
+    import xmlrpclib as xmlrpcclient
+except ImportError:
+    import xmlrpc.client as xmlrpcclient
+
+from .binary_state import decode_state_delta
+from .common import get_hostname, TimeoutTransport
+from .master_info import MasterInfo
+from .state_subscription import StateSubscriber
+
+
+class MasterStateClient(object):
+    '''
+    Requests the state of a ROS master from the RPC server of a remote
+    ``master_discovery`` node and keeps the last received state. If the remote
+    node supports ``masterInfoDelta()`` only the changes since the last request
+    are transferred and merged into the stored state. Older nodes are requested
+    by ``masterInfoFiltered()`` or ``masterInfo()``. If available, the compact
+    binary encoding of ``masterInfoBinary()`` is used.
+
+    After a state was received, :mod:`fkie_master_discovery.state_client.MasterStateClient.subscribe()`
+    connects to the state subscription server of the remote node. While the
+    subscription is active the changes are pushed by the remote node and
+    ``get_state()`` returns the stored state without a request.
+    '''
+
+    TIMEOUT = 20.
+    ''' the default timeout of the requests in seconds. '''
+
+    def __init__(self, monitoruri, timeout=TIMEOUT):
+        '''
+        :param monitoruri: the URI of the RPC server of the ``master_discovery`` node
+
+        :type monitoruri: str
+
+        :param timeout: the timeout of the requests in seconds
+
+        :type timeout: float
+        '''
+        self.monitoruri = monitoruri
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._methods = None
+        self._state = None
+        self._version = ''
+        self._filter_list = None
+        self._subscriber = None
+        self._callback = None
+
+    def reset(self):
+        '''
+        Removes the stored state and the detected RPC methods. The next request
+        transfers the complete state. An active subscription is closed.
+        '''
+        with self._lock:
+            self._stop_subscriber()
+            self._methods = None
+            self._state = None
+            self._version = ''
+            self._filter_list = None
+
+    def get_state(self, filter_list=None):
+        '''
+        Requests the current state of the ROS master.
+
+        :param filter_list: the filter as returned by
+                            :mod:`fkie_master_discovery.filter_interface.FilterInterface.to_list()`
+                            or ``None`` to get the unfiltered state. Older ``master_discovery``
+                            nodes without ``masterInfoFiltered()`` always return the unfiltered state.
+
+        :type filter_list: list or ``None``
+
+        :return: the state as returned by :mod:`fkie_master_discovery.master_info.MasterInfo.listedState()`
+
+        :rtype: tuple
+
+        :raise: exceptions of the XML-RPC request
+        '''
+        with self._lock:
+            if self.is_subscribed(filter_list):
+                return self._state
+            try:
+                remote_monitor = xmlrpcclient.ServerProxy(self.monitoruri, transport=TimeoutTransport(self.timeout))
+                if self._methods is None:
+                    # determine the supported methods: older versions have no filtered or delta methods
+                    try:
+                        self._methods = remote_monitor.system.listMethods()
+                    except Exception:
+                        self._methods = []
+                if 'masterInfoBinary' in self._methods or 'masterInfoDelta' in self._methods:
+                    if self._state is None or filter_list != self._filter_list:
+                        self._version = ''
+                    args = (self._version,) if filter_list is None else (self._version, filter_list)
+                    if 'masterInfoBinary' in self._methods:
+                        result = decode_state_delta(remote_monitor.masterInfoBinary(*args).data)
+                    else:
+                        result = remote_monitor.masterInfoDelta(*args)
+                    version, complete, state, nodes, topics, services = result
+                    if not complete:
+                        state = MasterInfo.merge_listed_state(self._state, state, nodes, topics, services)
+                    self._version = version
+                    self._filter_list = filter_list
+                    self._state = state
+                elif filter_list is not None and 'masterInfoFiltered' in self._methods:
+                    self._state = remote_monitor.masterInfoFiltered(filter_list)
+                else:
+                    self._state = remote_monitor.masterInfo()
+            except Exception:
+                # the remote node can be restarted with another version
+                self.reset()
+                raise
+            return self._state
+
+    def is_subscribed(self, filter_list=None):
+        '''
+        :return: ``True`` if the changes for given filter are pushed by the remote node.
+
+        :rtype: bool
+        '''
+        with self._lock:
+            return self._subscriber is not None and self._subscriber.is_alive() and self._subscriber.filter_list == filter_list
+
+    def subscribe(self, callback, filter_list=None):
+        '''
+        Subscribes to the changes of the remote ROS master state. The subscription
+        is only possible after the state was received by ``get_state()`` with the same
+        filter. If the connection is lost, the subscription ends and the next
+        ``get_state()`` requests the state again.
+
+        :param callback: the method called with the new state as returned by
+                         :mod:`fkie_master_discovery.master_info.MasterInfo.listedState()`.
+                         It is called from the thread of the subscription.
+
+        :param filter_list: the filter, see ``get_state()``
+
+        :return: ``True`` if the subscription is active
+
+        :rtype: bool
+        '''
+        with self._lock:
+            if self.is_subscribed(filter_list):
+                self._callback = callback
+                return True
+            self._stop_subscriber()
+            if self._state is None or self._filter_list != filter_list:
+                return False
+            if not self._methods or 'masterStateSubscription' not in self._methods or 'masterInfoBinary' not in self._methods:
+                return False
+            try:
+                remote_monitor = xmlrpcclient.ServerProxy(self.monitoruri, transport=TimeoutTransport(self.timeout))
+                port = remote_monitor.masterStateSubscription()
+            except Exception:
+                return False
+            if not port:
+                return False
+            self._callback = callback
+            self._subscriber = StateSubscriber(get_hostname(self.monitoruri), port, self._version, filter_list, self._on_pushed_state)
+            self._subscriber.start()
+            return True
+
+    def unsubscribe(self):
+        '''
+        Closes the subscription. The stored state is kept.
+        '''
+        with self._lock:
+            self._stop_subscriber()
+
+    def _stop_subscriber(self):
+        if self._subscriber is not None:
+            self._subscriber.stop()
+            self._subscriber = None
+            self._callback = None
+
+    def _on_pushed_state(self, subscriber, delta):
+        with self._lock:
+            if subscriber is not self._subscriber:
+                return
+            version, complete, state, nodes, topics, services = delta
+            if not complete:
+                if version == self._version and not (nodes or topics or services):
+                    return
+                state = MasterInfo.merge_listed_state(self._state, state, nodes, topics, services)
+            self._version = version
+            self._state = state
+            callback = self._callback
+        if callback is not None:
+            callback(state)
@@ -0,0 +1,254 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import socket
+import struct
+import threading
+import traceback
+try:
+    from SocketServer import ThreadingMixIn, TCPServer, BaseRequestHandler
+    import xmlrpclib as xmlrpcclient  # python 2 compatibility
+except ImportError:
+    from socketserver import ThreadingMixIn, TCPServer, BaseRequestHandler
+    import xmlrpc.client as xmlrpcclient
+
+import rospy
+
+from .binary_state import encode_state_delta, decode_state_delta
+
+
+KEEPALIVE_INTERVAL = 10.0
+''' If the state is not changed, an empty frame is sent after this time in seconds. '''
+
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+''' Frames with greater size are treated as error. '''
+
+_FRAME_HEADER = struct.Struct('!I')
+
+
+def send_frame(sock, data):
+    '''
+    Sends the data prefixed by its length.
+    '''
+    sock.sendall(_FRAME_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise socket.error("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    '''
+    Receives the data sent by :mod:`fkie_master_discovery.state_subscription.send_frame()`.
+
+    :raise socket.error: if the connection was closed or the frame is invalid
+    '''
+    size, = _FRAME_HEADER.unpack(_recv_exactly(sock, _FRAME_HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise socket.error("frame too large: %d" % size)
+    return _recv_exactly(sock, size)
+
+
+class StateSubscriptionHandler(BaseRequestHandler):
+    '''
+    Handles one subscriber. The subscriber sends one frame with the XML-RPC encoded
+    parameter of ``masterInfoDelta()``. After that, the changes of the ROS master
+    state are sent as encoded by :mod:`fkie_master_discovery.binary_state.encode_state_delta()`.
+    '''
+
+    def handle(self):
+        monitor = self.server.monitor
+        self.server.add_connection(self.request)
+        try:
+            params, _ = xmlrpcclient.loads(recv_frame(self.request))
+            version = params[0]
+            filter_list = params[1] if len(params) > 1 else None
+            state_version = None
+            while not self.server.stopped:
+                current = monitor.wait_state_change(state_version, KEEPALIVE_INTERVAL)
+                if self.server.stopped:
+                    break
+                if current == state_version:
+                    send_frame(self.request, b'')
+                    continue
+                delta = monitor.getListedMasterInfoDelta(version, filter_list)
+                version = delta[0]
+                state_version = current
+                send_frame(self.request, encode_state_delta(delta))
+        except socket.error:
+            pass
+        except Exception:
+            print(traceback.format_exc())
+        finally:
+            self.server.remove_connection(self.request)
+
+
+class StateSubscriptionServer(ThreadingMixIn, TCPServer):
+    '''
+    A TCP server to push the changes of the ROS master state to the subscribers.
+    The server is bound to a port chosen by the system, it is announced by
+    ``masterStateSubscription()`` RPC method of the
+    :mod:`fkie_master_discovery.master_monitor.MasterMonitor`.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr, monitor, ipv6=False):
+        '''
+        :param addr: the address to bind to, use port ``0`` to get a free port
+
+        :type addr: (str, int)
+
+        :param monitor: the monitor providing ``wait_state_change()`` and ``getListedMasterInfoDelta()``
+
+        :type monitor: :mod:`fkie_master_discovery.master_monitor.MasterMonitor`
+        '''
+        if ipv6:
+            self.address_family = socket.AF_INET6
+        self.monitor = monitor
+        self.stopped = False
+        self._connections = set()
+        self._lock = threading.Lock()
+        TCPServer.__init__(self, addr, StateSubscriptionHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def add_connection(self, sock):
+        with self._lock:
+            self._connections.add(sock)
+
+    def remove_connection(self, sock):
+        with self._lock:
+            self._connections.discard(sock)
+
+    def stop(self):
+        '''
+        Stops the server and closes the connections to all subscribers.
+        '''
+        self.stopped = True
+        self.shutdown()
+        self.server_close()
+        with self._lock:
+            for sock in self._connections:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except Exception:
+                    pass
+            self._connections.clear()
+
+
+class StateSubscriber(threading.Thread):
+    '''
+    Connects to the :mod:`fkie_master_discovery.state_subscription.StateSubscriptionServer`
+    and calls the handler for each received change of the ROS master state. The
+    thread ends on errors or after :mod:`fkie_master_discovery.state_subscription.StateSubscriber.stop()`.
+    '''
+
+    def __init__(self, host, port, version, filter_list, handler):
+        '''
+        :param host: the host of the ``master_discovery`` node
+
+        :type host: str
+
+        :param port: the port returned by ``masterStateSubscription()``
+
+        :type port: int
+
+        :param version: the last known version, see ``masterInfoDelta()``
+
+        :type version: str
+
+        :param filter_list: the filter list or ``None``, see ``masterInfoDelta()``
+
+        :param handler: the method called with this subscriber and the decoded result
+                        of ``masterInfoDelta()`` for each change.
+        '''
+        threading.Thread.__init__(self)
+        self.host = host
+        self.port = port
+        self.version = version
+        self.filter_list = filter_list
+        self._handler = handler
+        self._socket = None
+        self._stopped = False
+        self.setDaemon(True)
+
+    def run(self):
+        try:
+            self._socket = socket.create_connection((self.host, self.port), KEEPALIVE_INTERVAL)
+            # the server sends at least an empty frame after the keepalive interval
+            self._socket.settimeout(KEEPALIVE_INTERVAL * 3)
+            params = (self.version,) if self.filter_list is None else (self.version, self.filter_list)
+            request = xmlrpcclient.dumps(params)
+            if not isinstance(request, bytes):
+                request = request.encode('utf-8')
+            send_frame(self._socket, request)
+            while not self._stopped:
+                data = recv_frame(self._socket)
+                if data and not self._stopped:
+                    self._handler(self, decode_state_delta(data))
+        except Exception as err:
+            if not self._stopped:
+                rospy.logwarn("State subscription to %s:%s closed: %s", self.host, self.port, err)
+        finally:
+            self._close()
+
+    def stop(self):
+        '''
+        Closes the connection.
+        '''
+        self._stopped = True
+        self._close()
+
+    def _close(self):
+        sock = self._socket
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+            sock.close()
@@ -44,6 +44,7 @@ import rospy
 import socket
 import struct
 import threading
+import time
 
 try:
     import netifaces
@@ -100,6 +101,13 @@ class DiscoverSocket(socket.socket):
     :type ttl: int (Default: 20)
     '''
 
+    MAX_SEND_BATCH = 256
+    ''' the count of queued messages collected to one batch. The same message is
+    sent only once to each destination of a batch. '''
+
+    RESOLVE_TIMEOUT = 30.
+    ''' the resolved addresses of the destinations are cached for this time in seconds. '''
+
     def __init__(self, port, mgroup, ttl=20, send_mcast=True, listen_mcast=True):
         '''
         Creates a socket, bind it to a given port and join to a given multicast
@@ -118,6 +126,8 @@ class DiscoverSocket(socket.socket):
         self.port = port
         self.receive_queue = queue.Queue()
         self._send_queue = queue.Queue()
+        # {(address, address family): (socket address, resolve time)}
+        self._resolved = {}
         self._lock = threading.RLock()
         self.send_mcast = send_mcast
         self.listen_mcast = listen_mcast
@@ -298,71 +308,130 @@ class DiscoverSocket(socket.socket):
         while not self._closed:
             send_item = self._get_next_queue_item()
             if send_item is not None and not self._closed:
-                msg = send_item.msg
-                if send_item.destinations:
-                    # send to given addresses
-                    for addr in send_item.destinations:
-                        try:
-                            if addr in self._locals:
-                                self.receive_queue.put(QueueReceiveItem(msg, (addr, self.port), QueueReceiveItem.LOOPBACK), timeout=1)
-                            elif self.unicast_socket is None:
-                                self.sendto(msg, (addr, self.getsockname()[1]))
-                            else:
-                                self.unicast_socket.send2addr(msg, addr)
-                            try:
-                                del SEND_ERRORS[addr]
-                            except:
-                                pass
-                        except socket.error as errobj:
-                            erro_msg = "Error while send to '%s': %s" % (addr, errobj)
-                            SEND_ERRORS[addr] = erro_msg
-                            # -2: Name or service not known
-                            if errobj.errno in [-5, -2]:
-                                if addr not in self.sock_5_error_printed:
-                                    rospy.logwarn(erro_msg)
-                                    self.sock_5_error_printed.append(addr)
-                            else:
-                                rospy.logwarn(erro_msg)
-                            if errobj.errno in [errno.ENETDOWN, errno.ENETUNREACH, errno.ENETRESET, errno]:
-                                self.SOKET_ERRORS_NEEDS_RECONNECT = True
-                        except Exception as e:
-                            erro_msg = "Send to robot host '%s' failed: %s" % (addr, e)
-                            rospy.logwarn(erro_msg)
-                            SEND_ERRORS[addr] = erro_msg
+                self._send_batch(send_item)
+
+    def _send_batch(self, send_item):
+        '''
+        Sends the given item together with all currently queued items.
+        '''
+        for msg, send_mcast, destinations in self._collect_send_batch(send_item):
+            if send_mcast:
+                self._send_multicast(msg)
+            if destinations:
+                self._send_unicast(msg, destinations)
+
+    def _collect_send_batch(self, send_item):
+        '''
+        Collects all currently queued items and groups the destinations by message.
+
+        :return: the list with (message, send to multicast group, list of unicast addresses)
+                 in the order of first occurrence of the message.
+        '''
+        batch = []
+        by_msg = {}
+        count = 0
+        while send_item is not None:
+            entry = by_msg.get(send_item.msg, None)
+            if entry is None:
+                entry = [send_item.msg, False, [], set()]
+                by_msg[send_item.msg] = entry
+                batch.append(entry)
+            if send_item.destinations:
+                for addr in send_item.destinations:
+                    if addr not in entry[3]:
+                        entry[3].add(addr)
+                        entry[2].append(addr)
+            else:
+                entry[1] = True
+            count += 1
+            send_item = None
+            if count < self.MAX_SEND_BATCH:
+                try:
+                    send_item = self._send_queue.get_nowait()
+                except queue.Empty:
+                    pass
+        return [(msg, send_mcast, destinations) for msg, send_mcast, destinations, _ in batch]
+
+    def _resolve(self, addr, sock):
+        '''
+        :return: the cached socket address of given host for the address family and port of given socket.
+        '''
+        key = (addr, sock.family)
+        now = time.time()
+        try:
+            sockaddr, ts = self._resolved[key]
+            if now - ts < self.RESOLVE_TIMEOUT:
+                return sockaddr
+        except KeyError:
+            pass
+        sockaddr = socket.getaddrinfo(addr, sock.getsockname()[1], sock.family, socket.SOCK_DGRAM)[0][4]
+        self._resolved[key] = (sockaddr, now)
+        return sockaddr
+
+    def _send_unicast(self, msg, destinations):
+        for addr in destinations:
+            try:
+                if addr in self._locals:
+                    self.receive_queue.put(QueueReceiveItem(msg, (addr, self.port), QueueReceiveItem.LOOPBACK), timeout=1)
+                elif self.unicast_socket is None:
+                    self.sendto(msg, self._resolve(addr, self))
                 else:
-                    # send a multicast message
-                    # simulate the reception of a message from local host
-                    addr = self.mgroup
-                    try:
-                        if not self.listen_mcast:
-                            self.receive_queue.put(QueueReceiveItem(msg, ('localhost', self.port), QueueReceiveItem.LOOPBACK), timeout=1)
-                        if self.unicast_only and self.unicast_socket:
-                            addr = self.unicast_socket.interface
-                            self.unicast_socket.send2addr(msg, self.unicast_socket.interface)
-                        elif self.send_mcast:
-                            # Send to the multicast group address as supplied
-                            # Default '226.0.0.0'
-                            self.sendto(msg, (self.mgroup, self.getsockname()[1]))
-                        try:
-                            del SEND_ERRORS[addr]
-                        except:
-                            pass
-                    except socket.error as errobj:
-                        erro_msg = "Error while send to '%s': %s" % (addr, errobj)
-                        SEND_ERRORS[addr] = erro_msg
-                        # -2: Name or service not known
-                        if errobj.errno in [-5, -2]:
-                            if addr not in self.sock_5_error_printed:
-                                rospy.logwarn(erro_msg)
-                                self.sock_5_error_printed.append(addr)
-                        else:
-                            rospy.logdebug(erro_msg)
-                        if errobj.errno in [errno.ENETDOWN, errno.ENETUNREACH, errno.ENETRESET]:
-                            self.SOKET_ERRORS_NEEDS_RECONNECT = True
-                    except Exception as e:
-                        erro_msg = "Send to robot host '%s' failed: %s" % (addr, e)
+                    self.unicast_socket.send2addr(msg, self._resolve(addr, self.unicast_socket)[0])
+                if addr in SEND_ERRORS:
+                    del SEND_ERRORS[addr]
+            except socket.error as errobj:
+                # resolve the address again on next send
+                self._resolved.pop((addr, self.family), None)
+                if self.unicast_socket is not None:
+                    self._resolved.pop((addr, self.unicast_socket.family), None)
+                erro_msg = "Error while send to '%s': %s" % (addr, errobj)
+                SEND_ERRORS[addr] = erro_msg
+                # -2: Name or service not known
+                if errobj.errno in [-5, -2]:
+                    if addr not in self.sock_5_error_printed:
                         rospy.logwarn(erro_msg)
-                        SEND_ERRORS[addr] = erro_msg
+                        self.sock_5_error_printed.append(addr)
+                else:
+                    rospy.logwarn(erro_msg)
+                if errobj.errno in [errno.ENETDOWN, errno.ENETUNREACH, errno.ENETRESET, errno]:
+                    self.SOKET_ERRORS_NEEDS_RECONNECT = True
+            except Exception as e:
+                erro_msg = "Send to robot host '%s' failed: %s" % (addr, e)
+                rospy.logwarn(erro_msg)
+                SEND_ERRORS[addr] = erro_msg
+
+    def _send_multicast(self, msg):
+        # send a multicast message
+        # simulate the reception of a message from local host
+        addr = self.mgroup
+        try:
+            if not self.listen_mcast:
+                self.receive_queue.put(QueueReceiveItem(msg, ('localhost', self.port), QueueReceiveItem.LOOPBACK), timeout=1)
+            if self.unicast_only and self.unicast_socket:
+                addr = self.unicast_socket.interface
+                self.unicast_socket.send2addr(msg, self.unicast_socket.interface)
+            elif self.send_mcast:
+                # Send to the multicast group address as supplied
+                # Default '226.0.0.0'
+                self.sendto(msg, self._resolve(self.mgroup, self))
+            if addr in SEND_ERRORS:
+                del SEND_ERRORS[addr]
+        except socket.error as errobj:
+            erro_msg = "Error while send to '%s': %s" % (addr, errobj)
+            SEND_ERRORS[addr] = erro_msg
+            # -2: Name or service not known
+            if errobj.errno in [-5, -2]:
+                if addr not in self.sock_5_error_printed:
+                    rospy.logwarn(erro_msg)
+                    self.sock_5_error_printed.append(addr)
+            else:
+                rospy.logdebug(erro_msg)
+            if errobj.errno in [errno.ENETDOWN, errno.ENETUNREACH, errno.ENETRESET]:
+                self.SOKET_ERRORS_NEEDS_RECONNECT = True
+        except Exception as e:
+            erro_msg = "Send to robot host '%s' failed: %s" % (addr, e)
+            rospy.logwarn(erro_msg)
+            SEND_ERRORS[addr] = erro_msg
 
     def hasEnabledMulticastIface(self):
         '''
@@ -485,6 +554,7 @@ class UcastSocket(socket.socket):
         '''
         self.interface = interface
         self.port = port
+        self.sock_5_error_printed = []
         addrinfo = None
         # If interface isn't specified, try to find an non localhost interface to
         # get some info for binding. Otherwise use localhost
@@ -522,6 +592,7 @@ class UcastSocket(socket.socket):
             rospy.logfatal("Unable to bind unicast to interface: %s, check that it exists: %s",
                            self.interface, msg)
             raise
+        self._bind_port = self.getsockname()[1]
 
     def send2addr(self, msg, addr):
         '''
@@ -533,7 +604,7 @@ class UcastSocket(socket.socket):
         :type addr: str
         '''
         try:
-            self.sendto(msg, (addr, self.getsockname()[1]))
+            self.sendto(msg, (addr, self._bind_port))
         except socket.error as errobj:
             msg = str(errobj)
             if errobj.errno in [-5]:
@@ -0,0 +1,167 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import threading
+import time
+import traceback
+try:
+    from Queue import Queue, Empty  # python 2 compatibility
+except ImportError:
+    from queue import Queue, Empty
+
+
+class WorkerBatch(object):
+    '''
+    Counts the finished jobs of a batch started by
+    :mod:`fkie_master_discovery.worker_pool.WorkerPool.start_batch()`.
+    '''
+
+    def __init__(self, count):
+        self._count = count
+        self._cond = threading.Condition()
+
+    def done(self):
+        with self._cond:
+            self._count -= 1
+            if self._count <= 0:
+                self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        '''
+        Blocks until all jobs are finished or the timeout is reached.
+
+        :param timeout: the maximal time to wait in seconds, ``None`` waits until all jobs are finished
+        :type timeout: float
+        :return: ``True`` if all jobs are finished
+        :rtype: bool
+        '''
+        end = None if timeout is None else time.time() + timeout
+        with self._cond:
+            # wait in a loop, the condition can wake up before all jobs are finished
+            while self._count > 0:
+                if end is None:
+                    self._cond.wait()
+                else:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            return self._count <= 0
+
+
+class WorkerPool(object):
+    '''
+    A fixed count of daemon threads executing the added jobs. The threads are
+    created on demand.
+    '''
+
+    def __init__(self, num_workers, name='worker'):
+        '''
+        :param num_workers: the maximal count of parallel executed jobs
+        :type num_workers: int
+        :param name: prefix for the names of the threads
+        :type name: str
+        '''
+        self.num_workers = max(1, int(num_workers))
+        self.name = name
+        self._queue = Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def submit(self, func, *args):
+        '''
+        Adds a job to the queue. The job is executed by the next free thread.
+        Exceptions of the job are printed.
+        '''
+        self._put((func, args, None))
+
+    def start_batch(self, jobs):
+        '''
+        Adds all jobs to the queue.
+
+        :param jobs: list of tuples with method and its arguments
+        :type jobs: [(method, tuple)]
+        :return: the batch to wait for
+        :rtype: :mod:`fkie_master_discovery.worker_pool.WorkerBatch`
+        '''
+        jobs = list(jobs)
+        batch = WorkerBatch(len(jobs))
+        for func, args in jobs:
+            self._put((func, args, batch))
+        return batch
+
+    def shutdown(self):
+        '''
+        Stops all threads after the current jobs. Queued jobs are skipped.
+        '''
+        with self._lock:
+            self._stopped = True
+            # drop the queued jobs, the waiting batches are notified
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except Empty:
+                    break
+                if job is not None and job[2] is not None:
+                    job[2].done()
+            for _ in self._workers:
+                self._queue.put(None)
+            self._workers = []
+
+    def _put(self, job):
+        with self._lock:
+            if self._stopped:
+                if job[2] is not None:
+                    job[2].done()
+                return
+            self._queue.put(job)
+            if len(self._workers) < self.num_workers:
+                worker = threading.Thread(target=self._run, name='%s_%d' % (self.name, len(self._workers)))
+                worker.setDaemon(True)
+                self._workers.append(worker)
+                worker.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            func, args, batch = job
+            try:
+                func(*args)
+            except Exception:
+                print(traceback.format_exc())
+            finally:
+                if batch is not None:
+                    batch.done()
@@ -0,0 +1,77 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import struct
+import unittest
+
+from fkie_master_discovery.binary_state import encode_state_delta, decode_state_delta
+
+PKG = 'fkie_master_discovery'
+
+
+class TestBinaryState(unittest.TestCase):
+    '''
+    '''
+
+    def test_encode_decode(self):
+        state = ('1.000000000', '2.000000000', 'http://host:11311/', 'host',
+                 [('/chatter', ['/talker']), ('/rosout', ['/talker', '/listener'])],
+                 [('/chatter', ['/listener'])],
+                 [('/talker/get_loggers', ['/talker'])],
+                 [('/chatter', 'std_msgs/String'), ('/rosout', 'rosgraph_msgs/Log')],
+                 [('/talker', 'http://host:4711/', 'http://host:11311/', 1234, 'local'),
+                  ('/listener', 'http://other:4712/', 'http://other:11311/', None, 'remote')],
+                 [('/talker/get_loggers', 'rosrpc://host:4713', 'http://host:11311/', '', 'local')])
+        delta = ('12.3:5', False, state, ['/talker', '/gone'], ['/chatter'], [])
+        self.assertEqual(decode_state_delta(encode_state_delta(delta)), delta, "decoded state differs from the encoded one")
+        empty = ('', True, ('1', '1', 'http://host:11311/', 'host', [], [], [], [], [], []), [], [], [])
+        self.assertEqual(decode_state_delta(encode_state_delta(empty)), empty, "decoded empty state differs from the encoded one")
+
+    def test_invalid_data(self):
+        self.assertRaises(ValueError, decode_state_delta, b'invalid')
+        data = encode_state_delta(('', True, ('1', '1', 'http://host:11311/', 'host', [], [], [], [], [], []), [], [], []))
+        self.assertRaises(ValueError, decode_state_delta, data[:-4])
+        # corrupted index of the version string
+        int_count = struct.unpack_from('!I', data, 9)[0]
+        offset = len(data) - 4 * int_count
+        corrupted = data[:offset] + struct.pack('!I', 1000) + data[offset + 4:]
+        self.assertRaises(ValueError, decode_state_delta, corrupted)
+        # count of changed services greater than the count of remaining integers
+        corrupted = data[:-4] + struct.pack('!I', 1)
+        self.assertRaises(ValueError, decode_state_delta, corrupted)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, os.path.basename(__file__), TestBinaryState)
@@ -31,6 +31,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import re
 import unittest
 
 from fkie_master_discovery.filter_interface import FilterInterface
@@ -60,6 +61,24 @@ class TestFilterInterface(unittest.TestCase):
         ignore = fi.is_ignored_publisher('/some_node', '/test_topic', '')
         self.assertFalse(ignore, "/test_topic is in sync_topic, but ignored by filter interface")
 
+    def test_cache_invalidation(self):
+        fi = FilterInterface()
+        fi.load(mastername='testmaster',
+                ignore_nodes=[], sync_nodes=[],
+                ignore_topics=[], sync_topics=['/test_topic'],
+                ignore_srv=[], sync_srv=[],
+                ignore_type=[],
+                ignore_publishers=[], ignore_subscribers=[],
+                do_not_sync=[])
+        self.assertFalse(fi.is_ignored_publisher('/some_node', '/test_topic', 'SomeType'), "/test_topic is in sync_topic, but ignored")
+        self.assertTrue(fi.is_ignored_publisher('/some_node', '/other_topic', 'SomeType'), "/other_topic is not in sync_topic, but not ignored")
+        # the cached results have to be updated after change of the pattern
+        fi.update_sync_topics_pattern(['/other_topic'])
+        self.assertTrue(fi.is_ignored_publisher('/some_node', '/test_topic', 'SomeType'), "/test_topic is removed from sync_topic, but not ignored")
+        self.assertFalse(fi.is_ignored_publisher('/some_node', '/other_topic', 'SomeType'), "/other_topic is in sync_topic, but ignored")
+        fi.set_hide_pattern(re_hide_topics=re.compile('/other_topic'))
+        self.assertTrue(fi.is_ignored_publisher('/some_node', '/other_topic', 'SomeType'), "/other_topic is hidden, but not ignored")
+
 
 if __name__ == '__main__':
     import rosunit
@@ -0,0 +1,169 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import time
+import unittest
+
+from fkie_master_discovery.master_info import MasterInfo, NodeInfo, ServiceInfo, clear_locality_cache
+
+PKG = 'fkie_master_discovery'
+
+
+def create_state(count):
+    '''
+    Creates a listed state with given count of nodes. Each node publishes and
+    subscribes two topics, publishes to /rosout and provides two services.
+    '''
+    masteruri = 'http://host:11311/'
+    nodes = ['/node_%d' % idx for idx in range(count)]
+    publishers = [('/rosout', list(nodes))]
+    subscribers = [('/rosout', ['/rosout'])]
+    services = []
+    topic_types = [('/rosout', 'rosgraph_msgs/Log')]
+    node_infos = [('/rosout', 'http://host:4000/', masteruri, 1, 'local')]
+    service_infos = []
+    for idx, node in enumerate(nodes):
+        topic = '/topic_%d' % idx
+        next_topic = '/topic_%d' % ((idx + 1) % count)
+        publishers.append((topic, [node]))
+        subscribers.append((topic, [nodes[(idx + 1) % count]]))
+        subscribers.append((next_topic, [node]))
+        topic_types.append((topic, 'std_msgs/String'))
+        host = 'host' if idx % 2 else 'other'
+        node_infos.append((node, 'http://%s:%d/' % (host, 5000 + idx), masteruri, 100 + idx, 'local'))
+        for srv in ('get_loggers', 'set_logger_level'):
+            name = '%s/%s' % (node, srv)
+            services.append((name, [node]))
+            service_infos.append((name, 'rosrpc://%s:%d' % (host, 5000 + idx), masteruri, 'roscpp/%s' % srv, 'local'))
+    return ('1.000000000', '1.000000000', masteruri, 'host', publishers, subscribers, services, topic_types, node_infos, service_infos)
+
+
+class TestMasterInfo(unittest.TestCase):
+    '''
+    '''
+
+    def _round_trip(self, count):
+        state = create_state(count)
+        start = time.time()
+        minfo = MasterInfo.from_list(state)
+        listed = minfo.listedState()
+        duration = time.time() - start
+        self.assertEqual(len(minfo.node_names), count + 1, "wrong count of nodes after from_list()")
+        self.assertEqual(len(minfo.getTopic('/rosout').publisherNodes), count, "wrong count of /rosout publishers")
+        self.assertEqual(MasterInfo.from_list(listed), minfo, "state differs after round trip")
+        return duration
+
+    def test_round_trip(self):
+        minfo = MasterInfo.from_list(create_state(3))
+        node = minfo.getNode('/node_1')
+        self.assertEqual(node.publishedTopics, ['/rosout', '/topic_1'], "wrong published topics")
+        self.assertEqual(node.subscribedTopics, ['/topic_0', '/topic_2'], "wrong subscribed topics")
+        self.assertEqual(node.services, ['/node_1/get_loggers', '/node_1/set_logger_level'], "wrong services")
+        self.assertTrue(node.isLocal, "/node_1 runs on the host of the ROS master")
+        self.assertFalse(minfo.getNode('/node_0').isLocal, "/node_0 runs on other host")
+        self.assertEqual(minfo.getService('/node_1/get_loggers').type, 'roscpp/get_loggers', "wrong service type")
+
+    def test_digest(self):
+        minfo = MasterInfo.from_list(create_state(10))
+        other = MasterInfo.from_list(minfo.listedState())
+        self.assertEqual(minfo.digest(), other.digest(), "digest differs after round trip")
+        self.assertEqual(minfo, other, "states differ after round trip")
+        # change a node of other ROS master
+        for state in (minfo, other):
+            state.getNode('/node_0').masteruri = 'http://other:11311/'
+        self.assertEqual(minfo.digest(), other.digest(), "digest differs after same changes")
+        other.getNode('/node_0').pid = 1
+        self.assertNotEqual(minfo.digest(), other.digest(), "digest not changed after pid change")
+        self.assertNotEqual(minfo, other, "states are equal after pid change")
+        self.assertEqual(minfo.local_digest(), other.local_digest(), "local digest changed after change of remote node")
+        self.assertFalse(minfo.has_local_changes(other), "local changes detected after change of remote node")
+        # change a local node
+        other.getNode('/node_1').publishedTopics = '/new_topic'
+        self.assertNotEqual(minfo.local_digest(), other.local_digest(), "local digest not changed after new publisher")
+        self.assertTrue(minfo.has_local_changes(other), "no local changes detected after new publisher")
+        # the order of the topics is not relevant
+        other = MasterInfo.from_list(minfo.listedState())
+        node = other.getNode('/node_1')
+        node.subscribedTopics = list(reversed(node.subscribedTopics))
+        self.assertEqual(minfo.digest(), other.digest(), "digest depends on the order of topics")
+
+    def test_update_info(self):
+        state = create_state(20)
+        minfo = MasterInfo.from_list(state)
+        # creates the index of the publishers
+        minfo.getTopic('/rosout').publisherNodes = '/node_new'
+        # remove /node_0 from the publishers of /rosout
+        publishers = [(topic, [n for n in nodes if n != '/node_0']) for topic, nodes in state[4]]
+        other = MasterInfo.from_list(state[:4] + (publishers,) + state[5:])
+        minfo.updateInfo(other)
+        topic = minfo.getTopic('/rosout')
+        self.assertNotIn('/node_0', topic.publisherNodes, "/node_0 is still publisher after updateInfo()")
+        topic.publisherNodes = '/node_0'
+        self.assertIn('/node_0', topic.publisherNodes, "/node_0 can not be added after updateInfo()")
+        self.assertEqual(len(topic.publisherNodes), 20, "wrong count of /rosout publishers")
+
+    def test_locality(self):
+        clear_locality_cache()
+        node = NodeInfo('/node', 'http://host:11311/')
+        node.uri = 'http://host:5000/'
+        self.assertTrue(node.isLocal, "node on the host of the ROS master is not local")
+        node.masteruri = 'http://other:11311/'
+        self.assertFalse(node.isLocal, "node registered on other ROS master is local")
+        self.assertFalse(node.isLocalMaster, "node registered on other ROS master is on local master")
+        copy = node.copy('http://other:11311/')
+        self.assertFalse(copy.isLocal, "node does not run on the host of its origin ROS master")
+        self.assertTrue(copy.isLocalMaster, "copy for the origin ROS master is not on local master")
+        service = ServiceInfo('/node/srv', 'http://host:11311/')
+        service.uri = 'rosrpc://other:5000'
+        self.assertFalse(service.isLocal, "service on other host is local")
+        clear_locality_cache()
+        service.uri = 'rosrpc://host:5000'
+        self.assertTrue(service.isLocal, "service on the host of the ROS master is not local")
+        self.assertTrue(NodeInfo.local_('http://host:11311/', 'http://host:11311/', 'http://host:5000/'))
+        self.assertFalse(NodeInfo.local_('http://host:11311/', 'http://other:11311/', 'http://host:5000/'))
+
+    def test_benchmark(self):
+        # the duration of the round trip has to grow linear with the count of nodes.
+        # The best of several runs is used to reduce the influence of other processes.
+        # The counts are small enough to keep the unit tests fast.
+        durations = {}
+        for count in [300, 3000]:
+            durations[count] = min(self._round_trip(count) for _ in range(3))
+        msg = "round trip of 3000 nodes is not linear, durations: %s" % ', '.join('%d nodes: %.3f sec' % item for item in sorted(durations.items()))
+        # linear growth results in a ratio of 10, allow a factor of 4 for noise
+        self.assertLess(durations[3000], max(durations[300], 0.005) * 40, msg)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, os.path.basename(__file__), TestMasterInfo)
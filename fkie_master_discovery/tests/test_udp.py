@@ -0,0 +1,125 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import socket
+import unittest
+
+from fkie_master_discovery import udp
+from fkie_master_discovery.udp import DiscoverSocket
+
+PKG = 'fkie_master_discovery'
+
+
+class CountingSocket(DiscoverSocket):
+    '''
+    A DiscoverSocket without receive and send threads, which counts the calls of
+    `sendto()` and `getsockname()` instead of sending the messages.
+    '''
+
+    def __init__(self):
+        socket.socket.__init__(self, socket.AF_INET, socket.SOCK_DGRAM)
+        self.port = 11511
+        self.receive_queue = udp.queue.Queue()
+        self._send_queue = udp.queue.Queue()
+        self._resolved = {}
+        self.send_mcast = True
+        self.listen_mcast = True
+        self.unicast_only = False
+        self._closed = False
+        self._locals = []
+        self.sock_5_error_printed = []
+        self.SOKET_ERRORS_NEEDS_RECONNECT = False
+        self.mgroup = '226.0.0.0'
+        self.unicast_socket = None
+        self.sent = []
+        self.count_getsockname = 0
+
+    def sendto(self, msg, addr):
+        self.sent.append((msg, addr))
+        return len(msg)
+
+    def getsockname(self):
+        self.count_getsockname += 1
+        return ('0.0.0.0', self.port)
+
+
+class TestUdp(unittest.TestCase):
+    '''
+    '''
+
+    def setUp(self):
+        self.count_getaddrinfo = 0
+        self._getaddrinfo = socket.getaddrinfo
+
+        def getaddrinfo(host, port, *args):
+            self.count_getaddrinfo += 1
+            return [(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP, '', (host, port))]
+        socket.getaddrinfo = getaddrinfo
+        self.sock = CountingSocket()
+
+    def tearDown(self):
+        socket.getaddrinfo = self._getaddrinfo
+        socket.socket.close(self.sock)
+
+    def _send_period(self, hosts):
+        # one heartbeat to the multicast group, one request to all hosts and a reply to each host
+        self.sock.send_queued(b'heartbeat')
+        self.sock.send_queued(b'request', list(hosts))
+        for host in hosts:
+            self.sock.send_queued(b'request', [host])
+        self.sock._send_batch(self.sock._send_queue.get_nowait())
+
+    def test_send_syscalls(self):
+        hosts = ['robot_%d' % idx for idx in range(50)]
+        queued = 1 + 2 * len(hosts)
+        counts = []
+        for _ in range(10):
+            count_sent = len(self.sock.sent)
+            count_getsockname = self.sock.count_getsockname
+            count_getaddrinfo = self.count_getaddrinfo
+            self._send_period(hosts)
+            counts.append((len(self.sock.sent) - count_sent,
+                           self.sock.count_getsockname - count_getsockname,
+                           self.count_getaddrinfo - count_getaddrinfo))
+        msg = "%d destinations queued per period, (sendto, getsockname, getaddrinfo) per period: %s" % (queued, counts)
+        # each message is sent once to each destination
+        self.assertEqual([c[0] for c in counts], [len(hosts) + 1] * 10, msg)
+        # the destinations are resolved only in the first period
+        self.assertEqual([c[1] for c in counts], [len(hosts) + 1] + [0] * 9, msg)
+        self.assertEqual([c[2] for c in counts], [len(hosts) + 1] + [0] * 9, msg)
+        self.assertEqual(set(addr for _, addr in self.sock.sent), set([(host, 11511) for host in hosts] + [('226.0.0.0', 11511)]), msg)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, os.path.basename(__file__), TestUdp)
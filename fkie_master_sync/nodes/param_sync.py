@@ -2,18 +2,67 @@
 # Original code from https://github.com/jhu-lcsr-forks/fkie_multimaster/tree/param-sync
 # adapt to change only local ROS Parameter Server
 
+import hashlib
 import rospy
+try:
+    import xmlrpclib as xmlrpcclient
+except ImportError:
+    import xmlrpc.client as xmlrpcclient
 
 from fkie_master_discovery.common import masteruri_from_master
 from fkie_multimaster_msgs.msg import MasterState
 
+
+def param_digests(value, path=(), digests=None):
+    '''
+    Returns the digests of the value and of all its subtrees as
+    {path: (digest, keys of the dictionary or None)}. The path is a tuple with the
+    keys from the root of the value.
+    '''
+    if digests is None:
+        digests = {}
+    _digest(value, path, digests)
+    return digests
+
+
+def _digest(value, path, digests):
+    if isinstance(value, dict):
+        md5 = hashlib.md5(b'{')
+        for key in sorted(value.keys()):
+            md5.update(repr(key).encode('utf-8'))
+            md5.update(_digest(value[key], path + (key,), digests))
+        digest = md5.digest()
+        digests[path] = (digest, frozenset(value.keys()))
+    else:
+        digest = hashlib.md5(repr(value).encode('utf-8')).digest()
+        digests[path] = (digest, None)
+    return digest
+
+
+def changed_params(value, old_digests, new_digests, path):
+    '''
+    Returns the list with (path, value) of all subtrees of the value, which differ
+    from the old digests. Unchanged subtrees are skipped. Of a dictionary, which
+    was a dictionary with the same or less keys before, only the changed items
+    are returned. Otherwise the whole value is returned to replace the old one.
+    '''
+    result = []
+    old = old_digests.get(path, None)
+    if old is not None and old[0] == new_digests[path][0]:
+        return result
+    if isinstance(value, dict) and old is not None and old[1] is not None and old[1] <= new_digests[path][1]:
+        for key, subvalue in value.items():
+            result.extend(changed_params(subvalue, old_digests, new_digests, path + (key,)))
+    else:
+        result.append((path, value))
+    return result
+
 def master_changed(msg, cb_args):
     param_cache, local_master, __add_ns, __ignore, __only = cb_args
     local_name = ''
     if local_master:
         local_name = local_master[0]
     if msg.master.uri != masteruri_from_master() and local_name in param_cache:
-        master_to = rospy.MasterProxy(masteruri_from_master())
         master_from = rospy.MasterProxy(msg.master.uri)
         rospy.logdebug("Getting params from {}...".format(msg.master.uri))
         params_from = master_from.getParam('/')[2]
@@ -29,7 +78,7 @@ def master_changed(msg, cb_args):
             except Exception:
                 pass
         if __only:
-            for key in params_from.keys():
+            for key in list(params_from.keys()):
                 if key not in __only:
                     del params_from[key]
         rospy.logdebug("Syncing params from {} to {}...".format(msg.master.name, local_name))
@@ -38,11 +87,22 @@ def master_changed(msg, cb_args):
         else:
             _ns = ''
         rospy.logdebug("Got {} params.".format(len(params_from)))
-        if param_cache.get(_ns, None) != params_from:
-            param_cache[_ns] = params_from
+        # compare the digests of the subtrees with the last synchronized parameter
+        digests = param_digests(params_from)
+        old_digests = param_cache.get(_ns, {})
+        if old_digests.get((), None) != digests[()]:
+            param_cache[_ns] = digests
+            changes = []
             for key, value in params_from.items():
-                master_to.setParam('/'+_ns+key, value)
-            rospy.logdebug("Done syncing params from {} to {}.".format(msg.master.name, local_name))
+                changes.extend(changed_params(value, old_digests, digests, (key,)))
+            # write all changed parameter at once
+            master_multi = xmlrpcclient.MultiCall(xmlrpcclient.ServerProxy(masteruri_from_master()))
+            for path, value in changes:
+                master_multi.setParam(rospy.get_name(), '/' + _ns + '/'.join(path), value)
+            for (path, _value), (code, status_msg, _result) in zip(changes, master_multi()):
+                if code != 1:
+                    rospy.logwarn("Can not set param {}: {}".format('/' + _ns + '/'.join(path), status_msg))
+            rospy.logdebug("Done syncing {} changed params from {} to {}.".format(len(changes), msg.master.name, local_name))
         else:
             rospy.logdebug("Params have not changed from {} to {}.".format(msg.master.name, local_name))
     else:
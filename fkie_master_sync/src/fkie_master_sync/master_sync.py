@@ -32,6 +32,8 @@
 
 
 
+import os
+import rospkg
 import socket
 import threading
 import time
@@ -50,6 +52,9 @@ from fkie_master_discovery.common import masteruri_from_master, resolve_url, rea
 from fkie_master_discovery.master_info import MasterInfo
 import fkie_master_discovery.interface_finder as interface_finder
 
+from .publisher_update import PublisherUpdateDispatcher
+from .resync_controller import ResyncController
+from .sync_scheduler import SyncScheduler
 from .sync_thread import SyncThread
 
 
@@ -59,6 +64,25 @@ class Main(object):
 
     UPDATE_INTERVALL = 30
 
+    SYNC_THREADS = 4
+    '''@ivar: the count of threads executing the synchronization jobs of all masters (Default: 4). It can be changed by C{~sync_threads} parameter.'''
+
+    REGISTRATION_JOURNAL = True
+    '''@ivar: stores the registrations for each synchronized master in ROS home to unregister the outdated
+    registrations after a restart of master_sync (Default: True). It can be changed by C{~registration_journal} parameter.'''
+
+    RESYNC_RATE = 1.
+    '''@ivar: the count of resyncs per second of the synchronized masters after a remote master_sync was
+    stopped (Default: 1.0). It can be changed by C{~resync_rate} parameter.'''
+
+    RESYNC_BURST = 5
+    '''@ivar: the count of resyncs executed without limitation by C{~resync_rate} (Default: 5).
+    It can be changed by C{~resync_burst} parameter.'''
+
+    RESYNC_JITTER = 0.05
+    '''@ivar: the maximal random delay in seconds for each synchronized master, to spread the resyncs and
+    updates of all hosts in a big fleet (Default: 0.05). It can be changed by C{~resync_jitter} parameter.'''
+
     def __init__(self):
         '''
         Creates a new instance. Find the topic of the master_discovery node using
@@ -85,11 +109,18 @@ class Main(object):
             self.sub_changes[topic_name] = rospy.Subscriber(topic_name, MasterState, self._rosmsg_callback_master_state)
         self.__timestamp_local = None
         self.__own_state = None
-        self.update_timer = None
-        self.resync_timer = None
         self.own_state_getter = None
-        self._timer_update_diagnostics = None
-        self._join_threads = dict()  # threads waiting for stopping the sync thread
+        self._join_threads = dict()  # sync threads waiting for stopping
+        # executes the jobs of all sync threads and the periodic jobs of this class
+        self._scheduler = SyncScheduler(rospy.get_param('~sync_threads', self.SYNC_THREADS))
+        self._registration_journal = rospy.get_param('~registration_journal', self.REGISTRATION_JOURNAL)
+        # limits the resyncs of all sync threads
+        self._resync_controller = ResyncController(self._scheduler,
+                                                   rospy.get_param('~resync_rate', self.RESYNC_RATE),
+                                                   rospy.get_param('~resync_burst', self.RESYNC_BURST),
+                                                   rospy.get_param('~resync_jitter', self.RESYNC_JITTER))
+        # sends publisherUpdate to local subscribers for all sync threads
+        self._publisher_update = PublisherUpdateDispatcher()
         # initialize the ROS services
         rospy.Service('~get_sync_info', GetSyncInfo, self._rosservice_get_sync_info)
         rospy.on_shutdown(self.finish)
@@ -114,11 +145,18 @@ class Main(object):
                     m = data.master
                     self.update_master(m.name, m.uri, m.last_change.to_sec(), m.last_change_local.to_sec(), m.discoverer_name, m.monitoruri, m.online)
 
+    def _get_journal_path(self, mastername):
+        '''
+        @return: the file to store the registrations of the given master or C{None}, if disabled by C{~registration_journal}.
+        @rtype: C{str}
+        '''
+        if not self._registration_journal:
+            return None
+        filename = '%s_%s.json' % (rospy.get_name().strip('/').replace('/', '_'), mastername.replace('/', '_'))
+        return os.path.join(rospkg.get_ros_home(), 'master_sync', filename)
+
     def _callback_perform_resync(self):
-        if self.resync_timer is not None:
-            self.resync_timer.cancel()
-        self.resync_timer = threading.Timer(0.1, self._perform_resync)
-        self.resync_timer.start()
+        self._scheduler.schedule(('resync',), self._perform_resync, delay=0.1, max_postpone=10)
 
     def obtain_masters(self):
         '''
@@ -153,8 +191,9 @@ class Main(object):
                     rospy.logwarn("ERROR while initial list masters: %s", traceback.format_exc())
                 finally:
                     socket.setdefaulttimeout(None)
-            self.update_timer = threading.Timer(self.UPDATE_INTERVALL, self.obtain_masters)
-            self.update_timer.start()
+            self._scheduler.schedule(('obtain_masters',), self.obtain_masters, delay=self.UPDATE_INTERVALL, priority=SyncScheduler.PRIORITY_LOW)
+            # publish the state of the scheduler
+            self._scheduler.schedule(('diagnostics',), self._update_diagnostics_state, (True,), priority=SyncScheduler.PRIORITY_LOW)
 
     def update_master(self, mastername, masteruri, timestamp, timestamp_local, discoverer_name, monitoruri, online):
         '''
@@ -187,19 +226,19 @@ class Main(object):
                                     # updates only, if local changes are occured
                                 self.masters[mastername].update(mastername, masteruri, discoverer_name, monitoruri, timestamp_local)
                             else:
-                                self.masters[mastername] = SyncThread(mastername, masteruri, discoverer_name, monitoruri, 0.0, self.__sync_topics_on_demand, callback_resync=self._callback_perform_resync)
+                                self.masters[mastername] = SyncThread(mastername, masteruri, discoverer_name, monitoruri, 0.0, self.__sync_topics_on_demand, callback_resync=self._callback_perform_resync, publisher_update=self._publisher_update, scheduler=self._scheduler, journal_path=self._get_journal_path(mastername), resync_controller=self._resync_controller)
+                                self._resync_controller.set_fleet_size(len(self.masters))
                                 if self.__own_state is not None:
                                     self.masters[mastername].set_own_masterstate(MasterInfo.from_list(self.__own_state))
                                 self.masters[mastername].update(mastername, masteruri, discoverer_name, monitoruri, timestamp_local)
                 elif self.__timestamp_local != timestamp_local:  # self.__sync_topics_on_demand:
                     # get the master info from local discovery master and set it to all sync threads
                     self._localname = mastername
-                    self.own_state_getter = threading.Thread(target=self.get_own_state, args=(monitoruri,))
-                    self.own_state_getter.start()
-                if self._timer_update_diagnostics is None or not self._timer_update_diagnostics.is_alive():
+                    self.own_state_getter = ('own_state',)
+                    self._scheduler.schedule(self.own_state_getter, self.get_own_state, (monitoruri,), priority=SyncScheduler.PRIORITY_HIGH)
+                if not self._scheduler.is_pending(('diagnostics',)):
                     # check for topics type and checksum for all hosts. Not blocking!
-                    self._timer_update_diagnostics = threading.Thread(target=self._update_diagnostics_state)
-                    self._timer_update_diagnostics.start()
+                    self._scheduler.schedule(('diagnostics',), self._update_diagnostics_state, priority=SyncScheduler.PRIORITY_LOW)
         except:
             import traceback
             rospy.logwarn("ERROR while update master[%s]: %s", str(mastername), traceback.format_exc())
@@ -207,7 +246,7 @@ class Main(object):
     def get_own_state(self, monitoruri):
         '''
         Gets the master info from local master discovery and set it to all sync threads.
-        This function is running in a thread!!!
+        This function is running in a thread of the scheduler!!!
         '''
         try:
             socket.setdefaulttimeout(3)
@@ -224,10 +263,8 @@ class Main(object):
             import traceback
             rospy.logwarn("ERROR while getting own state from '%s': %s", monitoruri, traceback.format_exc())
             socket.setdefaulttimeout(None)
-            time.sleep(3)
             if self.own_state_getter is not None and not rospy.is_shutdown():
-                self.own_state_getter = threading.Thread(target=self.get_own_state, args=(monitoruri,))
-                self.own_state_getter.start()
+                self._scheduler.schedule(self.own_state_getter, self.get_own_state, (monitoruri,), delay=3., priority=SyncScheduler.PRIORITY_HIGH)
 
     def remove_master(self, ros_master_name):
         '''
@@ -239,10 +276,11 @@ class Main(object):
             with self.__lock:
                 if ros_master_name in self.masters:
                     m = self.masters.pop(ros_master_name)
+                    self._resync_controller.remove(ros_master_name)
+                    self._resync_controller.set_fleet_size(len(self.masters))
                     ident = uuid.uuid4()
-                    thread = threading.Thread(target=self._threading_stop_sync, args=(m, ident))
-                    self._join_threads[ident] = thread
-                    thread.start()
+                    self._join_threads[ident] = m
+                    self._scheduler.schedule(('stop', ident), self._threading_stop_sync, (m, ident), priority=SyncScheduler.PRIORITY_HIGH)
         except Exception:
             import traceback
             rospy.logwarn("ERROR while removing master[%s]: %s", ros_master_name, traceback.format_exc())
@@ -264,14 +302,13 @@ class Main(object):
         with self.__lock:
             # stop update timer
             rospy.loginfo("  Stop timers...")
-            if self.update_timer is not None:
-                self.update_timer.cancel()
-            if self.resync_timer is not None:
-                self.resync_timer.cancel()
+            self._scheduler.cancel(('obtain_masters',))
+            self._scheduler.cancel(('resync',))
             # unregister from update topics
             rospy.loginfo("  Unregister from master discovery...")
             for (_, v) in self.sub_changes.items():
                 v.unregister()
+            self._scheduler.cancel(('own_state',))
             self.own_state_getter = None
             # Stop all sync threads
             for key in self.masters.keys():
@@ -281,13 +318,14 @@ class Main(object):
         while len(self._join_threads) > 0:
             rospy.loginfo("  Wait for ending of %s threads ...", str(len(self._join_threads)))
             time.sleep(1)
+        self._publisher_update.stop()
+        self._scheduler.stop()
         rospy.loginfo("Synchronization is now off")
 
     def _perform_resync(self):
-        self.resync_timer = None
         with self.__lock:
-            for (_, s) in self.masters.items():
-                s.perform_resync()
+            # the resyncs are spread and executed by the scheduler
+            self._resync_controller.request(list(self.masters.values()))
 
     def _rosservice_get_sync_info(self, req):
         '''
@@ -347,7 +385,12 @@ class Main(object):
                 result = True
         return result
 
-    def _update_diagnostics_state(self):
+    def _update_diagnostics_state(self, force=False):
+        '''
+        Publishes the warnings about topics with different md5sum or type. The
+        diagnostics are published only if the warnings level is changed or C{force} is True.
+        The metrics of the scheduler are added to the published diagnostics.
+        '''
         md5_warnings = {}
         ttype_warnings = {}
         for mname, mth in self.masters.items():
@@ -360,7 +403,7 @@ class Main(object):
         level = 0
         if md5_warnings or ttype_warnings:
             level = 1
-        if self._current_diagnistic_level != level:
+        if self._current_diagnistic_level != level or force:
             da = DiagnosticArray()
             if md5_warnings or ttype_warnings:
                 # add warnings for all hosts with topic types with different md5sum
@@ -403,6 +446,20 @@ class Main(object):
                 diag_state.message = ""
                 diag_state.hardware_id = self.hostname
                 da.status.append(diag_state)
+            da.status.append(self._scheduler_diagnostic_status())
             da.header.stamp = rospy.Time.now()
             self.pub_diag.publish(da)
             self._current_diagnistic_level = level
+
+    def _scheduler_diagnostic_status(self):
+        diag_state = DiagnosticStatus()
+        diag_state.level = 0
+        diag_state.name = '%s/scheduler' % rospy.get_name()
+        diag_state.message = 'synchronization jobs'
+        diag_state.hardware_id = self.hostname
+        for name, value in sorted(self._scheduler.get_metrics().items()):
+            key = KeyValue()
+            key.key = name
+            key.value = str(value)
+            diag_state.values.append(key)
+        return diag_state
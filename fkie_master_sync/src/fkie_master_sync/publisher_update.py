@@ -0,0 +1,136 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import threading
+try:
+    import xmlrpclib as xmlrpcclient
+except ImportError:
+    import xmlrpc.client as xmlrpcclient
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+import rospy
+
+from fkie_master_discovery.common import TimeoutTransport
+
+
+class PublisherUpdateDispatcher(object):
+    '''
+    Sends C{publisherUpdate} to the subscribers of synchronized topics in parallel
+    threads. All updates for the same node are sent by the same thread, which
+    reuses the connection to the node. If a new update for the same node and
+    topic is added before the previous one was sent, only the last publisher
+    list is sent.
+    '''
+
+    MAX_PROXIES = 256
+    '''@ivar: maximal count of cached connections for each thread'''
+
+    def __init__(self, num_workers=4, timeout=3.0):
+        '''
+        @param num_workers: the count of threads sending the updates
+        @type num_workers:  C{int}
+        @param timeout: the timeout for each publisherUpdate call in seconds
+        @type timeout:  C{float}
+        '''
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # (api, topic) : (publisher uris, log prefix)
+        self._pending = {}
+        self._queues = []
+        self._stopped = False
+        for idx in range(max(1, num_workers)):
+            queue = Queue()
+            self._queues.append(queue)
+            worker = threading.Thread(target=self._run, args=(queue,), name='publisher_update_%d' % idx)
+            worker.setDaemon(True)
+            worker.start()
+
+    def update(self, api, topic, publisher_uris, log_prefix=''):
+        '''
+        Adds a publisherUpdate call for given node.
+        @param api: XML-RPC URI of the subscribed node
+        @type api:  C{str}
+        @param topic: the name of the topic
+        @type topic:  C{str}
+        @param publisher_uris: the list with URIs of all publishers of the topic
+        @type publisher_uris:  C{[str]}
+        @param log_prefix: the prefix used for log messages
+        @type log_prefix:  C{str}
+        '''
+        key = (api, topic)
+        with self._lock:
+            if self._stopped:
+                return
+            is_queued = key in self._pending
+            self._pending[key] = (publisher_uris, log_prefix)
+            if not is_queued:
+                self._queues[hash(api) % len(self._queues)].put(key)
+
+    def stop(self):
+        '''
+        Stops all threads. Not sent updates are discarded.
+        '''
+        with self._lock:
+            self._stopped = True
+            self._pending.clear()
+            for queue in self._queues:
+                queue.put(None)
+
+    def _run(self, queue):
+        proxies = {}
+        while True:
+            key = queue.get()
+            if key is None:
+                break
+            with self._lock:
+                try:
+                    pub_uris, log_prefix = self._pending.pop(key)
+                except KeyError:
+                    continue
+            api, topic = key
+            msg = "%s publisherUpdate[%s] -> node: %s, publisher uris: %s" % (log_prefix, topic, api, pub_uris)
+            try:
+                pub_client = proxies.get(api, None)
+                if pub_client is None:
+                    if len(proxies) >= self.MAX_PROXIES:
+                        proxies.clear()
+                    pub_client = xmlrpcclient.ServerProxy(api, transport=TimeoutTransport(self.timeout))
+                    proxies[api] = pub_client
+                ret = pub_client.publisherUpdate('/master', topic, pub_uris)
+                rospy.logdebug("%s: result=%s", msg, ret)
+            except Exception as ex:
+                proxies.pop(api, None)
+                rospy.logwarn("%s: exception=%s", msg, ex)
@@ -0,0 +1,135 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import threading
+import time
+import traceback
+try:
+    import xmlrpclib as xmlrpcclient
+except ImportError:
+    import xmlrpc.client as xmlrpcclient
+
+import rospy
+
+from fkie_master_discovery.common import TimeoutTransport
+
+
+class RegistrationEngine(object):
+    '''
+    Executes the registration calls of a L{SyncThread} at the local ROS master.
+    Instead of one MultiCall with all calls, the calls are split into chunks of
+    L{CHUNK_SIZE} calls. The chunks are sent one after the other over the same
+    connection, so the ROS master can answer the requests of other nodes between
+    the chunks. Calls of chunks failed by a connection error and calls returned
+    as XML-RPC fault are retried up to L{RETRIES} times.
+    '''
+
+    CHUNK_SIZE = 100
+    '''@ivar: the maximal count of calls in one MultiCall request.'''
+    RETRIES = 2
+    '''@ivar: how often the failed calls are retried.'''
+    RETRY_DELAY = 0.5
+    '''@ivar: the time to wait in seconds before the first retry, it is doubled for each further retry.'''
+    TIMEOUT = 3.
+    '''@ivar: the timeout in seconds for one MultiCall request.'''
+
+    def __init__(self, masteruri, name=''):
+        '''
+        @param masteruri: the URI of the local ROS master
+        @type masteruri:  C{str}
+        @param name: the name used in the log messages
+        @type name:  C{str}
+        '''
+        self.masteruri = masteruri
+        self.name = name
+        self._lock = threading.RLock()
+        self._proxy = None
+
+    def execute(self, calls):
+        '''
+        Executes the calls and returns their results in the same order.
+        @param calls: the list with C{(method name, arguments)}, e.g. C{('registerPublisher', (node, topic, topictype, nodeuri))}
+        @type calls:  C{[(str, tuple)]}
+        @return: the result for each call as returned by ROS master C{(code, status message, value)}.
+                 For calls failed after all retries the code is C{-1}.
+        @rtype: C{[(int, str, object)]}
+        '''
+        results = [None] * len(calls)
+        errors = {}
+        pending = list(range(len(calls)))
+        with self._lock:
+            for attempt in range(self.RETRIES + 1):
+                if attempt > 0:
+                    if not pending or rospy.is_shutdown():
+                        break
+                    rospy.logdebug("RegistrationEngine[%s]: retry %d of %d failed calls", self.name, len(pending), len(calls))
+                    time.sleep(self.RETRY_DELAY * (2 ** (attempt - 1)))
+                failed = []
+                for idx in range(0, len(pending), self.CHUNK_SIZE):
+                    chunk = pending[idx:idx + self.CHUNK_SIZE]
+                    failed.extend(self._execute_chunk(calls, chunk, results, errors))
+                pending = failed
+        for idx in pending:
+            method, args = calls[idx]
+            rospy.logwarn("RegistrationEngine[%s]: %s%s failed: %s", self.name, method, args[:2], errors[idx])
+            results[idx] = (-1, errors[idx], [])
+        return results
+
+    def _execute_chunk(self, calls, chunk, results, errors):
+        # executes the calls with given indexes as one MultiCall. Returns the indexes of failed calls.
+        try:
+            multi = xmlrpcclient.MultiCall(self._get_proxy())
+            for idx in chunk:
+                method, args = calls[idx]
+                getattr(multi, method)(*args)
+            mresult = multi()
+        except Exception as err:
+            # the connection will be created again
+            self._proxy = None
+            rospy.logdebug("RegistrationEngine[%s]: MultiCall with %d calls failed: %s", self.name, len(chunk), traceback.format_exc())
+            for idx in chunk:
+                errors[idx] = str(err)
+            return chunk
+        failed = []
+        for pos, idx in enumerate(chunk):
+            try:
+                results[idx] = mresult[pos]
+            except xmlrpcclient.Fault as fault:
+                errors[idx] = str(fault)
+                failed.append(idx)
+        return failed
+
+    def _get_proxy(self):
+        if self._proxy is None:
+            self._proxy = xmlrpcclient.ServerProxy(self.masteruri, transport=TimeoutTransport(self.TIMEOUT))
+        return self._proxy
@@ -0,0 +1,203 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import json
+import os
+import threading
+
+import rospy
+
+
+class RegistrationJournal(object):
+    '''
+    Stores the registrations done by a L{SyncThread} at the local ROS master. The
+    entries are keyed by C{(kind, name, node)} and store the arguments of the
+    registration. Each update of the remote state starts a new generation by
+    L{begin()}. All entries touched by L{touch()} belong to this generation. The
+    entries of older generations are no longer in the remote state and are
+    returned by L{finish()} to unregister them. The changes are applied by
+    L{commit()} after the calls were executed at the ROS master. The entries of
+    failed calls keep their previous state, so they are sent again on next update.
+
+    If a file is given, the journal is stored after each commit. A restarted
+    master_sync loads the entries registered by the previous instance. These are
+    registered again on the first update and the entries not in the remote state
+    anymore are unregistered.
+    '''
+
+    PUBLISHER = 'pub'
+    SUBSCRIBER = 'sub'
+    SERVICE = 'srv'
+
+    def __init__(self, path=None):
+        '''
+        @param path: the file to store the journal or C{None} to keep it only in memory
+        @type path:  C{str}
+        '''
+        self._lock = threading.RLock()
+        self._path = path
+        self.generation = 0
+        # {(kind, name, node): [arguments, generation]}
+        self._entries = {}
+        # the entries touched in the current generation: {(kind, name, node): arguments}
+        self._touched = {}
+        # the keys of entries loaded from the file, which are not registered by this instance
+        self._recovered = set()
+        self._changed = False
+        self._load()
+
+    def begin(self):
+        '''
+        Starts a new generation.
+        '''
+        with self._lock:
+            self.generation += 1
+            self._touched = {}
+
+    def touch(self, kind, name, node, args):
+        '''
+        Marks the entry as part of the current generation.
+        @param kind: one of L{PUBLISHER}, L{SUBSCRIBER} or L{SERVICE}
+        @param name: the name of the topic or service
+        @param node: the name of the node
+        @param args: the arguments of the registration, e.g. C{(topic, topictype, node, nodeuri)}
+        @type args:  C{tuple}
+        @return: C{(register, old)}: C{register} is C{True} if the entry has to be registered,
+                 C{old} are the arguments to unregister before or C{None}.
+        @rtype: C{(bool, tuple)}
+        '''
+        key = (kind, name, node)
+        with self._lock:
+            self._touched[key] = args
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return (True, None)
+            old = entry[0] if entry[0] != args else None
+            if key in self._recovered:
+                # registered by the previous instance, the local ROS master could be restarted since then
+                return (True, old)
+            return (old is not None, old)
+
+    def finish(self):
+        '''
+        @return: the entries not touched in the current generation as list of C{(key, arguments)}.
+                 They are removed by L{commit()}.
+        @rtype: C{[((str, str, str), tuple)]}
+        '''
+        with self._lock:
+            return [(key, args) for key, (args, _generation) in self._entries.items() if key not in self._touched]
+
+    def commit(self, failed=()):
+        '''
+        Applies the changes of the current generation and stores the journal.
+        @param failed: the keys C{(kind, name, node)} of the entries with failed calls.
+                       These entries keep their previous state.
+        @type failed:  C{set}
+        '''
+        with self._lock:
+            for key in set(self._entries.keys()) | set(self._touched.keys()):
+                if key in failed:
+                    continue
+                args = self._touched.get(key, None)
+                entry = self._entries.get(key, None)
+                if args is None:
+                    del self._entries[key]
+                    self._changed = True
+                elif entry is None or entry[0] != args:
+                    self._entries[key] = [args, self.generation]
+                    self._changed = True
+                else:
+                    entry[1] = self.generation
+                self._recovered.discard(key)
+            self._touched = {}
+            self._save()
+
+    def registrations(self, kind):
+        '''
+        @return: the arguments of all registrations of given kind
+        @rtype: C{[tuple]}
+        '''
+        with self._lock:
+            return [args for (k, _name, _node), (args, _generation) in self._entries.items() if k == kind]
+
+    def digest(self):
+        '''
+        @return: the digest of all registrations. It does not depend on the order of the entries.
+        @rtype: C{int}
+        '''
+        with self._lock:
+            return hash(frozenset((key, args) for key, (args, _generation) in self._entries.items()))
+
+    def clear(self):
+        '''
+        Removes all entries, e.g. after they were unregistered.
+        '''
+        with self._lock:
+            self._changed = self._changed or bool(self._entries)
+            self._entries.clear()
+            self._touched = {}
+            self._recovered.clear()
+            self._save()
+
+    def _load(self):
+        if self._path is None or not os.path.isfile(self._path):
+            return
+        try:
+            with open(self._path, 'r') as journal_file:
+                for kind, name, node, args in json.load(journal_file):
+                    key = (kind, name, node)
+                    self._entries[key] = [tuple(args), self.generation]
+                    self._recovered.add(key)
+            if self._entries:
+                rospy.loginfo("RegistrationJournal: %d registrations of previous run loaded from %s", len(self._entries), self._path)
+        except Exception as err:
+            rospy.logwarn("RegistrationJournal: can not load %s: %s", self._path, err)
+
+    def _save(self):
+        if self._path is None or not self._changed:
+            return
+        self._changed = False
+        try:
+            if not self._entries:
+                if os.path.isfile(self._path):
+                    os.remove(self._path)
+                return
+            dirname = os.path.dirname(self._path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            tmp_path = '%s.tmp' % self._path
+            with open(tmp_path, 'w') as journal_file:
+                json.dump([[kind, name, node, list(args)] for (kind, name, node), (args, _generation) in self._entries.items()], journal_file)
+            os.rename(tmp_path, self._path)
+        except Exception as err:
+            rospy.logwarn("RegistrationJournal: can not store %s: %s", self._path, err)
@@ -0,0 +1,136 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import random
+import threading
+import time
+
+import rospy
+
+from .sync_scheduler import SyncScheduler
+
+
+class ResyncController(object):
+    '''
+    Limits the resynchronizations of all L{SyncThread} instances. If a master
+    restarts, all peers request a resync at the same time. To avoid a load peak
+    on the local ROS master and on the remote master_discovery, the resyncs are
+    limited by a token bucket with L{rate} resyncs per second and a burst of
+    L{burst} resyncs. Each resync is delayed additionally by a random time up to
+    C{jitter} seconds for each known master, so the peers of a big fleet do not
+    resync at the same time. Masters with registrations changed since their last
+    resync get the tokens first and are executed with the priority of the update
+    jobs. The other masters are resynchronized with low priority.
+    '''
+
+    def __init__(self, scheduler, rate=1., burst=5, jitter=0.05):
+        '''
+        @param scheduler: the scheduler executing the resync jobs
+        @type scheduler: L{SyncScheduler}
+        @param rate: the count of resyncs per second added to the bucket
+        @type rate:  C{float}
+        @param burst: the maximal count of resyncs executed without delay
+        @type burst:  C{int}
+        @param jitter: the maximal random delay in seconds for each known master
+        @type jitter:  C{float}
+        '''
+        self._scheduler = scheduler
+        self.rate = max(0.001, float(rate))
+        self.burst = max(1, int(burst))
+        self.jitter = max(0., float(jitter))
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._last_refill = time.time()
+        self._fleet_size = 0
+        # {master name: digest of the registrations on last resync}
+        self._resynced = {}
+
+    def set_fleet_size(self, count):
+        '''
+        @param count: the count of currently synchronized masters
+        @type count:  C{int}
+        '''
+        self._fleet_size = count
+
+    def get_delay(self, minimum=0.):
+        '''
+        @return: a random delay proportional to the count of synchronized masters,
+                 but at least up to C{minimum} seconds.
+        @rtype: C{float}
+        '''
+        return random.random() * max(minimum, self.jitter * self._fleet_size)
+
+    def request(self, sync_threads):
+        '''
+        Schedules the resync of given sync threads. The threads with a pending
+        resync are skipped.
+        @param sync_threads: the list of threads to resynchronize
+        @type sync_threads:  C{[L{SyncThread}]}
+        '''
+        jobs = []
+        for sync_thread in sync_threads:
+            key = ('resync', sync_thread.name)
+            if self._scheduler.is_pending(key):
+                continue
+            digest = sync_thread.state_digest()
+            changed = self._resynced.get(sync_thread.name, None) != digest
+            jobs.append((not changed, key, sync_thread, digest))
+        # changed masters get the tokens first
+        jobs.sort(key=lambda job: job[0])
+        for unchanged, key, sync_thread, digest in jobs:
+            delay = self._reserve() + self.get_delay()
+            priority = SyncScheduler.PRIORITY_LOW if unchanged else SyncScheduler.PRIORITY_NORMAL
+            rospy.logdebug("ResyncController: resync %s in %.2f sec, changed: %s", sync_thread.name, delay, not unchanged)
+            self._scheduler.schedule(key, self._resync, (sync_thread, digest), delay=delay, priority=priority)
+
+    def remove(self, name):
+        '''
+        Cancels the pending resync and removes the digest of the master with given name.
+        '''
+        self._scheduler.cancel(('resync', name))
+        self._resynced.pop(name, None)
+
+    def _reserve(self):
+        # takes a token from the bucket and returns the time to wait for it
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1.
+            if self._tokens >= 0:
+                return 0.
+            return -self._tokens / self.rate
+
+    def _resync(self, sync_thread, digest):
+        sync_thread.perform_resync()
+        self._resynced[sync_thread.name] = digest
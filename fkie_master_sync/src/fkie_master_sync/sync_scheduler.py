@@ -0,0 +1,214 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+
+import heapq
+import threading
+import time
+import traceback
+
+import rospy
+
+
+class SyncScheduler(object):
+    '''
+    Executes the jobs of all L{SyncThread} instances and of the L{Main} by a fixed
+    count of worker threads. Each job has a key. Only one job with the same key
+    is pending and jobs with the same key are never executed in parallel. A job
+    added while another job with the same key is running is executed after the
+    running one has finished. Ready jobs are executed by their priority.
+    '''
+
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 10
+    PRIORITY_LOW = 20
+
+    def __init__(self, num_workers=4):
+        '''
+        @param num_workers: the count of threads executing the jobs
+        @type num_workers:  C{int}
+        '''
+        self._cond = threading.Condition()
+        self._seq = 0
+        # key: [due time, priority, seq, func, args, postpone count]
+        self._pending = {}
+        # heap with (due time, seq, key) of pending jobs
+        self._delayed = []
+        # heap with (priority, due time, seq, key) of jobs which are due
+        self._ready = []
+        self._running = set()
+        self._stopped = False
+        # metrics
+        self._executed = 0
+        self._latency_sum = 0.
+        self._latency_max = 0.
+        self._duration_sum = 0.
+        self._workers = []
+        for idx in range(max(1, num_workers)):
+            worker = threading.Thread(target=self._run, name='sync_worker_%d' % idx)
+            worker.setDaemon(True)
+            self._workers.append(worker)
+            worker.start()
+
+    def schedule(self, key, func, args=(), delay=0., priority=PRIORITY_NORMAL, max_postpone=0):
+        '''
+        Adds a job. If a job with the same key is already pending, the new job
+        replaces it. By default the pending job keeps its earlier due time. If
+        C{max_postpone} is greater than zero, the due time is reset to the new
+        delay up to C{max_postpone} times, to collect more requests into one job.
+        @param key: the unique key of the job
+        @type key:  hashable
+        @param func: the method to execute
+        @param args: the arguments of the method
+        @type args:  C{tuple}
+        @param delay: the job is executed after this time in seconds
+        @type delay:  C{float}
+        @param priority: ready jobs with lower value are executed first
+        @type priority:  C{int}
+        @param max_postpone: how many times the pending job can be postponed
+        @type max_postpone:  C{int}
+        '''
+        with self._cond:
+            if self._stopped:
+                return
+            now = time.time()
+            due = now + delay
+            postponed = 0
+            job = self._pending.get(key, None)
+            if job is not None:
+                postponed = job[5]
+                if postponed < max_postpone:
+                    postponed += 1
+                else:
+                    due = min(due, job[0])
+                priority = min(priority, job[1])
+            self._seq += 1
+            self._pending[key] = [due, priority, self._seq, func, args, postponed]
+            heapq.heappush(self._delayed, (due, self._seq, key))
+            self._cond.notify()
+
+    def cancel(self, key):
+        '''
+        Removes the pending job with given key. A running job is not affected.
+        '''
+        with self._cond:
+            self._pending.pop(key, None)
+
+    def is_pending(self, key):
+        with self._cond:
+            return key in self._pending
+
+    def get_metrics(self):
+        '''
+        @return: the current count of pending and running jobs, the count of
+        executed jobs, average and maximal time in seconds between due time and
+        start of the jobs and the average execution time.
+        @rtype: C{dict}
+        '''
+        with self._cond:
+            executed = self._executed
+            return {'queue_depth': len(self._pending),
+                    'running': len(self._running),
+                    'executed': executed,
+                    'latency_avg': self._latency_sum / executed if executed else 0.,
+                    'latency_max': self._latency_max,
+                    'duration_avg': self._duration_sum / executed if executed else 0.}
+
+    def stop(self):
+        '''
+        Discards all pending jobs and stops the worker threads after the running jobs.
+        '''
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def _is_current(self, seq, key):
+        job = self._pending.get(key, None)
+        return job is not None and job[2] == seq
+
+    def _next_job(self):
+        # returns the next job to execute or None if the scheduler is stopped
+        with self._cond:
+            while not self._stopped:
+                now = time.time()
+                # move due jobs into the ready queue
+                while self._delayed and self._delayed[0][0] <= now:
+                    due, seq, key = heapq.heappop(self._delayed)
+                    if self._is_current(seq, key):
+                        heapq.heappush(self._ready, (self._pending[key][1], due, seq, key))
+                blocked = []
+                job = None
+                while self._ready:
+                    entry = heapq.heappop(self._ready)
+                    _priority, _due, seq, key = entry
+                    if not self._is_current(seq, key):
+                        continue
+                    if key in self._running:
+                        # wait until the running job with the same key is finished
+                        blocked.append(entry)
+                        continue
+                    job = (key, self._pending.pop(key))
+                    self._running.add(key)
+                    break
+                for entry in blocked:
+                    heapq.heappush(self._ready, entry)
+                if job is not None:
+                    return job
+                timeout = None
+                if self._delayed:
+                    timeout = max(0., self._delayed[0][0] - now)
+                self._cond.wait(timeout)
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                break
+            key, (due, _priority, _seq, func, args, _postponed) = job
+            start = time.time()
+            try:
+                func(*args)
+            except Exception:
+                rospy.logerr("SyncScheduler: error in job %s: %s", key, traceback.format_exc())
+            finally:
+                end = time.time()
+                with self._cond:
+                    self._running.discard(key)
+                    latency = max(0., start - due)
+                    self._executed += 1
+                    self._latency_sum += latency
+                    self._latency_max = max(self._latency_max, latency)
+                    self._duration_sum += end - start
+                    # a blocked job with the same key can be executed now
+                    self._cond.notify_all()
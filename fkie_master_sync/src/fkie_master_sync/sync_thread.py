@@ -33,8 +33,6 @@
 
 
 import random
-import roslib
-import roslib.message
 import socket
 import threading
 import time
@@ -47,8 +45,14 @@ except ImportError:
 from fkie_multimaster_msgs.msg import SyncTopicInfo, SyncServiceInfo, SyncMasterInfo
 import rospy
 
-from fkie_master_discovery.common import masteruri_from_ros, get_hostname
+from fkie_master_discovery.common import masteruri_from_ros, get_hostname, get_message_md5sum, TimeoutTransport
 from fkie_master_discovery.filter_interface import FilterInterface
+from fkie_master_discovery.state_client import MasterStateClient
+
+from .publisher_update import PublisherUpdateDispatcher
+from .registration_engine import RegistrationEngine
+from .registration_journal import RegistrationJournal
+from .sync_scheduler import SyncScheduler
 
 
 class SyncThread(object):
@@ -62,7 +66,10 @@ class SyncThread(object):
 
     MSG_ANY_TYPE = '*'
 
-    def __init__(self, name, uri, discoverer_name, monitoruri, timestamp, sync_on_demand=False, callback_resync=None):
+    MD5_TIMEOUT = 20.
+    '''@ivar: the timeout in seconds to get the md5sums from remote master_discovery.'''
+
+    def __init__(self, name, uri, discoverer_name, monitoruri, timestamp, sync_on_demand=False, callback_resync=None, publisher_update=None, scheduler=None, journal_path=None, resync_controller=None):
         '''
         Initialization method for the SyncThread.
         @param name: the name of the ROS master synchronized with.
@@ -77,6 +84,20 @@ class SyncThread(object):
         @type timestamp:  C{float64}
         @param sync_on_demand: Synchronize topics on demand
         @type sync_on_demand: bool
+        @param publisher_update: the dispatcher shared by all sync threads to send publisherUpdate to the local subscribers.
+                                 If None, an own dispatcher is created.
+        @type publisher_update: L{PublisherUpdateDispatcher}
+        @param scheduler: the scheduler shared by all sync threads to execute the update requests.
+                          If None, an own scheduler is created.
+        @type scheduler: L{SyncScheduler}
+        @param journal_path: the file to store the registrations at the local ROS master. A restarted
+                             master_sync unregisters the entries not in the remote state anymore.
+                             If None, the registrations are kept only in memory.
+        @type journal_path: C{str}
+        @param resync_controller: the controller to determine the delay of the update requests
+                                  depending on the count of synchronized masters. If None, the
+                                  updates are delayed for maximal two seconds.
+        @type resync_controller: L{ResyncController}
         '''
         self.name = name
         self.uri = uri
@@ -94,23 +115,27 @@ class SyncThread(object):
         # synchronization variables
         self.__lock_info = threading.RLock()
         self.__lock_intern = threading.RLock()
-        self._use_filtered_method = None
+        # the remote state is applied by update timer or by state subscription
+        self.__lock_apply = threading.RLock()
+        # requests only the changes of the remote state, if supported by remote master_discovery
+        self._state_client = MasterStateClient(monitoruri)
         self._use_md5check_topics = None
         self._md5warnings = {}  # ditionary of {(topicname, node, nodeuri) : (topictype, md5sum)}
         self._topic_type_warnings = {}  # ditionary of {(topicname, node, nodeuri) : remote topictype}
         # SyncMasterInfo with currently synchronized nodes, publisher (topic, node, nodeuri), subscriber(topic, node, nodeuri) and services
         self.__sync_info = None
         self.__unregistered = False
-        # a list with published topics as a tuple of (topic name, node name, node URL)
-        self.__publisher = []
-        # a list with subscribed topics as a tuple of (topic name, node name, node URL)
-        self.__subscriber = []
-        # a list with services as a tuple of (service name, service URL, node name, node URL)
-        self.__services = []
+        # the registrations at the local ROS master: published and subscribed topics as a tuple of
+        # (topic name, topic type, node name, node URL), services as a tuple of (service name, service URL, node name, node URL)
+        self._journal = RegistrationJournal(journal_path)
+        # executes the registration calls at the local ROS master in chunks
+        self._registration = RegistrationEngine(self.masteruri_local, self.name)
         # the state of the own ROS master is used if `sync_on_demand` is enabled or
         # to determine the type of topic subscribed remote with `Empty` type
         self.__own_state = None
         self.__callback_resync = callback_resync
+        self._own_publisher_update = publisher_update is None
+        self._publisher_update = PublisherUpdateDispatcher() if publisher_update is None else publisher_update
         self.__has_remove_sync = False
 
         # setup the filter
@@ -124,12 +149,17 @@ class SyncThread(object):
                           [], [],
                           [])
 
-        # congestion avoidance: wait for random.random*2 sec. If an update request
-        # is received try to cancel and restart the current timer. The timer can be
-        # canceled for maximal MAX_UPDATE_DELAY times.
-        self._update_timer = None
-        self._delayed_update = 0
-        self.__on_update = False
+        # congestion avoidance: wait for random.random*2 sec, in big fleets up to the
+        # delay of the resync controller. If an update request
+        # is received while the job is pending, the job is postponed for maximal
+        # MAX_UPDATE_DELAY times.
+        self._own_scheduler = scheduler is None
+        self._scheduler = SyncScheduler(1) if scheduler is None else scheduler
+        self._resync_controller = resync_controller
+        self._update_job = ('update', self.name, id(self))
+        # the md5sums of all sync threads are checked in parallel by the scheduler
+        self._md5_job = ('md5', self.name, id(self))
+        self._md5_pending = []
 
     def get_sync_info(self):
         '''
@@ -143,13 +173,13 @@ class SyncThread(object):
                 result_publisher = []
                 result_subscriber = []
                 result_services = []
-                for (t_n, _t_t, n_n, n_uri) in self.__publisher:
+                for (t_n, _t_t, n_n, n_uri) in self._journal.registrations(RegistrationJournal.PUBLISHER):
                     result_publisher.append(SyncTopicInfo(t_n, n_n, n_uri))
                     result_set.add(n_n)
-                for (t_n, _t_t, n_n, n_uri) in self.__subscriber:
+                for (t_n, _t_t, n_n, n_uri) in self._journal.registrations(RegistrationJournal.SUBSCRIBER):
                     result_subscriber.append(SyncTopicInfo(t_n, n_n, n_uri))
                     result_set.add(n_n)
-                for (s_n, s_uri, n_n, n_uri) in self.__services:
+                for (s_n, s_uri, n_n, n_uri) in self._journal.registrations(RegistrationJournal.SERVICE):
                     result_services.append(SyncServiceInfo(s_n, s_uri, n_n, n_uri))
                     result_set.add(n_n)
                 self.__sync_info = SyncMasterInfo(self.uri, list(result_set), result_publisher, result_subscriber, result_services)
@@ -163,13 +193,10 @@ class SyncThread(object):
                     offline_duration = time.time() - self._offline_ts
                     if offline_duration >= resync_on_reconnect_timeout:
                         rospy.loginfo("SyncThread[%s]: perform resync after the host was offline (unregister and register again to avoid connection losses to python topic. These does not suppot reconnection!)", self.name)
-                        if self._update_timer is not None:
-                            self._update_timer.cancel()
+                        self._scheduler.cancel(self._update_job)
                         self._unreg_on_finish()
+                        self._journal.clear()
                         self.__unregistered = False
-                        self.__publisher = []
-                        self.__subscriber = []
-                        self.__services = []
                         self.timestamp = 0.
                         self.timestamp_local = 0.
                         self.timestamp_remote = 0.
@@ -231,56 +258,58 @@ class SyncThread(object):
         '''
         rospy.logdebug("  SyncThread[%s]: stop request", self.name)
         with self.__lock_intern:
-            if self._update_timer is not None:
-                self._update_timer.cancel()
+            self._scheduler.cancel(self._update_job)
+            self._scheduler.cancel(self._md5_job)
+            self._state_client.unsubscribe()
             self._unreg_on_finish()
+            if self._own_publisher_update:
+                self._publisher_update.stop()
+            if self._own_scheduler:
+                self._scheduler.stop()
         rospy.logdebug("  SyncThread[%s]: stop exit", self.name)
 
+    def state_digest(self):
+        '''
+        @return: the digest of the current registrations at the local ROS master.
+        @rtype: C{int}
+        '''
+        return self._journal.digest()
+
     def _request_update(self):
         with self.__lock_intern:
-            r = random.random() * 2.
-            # start update timer with a random waiting time to avoid a congestion picks on changes of ROS master state
-            if self._update_timer is None or not self._update_timer.is_alive():
-                del self._update_timer
-                self._update_timer = threading.Timer(r, self._request_remote_state, args=(self._apply_remote_state,))
-                self._update_timer.start()
-            else:
-                if self._delayed_update < self.MAX_UPDATE_DELAY:
-                    # if the timer thread can be canceled start new one
-                    self._update_timer.cancel()
-                    # if callback (XMLRPC request) is already running the timer is not canceled -> test for `self.__on_update`
-                    if not self._update_timer.is_alive() or not self.__on_update:
-                        self._delayed_update += 1
-                        self._update_timer = threading.Timer(r, self._request_remote_state, args=(self._apply_remote_state,))
-                        self._update_timer.start()
+            r = self._update_delay()
+            # schedule the update with a random waiting time to avoid a congestion picks on changes of ROS master state
+            self._scheduler.schedule(self._update_job, self._request_remote_state, (self._apply_remote_state,),
+                                     delay=r, max_postpone=self.MAX_UPDATE_DELAY)
+
+    def _update_delay(self):
+        if self._resync_controller is not None:
+            return self._resync_controller.get_delay(2.)
+        return random.random() * 2.
 
     def _request_remote_state(self, handler):
-        self._delayed_update = 0
-        self.__on_update = True
         try:
             # connect to master_monitor rpc-xml server of remote master discovery
-            socket.setdefaulttimeout(20)
-            remote_monitor = xmlrpcclient.ServerProxy(self.monitoruri)
-            # determine the getting method: older versions have not a filtered method
-            if self._use_filtered_method is None:
-                try:
-                    self._use_filtered_method = 'masterInfoFiltered' in remote_monitor.system.listMethods()
-                except:
-                    self._use_filtered_method = False
-            remote_state = None
+            if self._state_client.monitoruri != self.monitoruri:
+                self._state_client.unsubscribe()
+                self._state_client = MasterStateClient(self.monitoruri)
             # get the state informations
             rospy.loginfo("SyncThread[%s] Requesting remote state from '%s'", self.name, self.monitoruri)
-            if self._use_filtered_method:
-                remote_state = remote_monitor.masterInfoFiltered(self._filter.to_list())
-            else:
-                remote_state = remote_monitor.masterInfo()
+            filter_list = self._filter.to_list()
+            remote_state = self._state_client.get_state(filter_list)
+            with self.__lock_apply:
+                if not self.__unregistered:
+                    handler(remote_state)
+            # further changes are pushed by remote master_discovery, if supported
             if not self.__unregistered:
-                handler(remote_state)
+                self._state_client.subscribe(self._on_pushed_state, filter_list)
         except:
             rospy.logerr("SyncThread[%s] ERROR: %s", self.name, traceback.format_exc())
-        finally:
-            self.__on_update = False
-            socket.setdefaulttimeout(None)
+
+    def _on_pushed_state(self, remote_state):
+        with self.__lock_apply:
+            if not self.__unregistered:
+                self._apply_remote_state(remote_state)
 
     def _apply_remote_state(self, remote_state):
         rospy.loginfo("SyncThread[%s] Applying remote state...", self.name)
@@ -296,34 +325,74 @@ class SyncThread(object):
             topicTypes = remote_state[7]
             nodeProviders = remote_state[8]
             serviceProviders = remote_state[9]
+            # create the indexes to avoid searching in lists for each topic
+            topic_types = self._index_topictypes(topicTypes)
+            node_uris = self._index_nodeuris(nodeProviders, remote_masteruri)
+            service_uris = self._index_serviceuris(serviceProviders, remote_masteruri)
 
-            # create a multicall object
-            own_master = xmlrpcclient.ServerProxy(self.masteruri_local)
-            own_master_multi = xmlrpcclient.MultiCall(own_master)
-            # fill the multicall object
+            # collect the registration calls
+            calls = []
             handler = []
-            # sync the publishers
-            publisher = []
-            publisher_to_register = []
+            # the journal key of each call
+            keys = []
             remove_sync_found = False
+            own_name = rospy.get_name()
             for (topic, nodes) in publishers:
-                for node in nodes:
-                    if node == rospy.get_name():
-                        self.__has_remove_sync = True
-                        remove_sync_found = True
-                        break
-            for (topic, nodes) in publishers:
-                for node in nodes:
-                    topictype = self._get_topictype(topic, topicTypes)
-                    nodeuri = self._get_nodeuri(node, nodeProviders, remote_masteruri)
-                    if topictype and nodeuri and not self._do_ignore_ntp(node, topic, topictype):
-                        # register the nodes only once
-                        if not ((topic, topictype, node, nodeuri) in self.__publisher):
-                            publisher_to_register.append((topic, topictype, node, nodeuri))
-                        publisher.append((topic, topictype, node, nodeuri))
+                if own_name in nodes:
+                    self.__has_remove_sync = True
+                    remove_sync_found = True
+                    break
+            if self.__unregistered:
+                return
+            # determine the changes against the registrations of the last update
+            journal = self._journal
+            to_unregister = {RegistrationJournal.PUBLISHER: [], RegistrationJournal.SUBSCRIBER: [], RegistrationJournal.SERVICE: []}
+            publisher_to_register = []
+            subscriber_to_register = []
+            services_to_register = []
+
+            def touch(kind, name, node, args, to_register):
+                register, old = journal.touch(kind, name, node, args)
+                if old is not None:
+                    to_unregister[kind].append(old)
+                if register:
+                    to_register.append(args)
+            with self.__lock_info:
+                self.__sync_info = None
+                journal.begin()
+                # sync the publishers
+                for (topic, nodes) in publishers:
+                    topictype = topic_types.get(topic, None)
+                    for node in nodes:
+                        nodeuri = node_uris.get(node, None)
+                        if topictype and nodeuri and not self._do_ignore_ntp(node, topic, topictype):
+                            touch(RegistrationJournal.PUBLISHER, topic, node, (topic, topictype, node, nodeuri), publisher_to_register)
+                # sync the subscribers
+                for (topic, nodes) in subscribers:
+                    for node in nodes:
+                        topictype = topic_types.get(topic, None)
+                        nodeuri = node_uris.get(node, None)
+                        # if remote topictype is None, try to set to the local topic type
+#              if not topictype and not self.__own_state is None:
+#                if topic in self.__own_state.topics:
+#                  topictype = self.__own_state.topics[topic].type
+                        if not topictype:
+                            topictype = self.MSG_ANY_TYPE
+                        if topictype and nodeuri and not self._do_ignore_nts(node, topic, topictype):
+                            touch(RegistrationJournal.SUBSCRIBER, topic, node, (topic, topictype, node, nodeuri), subscriber_to_register)
+                # sync the services
+                for (service, nodes) in rservices:
+                    serviceuri = service_uris.get(service, None)
+                    for node in nodes:
+                        nodeuri = node_uris.get(node, None)
+                        if serviceuri and nodeuri and not self._do_ignore_ns(node, service):
+                            touch(RegistrationJournal.SERVICE, service, node, (service, serviceuri, node, nodeuri), services_to_register)
+                for key, args in journal.finish():
+                    to_unregister[key[0]].append(args)
             # unregister not updated publishers
-            for (topic, topictype, node, nodeuri) in set(self.__publisher) - set(publisher):
-                own_master_multi.unregisterPublisher(node, topic, nodeuri)
+            for (topic, topictype, node, nodeuri) in to_unregister[RegistrationJournal.PUBLISHER]:
+                calls.append(('unregisterPublisher', (node, topic, nodeuri)))
+                keys.append((RegistrationJournal.PUBLISHER, topic, node))
                 rospy.logdebug("SyncThread[%s]: prepare UNPUB %s[%s] %s",
                                 self.name, node, nodeuri, topic)
                 handler.append(('upub', topic, node, nodeuri))
@@ -333,32 +402,15 @@ class SyncThread(object):
                         del self._md5warnings[(topic, node, nodeuri)]
             # register new publishers
             for (topic, topictype, node, nodeuri) in publisher_to_register:
-                own_master_multi.registerPublisher(node, topic, topictype, nodeuri)
+                calls.append(('registerPublisher', (node, topic, topictype, nodeuri)))
+                keys.append((RegistrationJournal.PUBLISHER, topic, node))
                 rospy.logdebug("SyncThread[%s]: prepare PUB %s[%s] %s[%s]",
                                 self.name, node, nodeuri, topic, topictype)
                 handler.append(('pub', topic, topictype, node, nodeuri))
-
-            # sync the subscribers
-            subscriber = []
-            subscriber_to_register = []
-            for (topic, nodes) in subscribers:
-                for node in nodes:
-                    topictype = self._get_topictype(topic, topicTypes)
-                    nodeuri = self._get_nodeuri(node, nodeProviders, remote_masteruri)
-                    # if remote topictype is None, try to set to the local topic type
-#          if not topictype and not self.__own_state is None:
-#            if topic in self.__own_state.topics:
-#              topictype = self.__own_state.topics[topic].type
-                    if not topictype:
-                        topictype = self.MSG_ANY_TYPE
-                    if topictype and nodeuri and not self._do_ignore_nts(node, topic, topictype):
-                        # register the node as subscriber in local ROS master
-                        if not ((topic, node, nodeuri) in self.__subscriber):
-                            subscriber_to_register.append((topic, topictype, node, nodeuri))
-                        subscriber.append((topic, topictype, node, nodeuri))
             # unregister not updated topics
-            for (topic, topictype, node, nodeuri) in set(self.__subscriber) - set(subscriber):
-                own_master_multi.unregisterSubscriber(node, topic, nodeuri)
+            for (topic, topictype, node, nodeuri) in to_unregister[RegistrationJournal.SUBSCRIBER]:
+                calls.append(('unregisterSubscriber', (node, topic, nodeuri)))
+                keys.append((RegistrationJournal.SUBSCRIBER, topic, node))
                 rospy.logdebug("SyncThread[%s]: prepare UNSUB %s[%s] %s",
                             self.name, node, nodeuri, topic)
                 handler.append(('usub', topic, node, nodeuri))
@@ -368,49 +420,37 @@ class SyncThread(object):
                         del self._md5warnings[(topic, node, nodeuri)]
             # register new subscriber
             for (topic, topictype, node, nodeuri) in subscriber_to_register:
-                own_master_multi.registerSubscriber(node, topic, topictype, nodeuri)
+                calls.append(('registerSubscriber', (node, topic, topictype, nodeuri)))
+                keys.append((RegistrationJournal.SUBSCRIBER, topic, node))
                 rospy.logdebug("SyncThread[%s]: prepare SUB %s[%s] %s[%s]",
                             self.name, node, nodeuri, topic, topictype)
                 handler.append(('sub', topic, topictype, node, nodeuri))
             # check for conflicts with local types before register remote topics
             with self.__lock_info:
                 self._check_local_topic_types(publisher_to_register + subscriber_to_register)
-
-            # sync the services
-            services = []
-            services_to_register = []
-            for (service, nodes) in rservices:
-                for node in nodes:
-                    serviceuri = self._get_serviceuri(service, serviceProviders, remote_masteruri)
-                    nodeuri = self._get_nodeuri(node, nodeProviders, remote_masteruri)
-                    if serviceuri and nodeuri and not self._do_ignore_ns(node, service):
-                        # register the node as publisher in local ROS master
-                        if not ((service, serviceuri, node, nodeuri) in self.__services):
-                            services_to_register.append((service, serviceuri, node, nodeuri))
-                        services.append((service, serviceuri, node, nodeuri))
             # unregister not updated services
-            for (service, serviceuri, node, nodeuri) in set(self.__services) - set(services):
-                own_master_multi.unregisterService(node, service, serviceuri)
+            for (service, serviceuri, node, nodeuri) in to_unregister[RegistrationJournal.SERVICE]:
+                calls.append(('unregisterService', (node, service, serviceuri)))
+                keys.append((RegistrationJournal.SERVICE, service, node))
                 rospy.logdebug("SyncThread[%s]: prepare UNSRV %s[%s] %s[%s]",
                             self.name, node, nodeuri, service, serviceuri)
                 handler.append(('usrv', service, serviceuri, node, nodeuri))
             # register new services
             for (service, serviceuri, node, nodeuri) in services_to_register:
-                own_master_multi.registerService(node, service, serviceuri, nodeuri)
+                calls.append(('registerService', (node, service, serviceuri, nodeuri)))
+                keys.append((RegistrationJournal.SERVICE, service, node))
                 rospy.logdebug("SyncThread[%s]: prepare SRV %s[%s] %s[%s]",
                             self.name, node, nodeuri, service, serviceuri)
                 handler.append(('srv', service, serviceuri, node, nodeuri))
 
-            # execute the multicall and update the current publicher, subscriber and services
+            # execute the calls with the changed registrations
             if not self.__unregistered:
-                with self.__lock_info:
-                    self.__sync_info = None
-                    self.__publisher = publisher
-                    self.__subscriber = subscriber
-                    self.__services = services
                 # update the local ROS master
-                socket.setdefaulttimeout(3)
-                result = own_master_multi()
+                result = self._registration.execute(calls)
+                # the failed entries keep their previous state in the journal and are sent again on next update
+                failed = set(key for key, (code, _msg, _val) in zip(keys, result) if code != 1)
+                with self.__lock_info:
+                    journal.commit(failed)
                 self._check_multical_result(result, handler)
                 # set the last synchronization time
                 self.timestamp = stamp
@@ -418,11 +458,10 @@ class SyncThread(object):
                 rospy.logdebug("SyncThread[%s]: current timestamp %.9f, local %.9f", self.name, stamp, stamp_local)
                 if self.timestamp_remote > stamp_local:
                     rospy.logdebug("SyncThread[%s]: invoke next update, remote ts: %.9f", self.name, self.timestamp_remote)
-                    self._update_timer = threading.Timer(random.random() * 2., self._request_remote_state, args=(self._apply_remote_state,))
-                    self._update_timer.start()
+                    self._scheduler.schedule(self._update_job, self._request_remote_state, (self._apply_remote_state,),
+                                             delay=self._update_delay())
             # check md5sum for topics
-            with self.__lock_info:
-                self._check_md5sums(publisher_to_register + subscriber_to_register)
+            self._request_md5check(publisher_to_register + subscriber_to_register)
             # check if remote master_sync was stopped
             if self.__has_remove_sync and not remove_sync_found:
                 # resync
@@ -472,44 +511,51 @@ class SyncThread(object):
             # hack:
             # update publisher since they are not updated while registration of a subscriber
             # https://github.com/ros/ros_comm/blob/9162b32a42b5569ae42a94aa6426aafcb63021ae/tools/rosmaster/src/rosmaster/master_api.py#L195
+            # the updates are sent by the dispatcher in parallel threads
             for (sub_topic, api, node), pub_uris in publiser_to_update.items():
-                msg = "SyncThread[%s] publisherUpdate[%s] -> node: %s [%s], publisher uris: %s" % (self.name, sub_topic, api, node, pub_uris)
-                try:
-                    pub_client = xmlrpcclient.ServerProxy(api)
-                    ret = pub_client.publisherUpdate('/master', sub_topic, pub_uris)
-                    msg_suffix = "result=%s" % ret
-                    rospy.logdebug("%s: %s", msg, msg_suffix)
-                except Exception as ex:
-                    msg_suffix = "exception=%s" % ex
-                    rospy.logwarn("%s: %s", msg, msg_suffix)
+                self._publisher_update.update(api, sub_topic, pub_uris, "SyncThread[%s] node: %s" % (self.name, node))
 
     def perform_resync(self):
-        # # create a multicall object
-        own_master = xmlrpcclient.ServerProxy(self.masteruri_local)
-        own_master_multi = xmlrpcclient.MultiCall(own_master)
-        # fill the multicall object
+        # collect the registration calls
+        calls = []
         handler = []
         with self.__lock_info:
+            if self.__unregistered:
+                # the resync was scheduled before this thread was stopped
+                return
             # reregister subcriptions
-            for (topic, topictype, node, nodeuri) in self.__subscriber:
-                own_master_multi.registerSubscriber(node, topic, topictype, nodeuri)
+            for (topic, topictype, node, nodeuri) in self._journal.registrations(RegistrationJournal.SUBSCRIBER):
+                calls.append(('registerSubscriber', (node, topic, topictype, nodeuri)))
                 rospy.logdebug("SyncThread[%s]: prepare RESUB %s[%s] %s[%s]",
                                 self.name, node, nodeuri, topic, topictype)
                 handler.append(('sub', topic, topictype, node, nodeuri))
             # reregister publishers
-            for (topic, topictype, node, nodeuri) in self.__publisher:
-                own_master_multi.registerPublisher(node, topic, topictype, nodeuri)
+            for (topic, topictype, node, nodeuri) in self._journal.registrations(RegistrationJournal.PUBLISHER):
+                calls.append(('registerPublisher', (node, topic, topictype, nodeuri)))
                 rospy.logdebug("SyncThread[%s]: prepare REPUB %s[%s] %s[%s]",
                                 self.name, node, nodeuri, topic, topictype)
                 handler.append(('pub', topic, topictype, node, nodeuri))
-        result = own_master_multi()
+        result = self._registration.execute(calls)
         self._check_multical_result(result, handler)
 
+    def _request_md5check(self, topics_to_register):
+        # the check is executed by the scheduler, while the remote state of other masters is applied
+        if topics_to_register:
+            with self.__lock_info:
+                self._md5_pending.extend(topics_to_register)
+            self._scheduler.schedule(self._md5_job, self._run_md5check, priority=SyncScheduler.PRIORITY_LOW)
+
+    def _run_md5check(self):
+        with self.__lock_info:
+            topics_to_register = self._md5_pending
+            self._md5_pending = []
+        if topics_to_register:
+            self._check_md5sums(topics_to_register)
+
     def _check_md5sums(self, topics_to_register):
         try:
             # connect to master_monitor rpc-xml server of remote master discovery
-            socket.setdefaulttimeout(20)
-            remote_monitor = xmlrpcclient.ServerProxy(self.monitoruri)
+            remote_monitor = xmlrpcclient.ServerProxy(self.monitoruri, transport=TimeoutTransport(self.MD5_TIMEOUT))
             # determine the getting method: older versions have not a getTopicsMd5sum method
             if self._use_md5check_topics is None:
                 try:
@@ -518,32 +564,28 @@ class SyncThread(object):
                     self._use_md5check_topics = False
             if self._use_md5check_topics:
                 rospy.loginfo("SyncThread[%s] Requesting remote md5sums '%s'", self.name, self.monitoruri)
-                topic_types = [topictype for _topic, topictype, _node, _nodeuri in topics_to_register]
+                topic_types = sorted(set(topictype for _topic, topictype, _node, _nodeuri in topics_to_register if topictype != self.MSG_ANY_TYPE))
+                if not topic_types:
+                    return
                 remote_md5sums_topics = remote_monitor.getTopicsMd5sum(topic_types)
                 for rttype, rtmd5sum in remote_md5sums_topics:
                     try:
-                        lmd5sum = None
-                        msg_class = roslib.message.get_message_class(rttype)
-                        if msg_class is not None:
-                            lmd5sum = msg_class._md5sum
+                        lmd5sum = get_message_md5sum(rttype)
                         if lmd5sum != rtmd5sum:
-                            for topicname, topictype, node, nodeuri in topics_to_register:
-                                if topictype == rttype:
-                                    if (topicname, node, nodeuri) not in self._md5warnings:
-                                        if lmd5sum is None:
-                                            rospy.logwarn("Unknown message type %s for topic: %s, local host: %s, remote host: %s" % (rttype, topicname, self.hostname_local, self.name))
-                                        else:
-                                            rospy.logwarn("Different checksum detected for topic: %s, type: %s, local host: %s, remote host: %s" % (topicname, rttype, self.hostname_local, self.name))
-                                        self._md5warnings[(topicname, node, nodeuri)] = (topictype, lmd5sum)
+                            with self.__lock_info:
+                                for topicname, topictype, node, nodeuri in topics_to_register:
+                                    if topictype == rttype:
+                                        if (topicname, node, nodeuri) not in self._md5warnings:
+                                            if lmd5sum is None:
+                                                rospy.logwarn("Unknown message type %s for topic: %s, local host: %s, remote host: %s" % (rttype, topicname, self.hostname_local, self.name))
+                                            else:
+                                                rospy.logwarn("Different checksum detected for topic: %s, type: %s, local host: %s, remote host: %s" % (topicname, rttype, self.hostname_local, self.name))
+                                            self._md5warnings[(topicname, node, nodeuri)] = (topictype, lmd5sum)
                     except Exception as err:
-                        import traceback
                         rospy.logwarn(err)
                         rospy.logwarn(traceback.format_exc())
         except:
-            import traceback
             rospy.logerr("SyncThread[%s] ERROR: %s", self.name, traceback.format_exc())
-        finally:
-            socket.setdefaulttimeout(None)
 
     def _check_local_topic_types(self, topics_to_register):
         try:
@@ -577,31 +619,34 @@ class SyncThread(object):
             return dict(self._topic_type_warnings)
 
     def _unreg_on_finish(self):
-        with self.__lock_info:
+        with self.__lock_apply, self.__lock_info:
             self.__unregistered = True
             try:
                 rospy.logdebug("    SyncThread[%s] clear all registrations", self.name)
-                socket.setdefaulttimeout(5)
-                own_master = xmlrpcclient.ServerProxy(self.masteruri_local)
-                own_master_multi = xmlrpcclient.MultiCall(own_master)
+                calls = []
                 # end routine if the master was removed
-                for topic, _topictype, node, uri in self.__subscriber:
+                for topic, _topictype, node, uri in self._journal.registrations(RegistrationJournal.SUBSCRIBER):
                     rospy.logdebug("    SyncThread[%s]   unsibscribe %s [%s]" % (self.name, topic, node))
-                    own_master_multi.unregisterSubscriber(node, topic, uri)
+                    calls.append(('unregisterSubscriber', (node, topic, uri)))
                     # TODO: unregister a remote subscriber while local publisher is still there
                     # Note: the connection between running components after unregistration is stil there!
-                for topic, _topictype, node, uri in self.__publisher:
+                for topic, _topictype, node, uri in self._journal.registrations(RegistrationJournal.PUBLISHER):
                     rospy.logdebug("    SyncThread[%s]   unadvertise %s [%s]" % (self.name, topic, node))
-                    own_master_multi.unregisterPublisher(node, topic, uri)
-                for service, serviceuri, node, uri in self.__services:
+                    calls.append(('unregisterPublisher', (node, topic, uri)))
+                for service, serviceuri, node, uri in self._journal.registrations(RegistrationJournal.SERVICE):
                     rospy.logdebug("    SyncThread[%s]   unregister service %s [%s]" % (self.name, service, node))
-                    own_master_multi.unregisterService(node, service, serviceuri)
-                rospy.logdebug("    SyncThread[%s] execute a MultiCall", self.name)
-                _ = own_master_multi()
+                    calls.append(('unregisterService', (node, service, serviceuri)))
+                rospy.logdebug("    SyncThread[%s] execute %d calls", self.name, len(calls))
+                result = self._registration.execute(calls)
+                if all(code != -1 for code, _msg, _val in result):
+                    self._journal.clear()
+                    self.__sync_info = None
+                else:
+                    # keep the journal to unregister the failed entries after restart
+                    rospy.logwarn("SyncThread[%s] not all registrations are removed from local ROS master", self.name)
                 rospy.logdebug("    SyncThread[%s] finished", self.name)
             except:
                 rospy.logerr("SyncThread[%s] ERROR while ending: %s", self.name, traceback.format_exc())
-            socket.setdefaulttimeout(None)
 
     def _do_ignore_ntp(self, node, topic, topictype):
         if node == rospy.get_name():
@@ -618,23 +663,40 @@ class SyncThread(object):
             return True
         return self._filter.is_ignored_service(node, service)
 
-    def _get_topictype(self, topic, topic_types):
+    def _index_topictypes(self, topic_types):
+        '''
+        @return: dictionary with topic name and topic type
+        @rtype: C{dict(str: str)}
+        '''
+        result = {}
         for (topicname, topic_type) in topic_types:
-            if (topicname == topic):
-                return topic_type.replace('None', '')
-        return None
+            if topicname not in result:
+                result[topicname] = topic_type.replace('None', '')
+        return result
 
-    def _get_nodeuri(self, node, nodes, remote_masteruri):
-        for (nodename, uri, masteruri, pid, local) in nodes:
-            if (nodename == node) and ((self._filter.sync_remote_nodes() and masteruri == remote_masteruri) or local == 'local'):
+    def _index_nodeuris(self, nodes, remote_masteruri):
+        '''
+        @return: dictionary with node name and URI of the nodes to synchronize
+        @rtype: C{dict(str: str)}
+        '''
+        result = {}
+        sync_remote_nodes = self._filter.sync_remote_nodes()
+        for (nodename, uri, masteruri, _pid, local) in nodes:
+            if nodename not in result and ((sync_remote_nodes and masteruri == remote_masteruri) or local == 'local'):
                 # the node was registered originally to another ROS master -> do sync
                 if masteruri != self.masteruri_local:
-                    return uri
-        return None
+                    result[nodename] = uri
+        return result
 
-    def _get_serviceuri(self, service, nodes, remote_masteruri):
-        for (servicename, uri, masteruri, _topic_type, local) in nodes:
-            if (servicename == service) and ((self._filter.sync_remote_nodes() and masteruri == remote_masteruri) or local == 'local'):
+    def _index_serviceuris(self, services, remote_masteruri):
+        '''
+        @return: dictionary with service name and URI of the services to synchronize
+        @rtype: C{dict(str: str)}
+        '''
+        result = {}
+        sync_remote_nodes = self._filter.sync_remote_nodes()
+        for (servicename, uri, masteruri, _topic_type, local) in services:
+            if servicename not in result and ((sync_remote_nodes and masteruri == remote_masteruri) or local == 'local'):
                 if masteruri != self.masteruri_local:
-                    return uri
-        return None
+                    result[servicename] = uri
+        return result
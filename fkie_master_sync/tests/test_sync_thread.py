@@ -0,0 +1,140 @@
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2012, Fraunhofer FKIE/US, Alexander Tiderko
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above
+#    copyright notice, this list of conditions and the following
+#    disclaimer in the documentation and/or other materials provided
+#    with the distribution.
+#  * Neither the name of Fraunhofer nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import threading
+import unittest
+try:
+    from SimpleXMLRPCServer import SimpleXMLRPCServer
+    import xmlrpclib as xmlrpcclient
+except ImportError:
+    from xmlrpc.server import SimpleXMLRPCServer
+    import xmlrpc.client as xmlrpcclient
+
+from fkie_master_sync.sync_thread import SyncThread
+
+PKG = 'fkie_master_sync'
+
+
+class FakeMaster(object):
+    '''
+    A ROS master which records the registration calls. A MultiCall containing a
+    topic of C{fail_topics} fails completely.
+    '''
+
+    def __init__(self):
+        self.calls = []
+        self.fail_topics = set()
+        self.server = SimpleXMLRPCServer(('127.0.0.1', 0), logRequests=False, allow_none=True)
+        self.server.register_function(self.multicall, 'system.multicall')
+        self.uri = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def multicall(self, call_list):
+        if any(call['params'][1] in self.fail_topics for call in call_list):
+            raise Exception('chunk failed')
+        results = []
+        for call in call_list:
+            self.calls.append((call['methodName'], call['params'][1]))
+            results.append([[1, '', []]])
+        return results
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def create_state(count):
+    masteruri = 'http://remote:11311/'
+    nodes = ['/node_%d' % idx for idx in range(count)]
+    publishers = [('/topic_%d' % idx, [node]) for idx, node in enumerate(nodes)]
+    topic_types = [(topic, 'std_msgs/String') for topic, _ in publishers]
+    node_infos = [(node, 'http://remote:%d/' % (5000 + idx), masteruri, 1, 'local') for idx, node in enumerate(nodes)]
+    return ('1.0', '1.0', masteruri, 'remote', publishers, [], [], topic_types, node_infos, [])
+
+
+class TestSyncThread(unittest.TestCase):
+    '''
+    '''
+
+    def setUp(self):
+        self.master = FakeMaster()
+        self._masteruri = os.environ.get('ROS_MASTER_URI', None)
+        os.environ['ROS_MASTER_URI'] = self.master.uri
+        self.sync = SyncThread('remote', 'http://remote:11311/', '/master_discovery', 'http://remote:11611/', 0.)
+        self.sync._request_md5check = lambda topics: None
+        self.sync._registration.CHUNK_SIZE = 2
+        self.sync._registration.RETRIES = 1
+        self.sync._registration.RETRY_DELAY = 0.
+
+    def tearDown(self):
+        self.sync.stop()
+        self.master.stop()
+        if self._masteruri is None:
+            del os.environ['ROS_MASTER_URI']
+        else:
+            os.environ['ROS_MASTER_URI'] = self._masteruri
+
+    def test_retry_failed_chunk(self):
+        state = create_state(6)
+        # the chunk with /topic_2 and /topic_3 fails on first update
+        self.master.fail_topics.add('/topic_2')
+        self.sync._apply_remote_state(state)
+        registered = set(topic for _method, topic in self.master.calls)
+        self.assertEqual(registered, set(['/topic_0', '/topic_1', '/topic_4', '/topic_5']), "wrong registrations on first update: %s" % self.master.calls)
+        # the next update sends only the failed calls again
+        del self.master.calls[:]
+        self.master.fail_topics.clear()
+        self.sync._apply_remote_state(state)
+        self.assertEqual(sorted(self.master.calls), [('registerPublisher', '/topic_2'), ('registerPublisher', '/topic_3')], "failed calls are not sent again")
+        # all registrations are done
+        del self.master.calls[:]
+        self.sync._apply_remote_state(state)
+        self.assertEqual(self.master.calls, [], "unchanged state causes registrations: %s" % self.master.calls)
+
+    def test_retry_failed_unregistration(self):
+        self.sync._apply_remote_state(create_state(6))
+        del self.master.calls[:]
+        # /topic_5 is removed, but its unregistration fails
+        self.master.fail_topics.add('/topic_5')
+        self.sync._apply_remote_state(create_state(5))
+        self.assertEqual(self.master.calls, [], "unexpected calls: %s" % self.master.calls)
+        self.master.fail_topics.clear()
+        self.sync._apply_remote_state(create_state(5))
+        self.assertEqual(self.master.calls, [('unregisterPublisher', '/topic_5')], "failed unregistration is not sent again")
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun(PKG, os.path.basename(__file__), TestSyncThread)
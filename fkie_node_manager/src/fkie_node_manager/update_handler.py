@@ -34,8 +34,11 @@
 
 from python_qt_binding.QtCore import QObject, Signal
 import threading
+import time
+import traceback
 
 from fkie_master_discovery.master_info import MasterInfo
+from fkie_master_discovery.state_client import MasterStateClient
 from fkie_node_manager.update_thread import UpdateThread
 
 
@@ -78,6 +81,8 @@ class UpdateHandler(QObject):
         QObject.__init__(self)
         self.__updateThreads = {}
         self.__requestedUpdates = {}
+        # the clients keep the last state to request only the changes
+        self.__stateClients = {}
         self._lock = threading.RLock()
 
     def stop(self):
@@ -88,6 +93,8 @@ class UpdateHandler(QObject):
                 for _, thread in self.__updateThreads.items():
                     thread.join(3)
                 print("  Update threads are off!")
+            for _, client in self.__stateClients.items():
+                client.unsubscribe()
 
     def requestMasterInfo(self, masteruri, monitoruri, delayed_exec=0.0):
         '''
@@ -116,6 +123,15 @@ class UpdateHandler(QObject):
         self.master_info_signal.emit(minfo)
         self.__handle_requests(minfo.masteruri)
 
+    def _on_pushed_state(self, state):
+        # called from thread of the state subscription
+        try:
+            minfo = MasterInfo.from_list(state)
+            minfo.check_ts = time.time()
+            self.master_info_signal.emit(minfo)
+        except Exception:
+            print(traceback.format_exc(1))
+
     def _on_master_errors(self, masteruri, error_list):
         self.master_errors_signal.emit(masteruri, error_list)
 
@@ -144,11 +160,16 @@ class UpdateHandler(QObject):
             except KeyError:
                 pass
             except Exception:
-                import traceback
                 print(traceback.format_exc(1))
 
     def __create_update_thread(self, monitoruri, masteruri, delayed_exec):
-        upthread = UpdateThread(monitoruri, masteruri, delayed_exec)
+        client = self.__stateClients.get(masteruri, None)
+        if client is None or client.monitoruri != monitoruri:
+            if client is not None:
+                client.unsubscribe()
+            client = MasterStateClient(monitoruri, 25.)
+            self.__stateClients[masteruri] = client
+        upthread = UpdateThread(monitoruri, masteruri, delayed_exec, state_client=client, push_callback=self._on_pushed_state)
         self.__updateThreads[masteruri] = upthread
         upthread.update_signal.connect(self._on_master_info)
         upthread.master_errors_signal.connect(self._on_master_errors)
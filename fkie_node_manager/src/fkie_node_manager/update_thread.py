@@ -45,6 +45,7 @@ except ImportError:
 import rospy
 
 from fkie_master_discovery.master_info import MasterInfo
+from fkie_master_discovery.state_client import MasterStateClient
 from fkie_node_manager_daemon.common import utf8
 
 
@@ -83,17 +84,22 @@ class UpdateThread(QObject, threading.Thread):
   after the name was retrieved from host.
   '''
 
-    def __init__(self, monitoruri, masteruri, delayed_exec=0., parent=None):
+    def __init__(self, monitoruri, masteruri, delayed_exec=0., parent=None, state_client=None, push_callback=None):
         '''
         :param str masteruri: the URI of the remote ROS master
         :param str monitoruri: the URI of the monitor RPC interface of the master_discovery node
         :param float delayed_exec: Delay the execution of the request for given seconds.
+        :param state_client: client with the last retrieved state. Only changes are requested, if supported by master_discovery.
+        :type state_client: fkie_master_discovery.state_client.MasterStateClient
+        :param push_callback: if not None, subscribe to the changes pushed by master_discovery and call this method with each new state.
         '''
         QObject.__init__(self)
         threading.Thread.__init__(self)
         self._monitoruri = monitoruri
         self._masteruri = masteruri
         self._delayed_exec = delayed_exec
+        self._state_client = state_client if state_client is not None else MasterStateClient(monitoruri, 25.)
+        self._push_callback = push_callback
         self.setDaemon(True)
 
     def run(self):
@@ -126,7 +132,9 @@ class UpdateThread(QObject, threading.Thread):
             except xmlrpcclient.Fault as _errts:
                 rospy.logwarn("Older master_discovery on %s detected. It does not support getUser!" % self._masteruri)
             # now get master info from master discovery
-            remote_info = remote_monitor.masterInfo()
+            remote_info = self._state_client.get_state()
+            if self._push_callback is not None:
+                self._state_client.subscribe(self._push_callback)
             master_info = MasterInfo.from_list(remote_info)
             master_info.check_ts = time.time()
             # 'print "request success", self._monitoruri